@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+# file: benchmarks/bench_batch_transform.py
+# andrew jarcho
+# 2024-06-30
+
+
+"""
+Compare Transform line by line with Transform in NumPy blocks, on the
+extract output of a spreadsheet covering --years years (see
+bench_tokenizer.py). Output is built as stdout text, and discarded.
+
+usage: PYTHONPATH=.:src/extract python3 benchmarks/bench_batch_transform.py
+           [--years N] [--repeat N]
+"""
+import argparse
+import io
+import logging
+import timeit
+
+from bench_tokenizer import make_spreadsheet
+from read_fns import Extract
+from src.transform.do_transform import Transform
+
+
+def by_line(lines: list) -> str:
+    return ''.join(', '.join(record) + '\n'
+                   for record in Transform().iter_records(lines))
+
+
+def by_block(lines: list) -> str:
+    return ''.join(''.join(', '.join(record) + '\n' for record in records)
+                   for records in Transform().iter_record_blocks(lines))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    extract = Extract(iter(make_spreadsheet(args.years)))
+    extract.outfile = io.StringIO()
+    extract.lines_in_weeks_out()
+    lines = extract.outfile.getvalue().splitlines(keepends=True)
+    assert by_line(lines) == by_block(lines)
+    print('{} lines of extract output, {} years'.format(len(lines),
+                                                        args.years))
+
+    def best_of(fn):
+        return min(timeit.repeat(fn, number=1, repeat=args.repeat))
+
+    line_secs = best_of(lambda: by_line(lines))
+    block_secs = best_of(lambda: by_block(lines))
+    print('line by line:    {:.4f} s'.format(line_secs))
+    print('NumPy blocks:    {:.4f} s  ({:.1f}x)'.format(
+        block_secs, line_secs / block_secs))
+
+
+if __name__ == '__main__':
+    main()
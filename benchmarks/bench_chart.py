@@ -0,0 +1,124 @@
+#!/usr/bin/python3
+# file: benchmarks/bench_chart.py
+# andrew jarcho
+# 2024-08-11
+
+
+"""
+Time to chart many years of days with src/chart/chart_new.py.
+
+A chart input file is generated: one night and one nap a day, with a
+night of no data now and then. Times are reported for:
+    reading and parsing the file into Triples
+    charting the file, with dates carried as strings and advanced with
+        strptime() and strftime() per row, as Chart.advance_date() did
+        before dates were counted as ordinals
+    charting the file, now
+The file is read as it is charted, since the chart's rows depend on the
+sleep state the parser is in as each Triple is made. The two charts
+printed are checked to be the same.
+
+usage: PYTHONPATH=.:src/extract python3 benchmarks/bench_chart.py
+           [--years N] [--repeat N]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import tempfile
+import timeit
+
+from src.chart.chart_new import Chart
+
+
+class LegacyDatesChart(Chart):
+    """ Chart.print_rows() before dates were counted as ordinals """
+    def print_rows(self):
+        my_date = self.output_date
+        for row in self.rows():
+            print(f'{my_date} |{self.row_text(row)}|')
+            my_date = self.legacy_advance_output_date(my_date)
+        self.output_date = my_date
+        self.grid.clear()
+
+    def legacy_advance_output_date(self, my_date):
+        date_as_datetime = datetime.datetime.strptime(my_date, '%Y-%m-%d')
+        if date_as_datetime.date().weekday() == 5:
+            print(self.create_ruler())
+        date_as_datetime += datetime.timedelta(days=1)
+        return date_as_datetime.strftime('%Y-%m-%d')
+
+
+def make_input(days):
+    """ Chart input, as extract writes it, for days days from 2016-12-04 """
+    start = datetime.date(2016, 12, 4)  # a Sunday, Chart's first row
+    lines = []
+    for day in range(days):
+        curr_date = start + datetime.timedelta(day)
+        if not day % 7:
+            lines.append('Week of Sunday, {}:'.format(curr_date.isoformat()))
+            lines.append('=' * 26)
+        lines.append('    ' + curr_date.isoformat())
+        if day:  # wake from the night before
+            lines.append('action: w, time: {}:{:02d}, hours: 8.00'.format(
+                6 + day % 3, 15 * (day % 4)))
+            lines.append('action: s, time: 14:30')
+            lines.append('action: w, time: 15:15, hours: 0.75')
+        if day % 97 == 50:
+            lines.append('action: N, time: 23:00')
+        else:
+            lines.append('action: b, time: 23:{:02d}'.format(15 * (day % 4)))
+        if day % 7 == 6:
+            lines.append('')
+    return '\n'.join(lines) + '\n'
+
+
+def chart_text(chart_class, filename):
+    """ The chart chart_class prints for filename """
+    chart = chart_class(filename)
+    buf = io.StringIO()
+    with contextlib.redirect_stdout(buf):
+        chart.make_output(chart.read_file())
+    return buf.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=25)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    days = args.years * 365
+    with tempfile.NamedTemporaryFile('w', suffix='.txt',
+                                     delete=False) as outfile:
+        outfile.write(make_input(days))
+    try:
+        def parse():
+            return list(Chart(outfile.name).read_file())
+        triples = parse()
+        legacy_text = chart_text(LegacyDatesChart, outfile.name)
+        assert chart_text(Chart, outfile.name) == legacy_text
+        print('{} days, {} triples, {} chart lines'.format(
+            days, len(triples), legacy_text.count('\n')))
+
+        def best_of(fn):
+            return min(timeit.repeat(fn, number=1, repeat=args.repeat))
+
+        def report(name, secs, base=None):
+            per_day = secs / days * 1e6
+            ratio = '  ({:.1f}x)'.format(base / secs) if base else ''
+            print('{:28} {:8.1f} ms {:8.2f} us/day{}'.format(
+                name, secs * 1e3, per_day, ratio))
+
+        report('read_file():', best_of(parse))
+        legacy = best_of(lambda: chart_text(LegacyDatesChart, outfile.name))
+        report('chart, strptime:', legacy)
+        report('chart, ordinals:',
+               best_of(lambda: chart_text(Chart, outfile.name)), legacy)
+    finally:
+        os.remove(outfile.name)
+
+
+if __name__ == '__main__':
+    main()
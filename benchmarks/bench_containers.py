@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+# file: benchmarks/bench_containers.py
+# andrew jarcho
+# 2024-06-23
+
+
+"""
+Compare the memory taken by parsed history held as Weeks and as
+PackedWeeks, on a spreadsheet covering --years years (see
+bench_tokenizer.py).
+
+usage: PYTHONPATH=.:src/extract python3 benchmarks/bench_containers.py
+           [--years N]
+"""
+import argparse
+import logging
+import tracemalloc
+
+from bench_tokenizer import make_spreadsheet
+from read_fns import Extract
+
+
+def traced_size(make) -> int:
+    """ Bytes allocated, and still held, by make() """
+    tracemalloc.start()
+    held = make()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=20)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    lines = make_spreadsheet(args.years)
+    weeks = traced_size(lambda: list(Extract(iter(lines)).iter_weeks()))
+    packed = traced_size(
+            lambda: list(Extract(iter(lines)).iter_weeks(packed=True)))
+    print('{} years'.format(args.years))
+    print('Week:        {:10,} bytes'.format(weeks))
+    print('PackedWeek:  {:10,} bytes  ({:.1f}x smaller)'.format(
+        packed, weeks / packed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+# file: benchmarks/bench_mmap_reader.py
+# andrew jarcho
+# 2024-06-09
+
+
+"""
+Compare reading a large spreadsheet in text mode and through MmapReader.
+
+A spreadsheet covering --years years (see bench_tokenizer.py) is written
+to a temporary file, with --gap blank or noise rows after each week, as
+in exports padded with empty rows. Each reader is run in a child process,
+scanning the file into Weeks with Extract.iter_weeks(); its time and the
+child's peak RSS are reported.
+
+usage: PYTHONPATH=.:src/extract python3 benchmarks/bench_mmap_reader.py
+           [--years N] [--gap N]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_tokenizer import make_spreadsheet
+
+
+def peak_rss_kib() -> int:
+    """
+    Peak resident set size of this process. ru_maxrss is inherited across
+    exec on Linux, so the parent's peak would hide the child's: use
+    VmHWM where there is one.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_reader(filename: str, use_mmap: bool) -> None:
+    """ Scan filename; print elapsed time and peak RSS """
+    import read_fns
+    from mmap_reader import MmapReader
+    from tests.file_access_wrappers import FileReadAccessWrapper
+
+    wrapper = MmapReader if use_mmap else FileReadAccessWrapper
+    start = time.perf_counter()
+    infile = read_fns.open_infile(wrapper(filename))
+    n_weeks = sum(1 for _ in read_fns.Extract(infile).iter_weeks())
+    elapsed = time.perf_counter() - start
+    max_rss = peak_rss_kib()
+    print('{} weeks  {:.3f} s  peak RSS {} KiB'.format(n_weeks, elapsed,
+                                                       max_rss))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=200)
+    parser.add_argument('--gap', type=int, default=20,
+                        help='blank and noise rows after each week')
+    parser.add_argument('--child', choices=['text', 'mmap'],
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_reader(args.file, args.child == 'mmap')
+        return
+
+    gap_rows = [',' * 23 + '\n'] * (args.gap - 1) + ['w' + ',' * 23 + '\n']
+    with tempfile.NamedTemporaryFile('w', suffix='.csv',
+                                     delete=False) as outfile:
+        for line in make_spreadsheet(args.years):
+            outfile.write(line)
+            if not line.strip(' ,\n'):  # a blank line ends each week
+                outfile.writelines(gap_rows)
+    try:
+        print('{}: {:.1f} MB'.format(outfile.name,
+                                      os.path.getsize(outfile.name) / 1e6))
+        for reader in ('text', 'mmap'):
+            print('{:5}'.format(reader), end=' ', flush=True)
+            subprocess.run([sys.executable, __file__, '--child', reader,
+                            '--file', outfile.name], check=True)
+    finally:
+        os.remove(outfile.name)
+
+
+if __name__ == '__main__':
+    main()
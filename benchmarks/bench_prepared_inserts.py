@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+# file: benchmarks/bench_prepared_inserts.py
+# andrew jarcho
+# 2024-07-28
+
+
+"""
+Per-row latency of the night and nap inserts, on a local PostgreSQL.
+
+The same rows, one NIGHT and one NAP per day, are inserted:
+    through the func.sl_insert_night() and func.sl_insert_nap() expressions
+        load.store_record() executed before PreparedInserts was added,
+        which SQLAlchemy compiles, and the server parses and plans, per row
+    through load.PreparedInserts, prepared once for the connection
+Each run is made in a transaction that is rolled back, so the db is left
+as it was. The db must have the tables and procedures in db_s_etl/.
+
+usage: DB_USERNAME=... DB_PASSWORD=... DB_NAME=... \\
+       PYTHONPATH=.:src/extract python3 benchmarks/bench_prepared_inserts.py
+           [--days N] [--repeat N]
+"""
+import argparse
+import datetime
+import logging
+import sys
+import time
+
+from sqlalchemy import func
+
+from src.load import load
+
+
+def legacy_store_record(connection, line_list):
+    """ load.store_record() before PreparedInserts was added """
+    if line_list[0] == 'NIGHT':
+        connection.execute(func.sl_insert_night(*line_list[1:]))
+    elif line_list[0] == 'NAP':
+        connection.execute(func.sl_insert_nap(
+            line_list[1], load.decimal_to_interval(line_list[2])))
+
+
+def make_records(days):
+    """ A NIGHT and a NAP record for each of days days """
+    start = datetime.date(1990, 1, 1)
+    records = []
+    for day in range(days):
+        records.append(('NIGHT', (start + datetime.timedelta(day)).isoformat(),
+                        '23:15', 'false', 'false'))
+        records.append(('NAP', '14:30', '01.25'))
+    return records
+
+
+def time_rows(engine, store_rows, records):
+    """
+    Seconds to store records in a transaction, which is then rolled back
+    """
+    with engine.connect() as connection:
+        trans = connection.begin()
+        try:
+            start = time.perf_counter()
+            store_rows(connection, records)
+            return time.perf_counter() - start
+        finally:
+            trans.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    try:
+        url = load.db_url_from_env()
+    except KeyError:
+        print('Please set the environment variables DB_USERNAME, '
+              'DB_PASSWORD, and DB_NAME')
+        sys.exit(1)
+
+    engine = load.get_engine(url, pool_size=1)
+    records = make_records(args.days)
+    print('{} rows, {} runs each'.format(len(records), args.repeat))
+
+    def legacy_rows(connection, rows):
+        for row in rows:
+            legacy_store_record(connection, row)
+
+    def best_of(store_rows):
+        return min(time_rows(engine, store_rows, records)
+                   for _ in range(args.repeat))
+
+    def report(name, secs, base=None):
+        per_row = secs / len(records) * 1e6
+        ratio = '  ({:.1f}x)'.format(base / secs) if base else ''
+        print('{:28} {:8.1f} us/row{}'.format(name, per_row, ratio))
+
+    best_of(load.store_records)  # the first use of a connection prepares
+    legacy = best_of(legacy_rows)
+    report('func.sl_insert_*():', legacy)
+    report('PreparedInserts:', best_of(load.store_records), legacy)
+    engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+# file: benchmarks/bench_time_tables.py
+# andrew jarcho
+# 2024-06-30
+
+
+"""
+Micro-benchmarks for the duration conversions in src/sleep_time.py.
+
+For every (sleep, wake) pair of quarter hours in a day, times are reported
+for:
+    the string arithmetic Transform.get_duration() ran before sleep_time
+        was added (split, map int, borrow, pad, if/elif quarter chain)
+    a bare index into sleep_time.DURATION_DECIMALS: the floor
+    Transform.get_duration() and sleep_time.duration_to_quarters()
+and, for every decimal duration transform can write,
+    the dict-and-split load.decimal_to_interval() ran before, and now
+
+usage: PYTHONPATH=.:src/extract python3 benchmarks/bench_time_tables.py
+           [--repeat N]
+"""
+import argparse
+import logging
+import timeit
+
+from src.load.load import decimal_to_interval
+from src.sleep_time import DURATION_DECIMALS, MINUTES_PER_DAY, \
+    MINUTES_PER_QUARTER, duration_to_quarters, minutes_to_time
+from src.transform.do_transform import Transform
+
+
+def legacy_get_duration(w_time: str, s_time: str) -> str:
+    """ Transform.get_duration() before sleep_time was added """
+    w_time_list = list(map(int, w_time.split(':')))
+    s_time_list = list(map(int, s_time.split(':')))
+    if w_time_list[1] < s_time_list[1]:
+        w_time_list[1] += 60
+        w_time_list[0] -= 1
+    if w_time_list[0] < s_time_list[0]:
+        w_time_list[0] += 24
+    dur_list = [(w_time_list[x] - s_time_list[x])
+                for x in range(len(w_time_list))]
+    duration = str(dur_list[0])
+    if len(duration) == 1:
+        duration = '0' + duration
+    quarter = dur_list[1]
+    if quarter == 15:
+        duration += '.25'
+    elif quarter == 30:
+        duration += '.50'
+    elif quarter == 45:
+        duration += '.75'
+    elif quarter == 0:
+        duration += '.00'
+    return duration
+
+
+def legacy_decimal_to_interval(dec_str: str) -> str:
+    """ load.decimal_to_interval() before sleep_time was added """
+    dec_mins_to_mins = {'00': '00', '25': '15', '50': '30', '75': '45'}
+    hrs, dec_mins = dec_str.split('.')
+    return '{}:{}'.format(hrs, dec_mins_to_mins[dec_mins])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    minutes = range(0, MINUTES_PER_DAY, MINUTES_PER_QUARTER)
+    pairs = [(s, w) for s in minutes for w in minutes]
+    str_pairs = [(minutes_to_time(s), minutes_to_time(w)) for s, w in pairs]
+    durations = [(w - s) % MINUTES_PER_DAY for s, w in pairs]
+    decimals = [DURATION_DECIMALS[d] for d in durations]
+    assert [legacy_get_duration(w, s) for s, w in str_pairs] == decimals
+    assert [Transform.get_duration(w, s) for s, w in pairs] == decimals
+    print('{} (sleep, wake) pairs'.format(len(pairs)))
+
+    def best_of(fn):
+        return min(timeit.repeat(fn, number=1, repeat=args.repeat))
+
+    def report(name, secs, base=None):
+        per_call = secs / len(pairs) * 1e9
+        ratio = '  ({:.1f}x)'.format(base / secs) if base else ''
+        print('{:34} {:8.1f} ns/call{}'.format(name, per_call, ratio))
+
+    legacy = best_of(lambda: [legacy_get_duration(w, s)
+                              for s, w in str_pairs])
+    report('legacy get_duration():', legacy)
+    report('DURATION_DECIMALS[d]:',
+           best_of(lambda: [DURATION_DECIMALS[d] for d in durations]), legacy)
+    report('Transform.get_duration():',
+           best_of(lambda: [Transform.get_duration(w, s) for s, w in pairs]),
+           legacy)
+    report('duration_to_quarters():',
+           best_of(lambda: [duration_to_quarters(d) for d in durations]))
+
+    legacy = best_of(lambda: [legacy_decimal_to_interval(d)
+                              for d in decimals])
+    report('legacy decimal_to_interval():', legacy)
+    report('decimal_to_interval():',
+           best_of(lambda: [decimal_to_interval(d) for d in decimals]),
+           legacy)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+# file: benchmarks/bench_tokenizer.py
+# andrew jarcho
+# 2024-06-02
+
+
+"""
+Benchmark line tokenizing in src/extract on a multi-year spreadsheet.
+
+The spreadsheet is built by repeating the weeks of
+src/sleep_test_after_5_16.csv, with each week's Sunday date moved forward,
+until it covers --years years. Times are reported for:
+    the per-line steps Extract ran before line_tokenizer was added
+        (split, strip, slice, strip again, validate_segment())
+    line_tokenizer.tokenize_line()
+    Extract.lines_in_weeks_out(), end to end, with output discarded
+
+usage: PYTHONPATH=.:src/extract python3 benchmarks/bench_tokenizer.py
+           [--years N] [--repeat N]
+"""
+import argparse
+import datetime
+import io
+import logging
+import os
+import re
+import timeit
+
+from container_objs import validate_segment, Event
+from line_tokenizer import tokenize_line
+from read_fns import Extract
+
+
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          '..', 'src', 'sleep_test_after_5_16.csv')
+
+
+def make_spreadsheet(years: int) -> list:
+    """
+    Return the lines of a spreadsheet covering about 'years' years
+    """
+    with open(SAMPLE_CSV) as infile:
+        lines = infile.read().splitlines()
+    header, body = lines[0], lines[1:]
+    # split body into weeks: each starts with a dated line
+    weeks = []
+    for line in body:
+        if re.match(r'\d{1,2}/\d{1,2}/\d{4}', line):
+            weeks.append([])
+        if weeks:
+            weeks[-1].append(line)
+    out_lines = [header]
+    sunday = datetime.date(2000, 1, 2)
+    for ix in range(years * 52):
+        week = weeks[ix % len(weeks)]
+        first_line = week[0].split(',', 1)
+        out_lines.append('{}/{}/{},{}'.format(sunday.month, sunday.day,
+                                              sunday.year, first_line[1]))
+        out_lines.extend(week[1:])
+        sunday += datetime.timedelta(days=7)
+    return [line + '\n' for line in out_lines]
+
+
+def legacy_tokenize(line: str) -> list:
+    """ The per-line steps of Extract before line_tokenizer was added """
+    line_as_list = line.strip().split(',')[:22]
+    line_as_list = line_as_list[:1] + [item.strip() for item in
+                                       line_as_list[1:]]
+    re.match(r'(\d{1,2})/(\d{1,2})/(\d{4})', line_as_list[0])
+    events = []
+    if any(line_as_list):
+        shorter_line = line_as_list[1:]
+        for ix in range(7):
+            segment = shorter_line[3 * ix: 3 * ix + 3]
+            segment = [seg.strip() for seg in segment]
+            if validate_segment(segment):
+                events.append(Event(*segment))
+    return events
+
+
+def run_extract(lines: list) -> None:
+    extract = Extract(iter(lines))
+    extract.outfile = io.StringIO()
+    extract.lines_in_weeks_out()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    lines = make_spreadsheet(args.years)
+    print('{} lines, {} years'.format(len(lines), args.years))
+
+    def best_of(fn):
+        return min(timeit.repeat(fn, number=1, repeat=args.repeat))
+
+    legacy = best_of(lambda: [legacy_tokenize(line) for line in lines])
+    tokenizer = best_of(lambda: [tokenize_line(line) for line in lines])
+    end_to_end = best_of(lambda: run_extract(lines))
+    print('legacy per-line steps:   {:.4f} s'.format(legacy))
+    print('tokenize_line():         {:.4f} s  ({:.1f}x)'.format(
+        tokenizer, legacy / tokenizer))
+    print('lines_in_weeks_out():    {:.4f} s'.format(end_to_end))
+
+
+if __name__ == '__main__':
+    main()
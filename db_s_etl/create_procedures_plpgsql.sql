@@ -46,4 +46,79 @@ EXCEPTION
     WHEN OTHERS THEN
         RETURN 'error inserting nap into db';
 END;
-$$ LANGUAGE plpgsql;
\ No newline at end of file
+$$ LANGUAGE plpgsql;
+
+-- The bulk functions below insert a whole batch of nights or naps in one
+-- statement. Each returns one element per input row: the id of the new row,
+-- or NULL where the row was rejected. Naps are tied to their night by
+-- position in the night_ids array returned by sl_insert_nights_bulk(),
+-- not by currval().
+
+CREATE OR REPLACE FUNCTION sl_insert_nights_bulk(
+    new_start_dates date[],
+    new_start_times time without time zone[],
+    new_start_no_data boolean[],
+    new_end_no_data boolean[]
+) RETURNS integer[] AS $$
+DECLARE
+    new_night_ids integer[];
+BEGIN
+    WITH night_in AS (
+        SELECT u.ord, u.start_date, u.start_time, u.start_no_data,
+               u.end_no_data,
+               CASE WHEN u.start_date IS NOT NULL
+                         AND u.start_time IS NOT NULL
+                         AND (u.start_no_data IS FALSE
+                              OR u.end_no_data IS FALSE)
+                    THEN nextval('sl_night_night_id_seq')
+               END AS night_id
+        FROM unnest(new_start_dates, new_start_times, new_start_no_data,
+                    new_end_no_data)
+             WITH ORDINALITY AS u(start_date, start_time, start_no_data,
+                                  end_no_data, ord)
+    ), inserted AS (
+        INSERT INTO sl_night (night_id, start_date, start_time,
+                              start_no_data, end_no_data)
+        SELECT night_id, start_date, start_time, start_no_data, end_no_data
+        FROM night_in
+        WHERE night_id IS NOT NULL
+        ORDER BY ord
+    )
+    SELECT array_agg(night_id ORDER BY ord) INTO new_night_ids FROM night_in;
+    RETURN new_night_ids;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sl_insert_naps_bulk(
+    night_ids integer[],
+    nap_night_positions integer[],
+    new_start_times time without time zone[],
+    new_durations interval[]
+) RETURNS integer[] AS $$
+DECLARE
+    new_nap_ids integer[];
+BEGIN
+    WITH nap_in AS (
+        SELECT u.ord, u.start_time, u.duration,
+               night_ids[u.night_position] AS fk_night_id
+        FROM unnest(nap_night_positions, new_start_times, new_durations)
+             WITH ORDINALITY AS u(night_position, start_time, duration, ord)
+    ), nap_ok AS (
+        SELECT ord, start_time, duration, fk_night_id,
+               CASE WHEN fk_night_id IS NOT NULL
+                         AND start_time IS NOT NULL
+                         AND duration IS NOT NULL
+                    THEN nextval('sl_nap_nap_id_seq')
+               END AS nap_id
+        FROM nap_in
+    ), inserted AS (
+        INSERT INTO sl_nap (nap_id, start_time, duration, night_id)
+        SELECT nap_id, start_time, duration, fk_night_id
+        FROM nap_ok
+        WHERE nap_id IS NOT NULL
+        ORDER BY ord
+    )
+    SELECT array_agg(nap_id ORDER BY ord) INTO new_nap_ids FROM nap_ok;
+    RETURN new_nap_ids;
+END;
+$$ LANGUAGE plpgsql;
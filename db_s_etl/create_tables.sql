@@ -14,6 +14,9 @@ CREATE TABLE sl_night (
     CHECK (start_no_data IS FALSE OR end_no_data IS FALSE)
 );
 
+-- incremental loads look up the nights already loaded by their start
+CREATE INDEX sl_night_start ON sl_night (start_date, start_time);
+
 
 DROP TABLE IF EXISTS sl_nap;
 
@@ -25,3 +28,6 @@ CREATE TABLE sl_nap (
     PRIMARY KEY (nap_id),
     FOREIGN KEY (night_id) REFERENCES sl_night (night_id)
 );
+
+-- incremental loads look up the naps already loaded by their night and start
+CREATE INDEX sl_nap_night ON sl_nap (night_id, start_time);
@@ -11,6 +11,9 @@ CREATE TABLE slt_night (
     PRIMARY KEY (night_id)
 );
 
+-- incremental loads look up the nights already loaded by their start
+CREATE INDEX slt_night_start ON slt_night (start_date, start_time);
+
 
 DROP TABLE IF EXISTS slt_nap;
 
@@ -22,3 +25,6 @@ CREATE TABLE slt_nap (
     PRIMARY KEY (nap_id),
     FOREIGN KEY (night_id) REFERENCES slt_night (night_id)
 );
+
+-- incremental loads look up the naps already loaded by their night and start
+CREATE INDEX slt_nap_night ON slt_nap (night_id, start_time);
@@ -0,0 +1,151 @@
+# file: src/__main__.py
+# andrew jarcho
+# 2024-08-04
+
+
+"""
+One entry point for the pipeline and its stages:
+
+    python -m src run FILE [...]         extract, transform, and load in one
+                                         process (pipeline.py)
+    python -m src pipe FILE [...]        the stages as separate processes
+                                         (mk_processes.py)
+    python -m src extract FILE [...]     run_it.py
+    python -m src transform [...]        do_transform.py
+    python -m src load True|False [...]  load.py
+    python -m src chart [FILE] [...]     chart_new.py; --image FILE.png or
+                                         FILE.svg draws the chart as an image
+    python -m src chart-db [...]         chart the nights in the db
+                                         (chart/db_source.py)
+    python -m src importtime [--budget MS] [--top N] COMMAND
+                                         report what COMMAND's imports cost
+
+Each command takes the arguments its script takes. Only the module that
+runs the command is imported, and heavy dependencies are imported only on
+the paths that use them: sqlalchemy when a stage talks to the db, numpy
+when transform runs in batch mode or a chart is drawn as an image.
+
+importtime runs a fresh interpreter with -X importtime, importing what
+COMMAND imports, and sums up the report it writes. With --budget, it exits
+with status 1 if the imports took longer than MS milliseconds, so a cron
+job's cold start can be held to a budget.
+"""
+import importlib
+import os
+import sys
+
+
+# the module and function that run each command
+COMMANDS = {
+    'run': ('src.pipeline', 'main'),
+    'pipe': ('src.mk_processes', 'main'),
+    'extract': ('src.extract.run_it', 'main'),
+    'transform': ('src.transform.do_transform', 'run'),
+    'load': ('src.load.load', 'run'),
+    'chart': ('src.chart.chart_new', 'main'),
+    'chart-db': ('src.chart.db_source', 'main'),
+}
+IMPORTTIME_TOP = 10  # the costliest imports listed
+
+USAGE = ('usage: python -m src {{{}}} [ARG ...]\n'
+         '       python -m src importtime [--budget MS] [--top N] COMMAND'.
+         format('|'.join(COMMANDS)))
+
+
+def import_command(command):
+    """
+    Import the module that runs command; return the function that runs it
+
+    Called by: main(), importtime()
+    """
+    # extract's modules import each other as top-level modules, as they do
+    # when run_it.py is run as a script
+    extract_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'extract')
+    if extract_dir not in sys.path:
+        sys.path.insert(0, extract_dir)
+    module_name, function_name = COMMANDS[command]
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def importtime(command, budget_ms=None, top=IMPORTTIME_TOP):
+    """
+    Report the time a fresh interpreter takes to import what command
+    imports
+
+    :param command: a key of COMMANDS
+    :param budget_ms: if given, the most milliseconds the imports may take
+    :param top: how many of the costliest top-level imports to list
+    :return: 1 if the imports took longer than budget_ms, else 0
+    Called by: main()
+    """
+    import subprocess
+    code = 'import src.__main__ as m; m.import_command({!r})'.format(command)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            stderr=subprocess.PIPE, text=True, check=True)
+    imports = parse_importtime(result.stderr)
+    total_ms = sum(cumulative for _, cumulative, _ in imports) / 1000
+    print('{}: {} top-level imports in {:.1f} ms'.format(command, len(imports),
+                                                         total_ms))
+    for self_us, cumulative_us, name in sorted(imports, key=lambda i: i[1],
+                                               reverse=True)[:top]:
+        print('{:10.1f} ms  {}'.format(cumulative_us / 1000, name))
+    if budget_ms is not None and total_ms > budget_ms:
+        print('over budget of {} ms'.format(budget_ms))
+        return 1
+    return 0
+
+
+def parse_importtime(report):
+    """
+    Read the top-level imports from the report -X importtime writes
+
+    A line of the report reads 'import time: self | cumulative | name',
+    in microseconds; a module imported by another has its name indented.
+    :return: (self, cumulative, name) for each top-level import
+    Called by: importtime()
+    """
+    imports = []
+    for line in report.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit() or name.startswith('  '):
+            continue  # the header, or not a top-level import
+        imports.append((int(self_us), int(cumulative_us), name.strip()))
+    return imports
+
+
+def main(argv=None):
+    """
+    Run the command in argv, with the rest of argv as its arguments
+
+    :return: the exit status
+    Called by: __main__
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'importtime':
+        args = argv[1:]
+        budget_ms = top = None
+        if '--budget' in args:
+            ix = args.index('--budget')
+            budget_ms = float(args[ix + 1])
+            del args[ix: ix + 2]
+        if '--top' in args:
+            ix = args.index('--top')
+            top = int(args[ix + 1])
+            del args[ix: ix + 2]
+        if len(args) == 1 and args[0] in COMMANDS:
+            return importtime(args[0], budget_ms,
+                              IMPORTTIME_TOP if top is None else top)
+    elif argv and argv[0] in COMMANDS:
+        run_command = import_command(argv[0])
+        # each stage reads its own arguments from sys.argv
+        sys.argv = ['src ' + argv[0]] + argv[1:]
+        return run_command()
+    print(USAGE, file=sys.stderr)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
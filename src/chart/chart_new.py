@@ -3,12 +3,18 @@
 # 10/2018
 
 
+import argparse
 import os
 from tests.file_access_wrappers import FileReadAccessWrapper
 import sys  # temporary: for sys.exit()
 import re
-from datetime import datetime, timedelta
+from datetime import date
 from collections import namedtuple
+from functools import lru_cache
+
+from src.sleep_time import time_to_minutes, minutes_to_time, \
+    duration_minutes, duration_to_decimal, duration_to_quarters, \
+    closest_quarter, time_to_quarter, QUARTER_TO_DECIMAL
 
 DEBUG =False 
 
@@ -16,11 +22,62 @@ QS_IN_DAY = 96  # 24 * 4 quarter hours in a day
 ASLEEP = 'x' if DEBUG else u'\u2588'  # the printed color (black ink)
 AWAKE = 'o' if DEBUG else u'\u0020'  # the background color (white paper)
 NO_DATA = '-' if DEBUG else u'\u2591'  # no data
+# the chart is a bytearray of days x QS_IN_DAY states, one per quarter
+# hour, each day's row following the one before
+NO_DATA_STATE, ASLEEP_STATE, AWAKE_STATE = 0, 1, 2
+STATES = {NO_DATA: NO_DATA_STATE, ASLEEP: ASLEEP_STATE, AWAKE: AWAKE_STATE}
+STATE_BYTES = {symbol: bytes((state,)) for symbol, state in STATES.items()}
+# translates a row of states, decoded as text, to the symbols printed
+STATE_SYMBOLS = str.maketrans({chr(state): symbol
+                               for symbol, state in STATES.items()})
 Triple = namedtuple('Triple', ['start', 'length', 'symbol'], defaults=[0, 0, 0])
 QuartersCarried = namedtuple('QuartersCarried', ['length', 'symbol'], defaults=[0, NO_DATA])
+DURATION_RE = re.compile(r'(\d{1,2})\.(\d{2})')
+TIME_RE = re.compile(r'(\d{1,2}):(\d{2})')
+# offset of the time in an action line, e.g., 'action: b, time: 23:45'
+TIME_POS = len('action: b, time: ')
+SATURDAY = 5  # as date.weekday() numbers it; the ruler follows Saturday
 stub = os.getenv('HOME2', '/media/jazcap53/0951a155-3d9d-41c3-a827-0b609af3979f')
 
 
+@lru_cache(maxsize=None)
+def date_label(ordinal):
+    """
+    :param ordinal: a date, as date.toordinal() numbers it
+    :return: the date as 'YYYY-MM-DD'
+    Called by: Chart.print_rows(), Chart.advance_date(), Chart.output_date
+    """
+    return date.fromordinal(ordinal).isoformat()
+
+
+def weekday(ordinal):
+    """
+    :param ordinal: a date, as date.toordinal() numbers it
+    :return: the date's weekday, Monday being 0, as date.weekday() has it
+    Called by: Chart.print_rows(), Chart.advance_date()
+    """
+    return (ordinal + 6) % 7  # ordinal 1, 0001-01-01, was a Monday
+
+
+def make_ruler():
+    """
+    :return: the line of hours printed above the chart and after each
+             Saturday's row
+    Called by: module
+    """
+    ruler = list(str(x) for x in range(12)) * 2
+    for ix, val in enumerate(ruler):
+        if ix == 0:
+            ruler[ix] = '12a'
+        elif ix == 12:
+            ruler[ix] = '12p'
+    ruler_line = ' ' * 12 + ''.join(v.ljust(4, ' ') for v in ruler)
+    return ruler_line
+
+
+RULER = make_ruler()
+
+
 class Chart:
     """
     Create a sleep chart from input data
@@ -33,14 +90,25 @@ class Chart:
         # self.stub = os.getenv('HOME2', '/media/jazcap53/0951a155-3d9d-41c3-a827-0b609af3979f')
         self.infile = None
         self.last_date_read = None
-        self.last_sleep_time = None
+        self.last_sleep_minutes = None
         self.last_start_posn = None
-        self.output_date = '2016-12-04'
-        self.output_row = [NO_DATA] * QS_IN_DAY
+        self.output_ordinal = date(2016, 12, 4).toordinal()  # until a date is read
+        self.output_row = STATE_BYTES[NO_DATA] * QS_IN_DAY
+        self.row_out = bytearray(self.output_row)  # the row being made
+        self.grid = bytearray()  # the rows written
         self.quarters_carried = QuartersCarried(0, NO_DATA)
         self.sleep_state = NO_DATA  # TODO: was AWAKE
         self.spaces_left = QS_IN_DAY
 
+    @property
+    def output_date(self):
+        """ The date of the next row printed, as 'YYYY-MM-DD' """
+        return date_label(self.output_ordinal)
+
+    @output_date.setter
+    def output_date(self, my_date):
+        self.output_ordinal = date.fromisoformat(my_date).toordinal()
+
     def read_file(self):
         """
         Send each line of file to parser.
@@ -49,12 +117,23 @@ class Chart:
         :return: None
         Called by: main()
         """
-        with open(self.filename) as self.infile:
-            while self.get_a_line():
-                parsed_input_line = self.parse_input_line()
-                if parsed_input_line.start == -1:
-                    continue
-                yield parsed_input_line  # parsed_input_line is a Triple
+        with open(self.filename) as infile:
+            yield from self.read_infile(infile)
+
+    def read_infile(self, infile):
+        """
+        Send each line of an open file to parser.
+
+        :yield: a parsed input line
+        :return: None
+        Called by: read_file(), RenderCache.make_week_rows()
+        """
+        self.infile = infile
+        while self.get_a_line():
+            parsed_input_line = self.parse_input_line()
+            if parsed_input_line.start == -1:
+                continue
+            yield parsed_input_line  # parsed_input_line is a Triple
 
     def get_a_line(self):
         """
@@ -81,22 +160,55 @@ class Chart:
         Called by: read_file()
         """
         if self.curr_line and re.match(r'\d{4}-\d{2}-\d{2}$', self.curr_line):
-            if self.last_date_read is None:
-                self.last_start_posn = 0
-                self.last_date_read = self.curr_line
-                return Triple(-1, -1, -1)
-            else:
-                if self.sleep_state == NO_DATA:
-                    quarters_to_output = QS_IN_DAY - self.last_start_posn
-                    t = Triple(self.last_start_posn, quarters_to_output,
-                               self.sleep_state)
-                    return t
-                else:
-                    self.last_date_read = self.curr_line
-                    return Triple(-1, -1, -1)
+            return self.handle_date(self.curr_line)
         else:
             return self.handle_action_line(self.curr_line)
 
+    def read_events(self, events):
+        """
+        Send each event to its handler, as read_file() sends each line.
+
+        An event is one of
+            ('date', 'YYYY-MM-DD'): a day begins
+            ('sleep', minutes): sleep begins, as 'action: b', 's', or 'Y'
+            ('no_data', minutes): no data begins, as 'action: N'
+            ('wake', minutes): the minutes slept end, as 'action: w'
+        with times given as minutes since midnight.
+        :yield: a Triple
+        :return: None
+        Called by: db_source.read_db()
+        """
+        handlers = {'date': self.handle_date, 'sleep': self.handle_sleep,
+                    'no_data': self.handle_no_data,
+                    'wake': self.handle_wake}
+        for kind, value in events:
+            triple = handlers[kind](value)
+            if triple.start == -1:
+                continue
+            yield triple
+
+    def handle_date(self, my_date):
+        """
+        :param my_date: a date, as 'YYYY-MM-DD'
+        :return: a Triple filling the rest of the day if there is no data,
+                 else a Triple with values (-1, -1, -1)
+        Called by: parse_input_line(), read_events()
+        """
+        if self.last_date_read is None:
+            self.last_start_posn = 0
+            self.last_date_read = my_date
+            self.output_date = my_date  # the first row's date
+            return Triple(-1, -1, -1)
+        else:
+            if self.sleep_state == NO_DATA:
+                quarters_to_output = QS_IN_DAY - self.last_start_posn
+                t = Triple(self.last_start_posn, quarters_to_output,
+                           self.sleep_state)
+                return t
+            else:
+                self.last_date_read = my_date
+                return Triple(-1, -1, -1)
+
     def handle_action_line(self, line):
         """
         If a complete Triple is not yet available, return a
@@ -111,22 +223,61 @@ class Chart:
         Called by: parse_input_line()
         """
         if line.startswith('action: ') and line[8] in 'bsY':
-            self.last_sleep_time = self.get_time_part(line)
-            self.last_start_posn = self.get_start_posn(line)
-            self.sleep_state = ASLEEP
-            return Triple(-1, -1, -1)
+            return self.handle_sleep(self.get_minutes(line))
         elif line.startswith('action: w'):
-            wake_time = self.get_time_part(line)
-            duration = self.get_duration(wake_time, self.last_sleep_time)
-            length = self.get_num_chunks(duration)
-            self.sleep_state = AWAKE
-            t = Triple(self.last_start_posn, length, ASLEEP)
-            return t
+            if self.last_sleep_minutes is None:  # no sleep to end
+                return Triple(-1, -1, -1)
+            return self.handle_wake(duration_minutes(self.get_minutes(line),
+                                                     self.last_sleep_minutes))
         elif line.startswith('action: N'):
-            self.last_sleep_time = self.get_time_part(line)
-            self.last_start_posn = self.get_start_posn(line)
-            self.sleep_state = NO_DATA
-            return Triple(-1, -1, -1)
+            return self.handle_no_data(self.get_minutes(line))
+
+    def handle_sleep(self, minutes):
+        """
+        :param minutes: the time sleep begins, as minutes since midnight
+        :return: a Triple with values (-1, -1, -1)
+        Called by: handle_action_line(), read_events()
+        """
+        self.last_sleep_minutes = minutes
+        self.last_start_posn = time_to_quarter(minutes)
+        self.sleep_state = ASLEEP
+        return Triple(-1, -1, -1)
+
+    def handle_wake(self, duration):
+        """
+        :param duration: the minutes slept
+        :return: a Triple holding the sleep that ends
+        Called by: handle_action_line(), read_events()
+        """
+        length = duration_to_quarters(duration)
+        self.sleep_state = AWAKE
+        t = Triple(self.last_start_posn, length, ASLEEP)
+        return t
+
+    def handle_no_data(self, minutes):
+        """
+        :param minutes: the time no data begins, as minutes since midnight
+        :return: a Triple with values (-1, -1, -1)
+        Called by: handle_action_line(), read_events()
+        """
+        self.last_sleep_minutes = minutes
+        self.last_start_posn = time_to_quarter(minutes)
+        self.sleep_state = NO_DATA
+        return Triple(-1, -1, -1)
+
+    @staticmethod
+    def get_minutes(cur_l):
+        """
+        Extract the time part of its string argument, as minutes since
+        midnight.
+
+        Input time may be in 'h:mm' or 'hh:mm' format.
+        Called by: handle_action_line(), get_time_part()
+        Returns: Extracted time as an int.
+        """
+        end_pos = cur_l.rfind(', hours: ')
+        return time_to_minutes(cur_l[TIME_POS:] if end_pos == -1
+                               else cur_l[TIME_POS: end_pos])
 
     @staticmethod
     def get_time_part(cur_l):
@@ -134,14 +285,10 @@ class Chart:
         Extract and return the time part of its string argument.
 
         Input time may be in 'h:mm' or 'hh:mm' format.
-        Called by: process_curr().
+        Called by: client code
         Returns: Extracted time as a string in 'hh:mm' format.
         """
-        end_pos = cur_l.rfind(', hours: ')
-        out_time = cur_l[17:] if end_pos == -1 else cur_l[17: end_pos]
-        if len(out_time) == 4:
-            out_time = '0' + out_time
-        return out_time
+        return minutes_to_time(Chart.get_minutes(cur_l))
 
     @staticmethod
     def get_duration(w_time, s_time):
@@ -152,24 +299,12 @@ class Chart:
         get_duration() calculates the interval between them as a
         string in decimal format e.g.,
             04.25 for 4 1/4 hours
-        Called by: process_curr()
+        Called by: client code
         Returns: the calculated interval, whose value will be
                 non-negative.
         """
-        w_time_list = list(map(int, w_time.split(':')))
-        s_time_list = list(map(int, s_time.split(':')))
-        if w_time_list[1] < s_time_list[1]:  # wake minute < sleep minute
-            w_time_list[1] += 60
-            w_time_list[0] -= 1
-        if w_time_list[0] < s_time_list[0]:  # wake hour < sleep hour
-            w_time_list[0] += 24
-        dur_list = [(w_time_list[x] - s_time_list[x])
-                    for x in range(len(w_time_list))]
-        duration = str(dur_list[0])
-        if len(duration) == 1:  # change hour from '1' to '01', e.g.
-            duration = '0' + duration
-        duration += Chart.quarter_hour_to_decimal(dur_list[1])
-        return duration
+        return duration_to_decimal(duration_minutes(time_to_minutes(w_time),
+                                                    time_to_minutes(s_time)))
 
     @staticmethod
     def quarter_hour_to_decimal(quarter):
@@ -177,67 +312,97 @@ class Chart:
         Convert an integer number of minutes into a decimal string
 
         Argument is a number of minutes past the hour. If that number
-        is a quarter-hour, convert it to a decimal quarter represented
-        as a string.
+        is not a quarter-hour, round it to one first.
 
-        Called by: get_duration()
+        Called by: client code
         Returns: a number of minutes represented as a decimal fraction
         """
-        valid_quarters = (0, 15, 30, 45)
-        if quarter not in valid_quarters:
-            quarter = Chart.get_closest_quarter(quarter)
-
-        decimal_quarter = None
-        if quarter == 15:
-            decimal_quarter = '.25'
-        elif quarter == 30:
-            decimal_quarter = '.50'
-        elif quarter == 45:
-            decimal_quarter = '.75'
-        elif quarter == 0:
-            decimal_quarter = '.00'
-        return decimal_quarter
+        return '.' + QUARTER_TO_DECIMAL[closest_quarter(quarter)]
 
     @staticmethod
     def get_closest_quarter(q):
-        if q < 8:
-            closest_quarter = 0
-        elif 8 <= q < 23:
-            closest_quarter = 15
-        elif 23 <= q < 37:
-            closest_quarter = 30
+        return closest_quarter(q)
+
+    def make_output(self, read_file_iterator, render_cache=None):
+        """
+        Make the chart's rows; print them once the input is read.
+
+        :param read_file_iterator: the Triples to chart, or None if
+                                   render_cache is given
+        :param render_cache: if given, a RenderCache through which the
+                             rows of self.filename are made
+        :return:
+        Called by: main()
+        """
+        try:
+            self.fill_rows(read_file_iterator, render_cache)
+        finally:
+            self.print_rows()  # advances self.output_date
+
+    def make_image(self, read_file_iterator, image_name,
+                   cell_size=None, render_cache=None):
+        """
+        Make the chart's rows; write them as a PNG or an SVG image.
+
+        :param read_file_iterator: as make_output() takes it
+        :param image_name: the image file's name, ending in '.png' or
+                           '.svg'
+        :param cell_size: the pixels (wide, tall) a quarter hour is drawn
+                          with, or None for image_output.CELL_SIZE
+        :param render_cache: as make_output() takes it
+        :return:
+        Called by: main(), db_source.main()
+        """
+        from src.chart.image_output import CELL_SIZE, grid_array, \
+            write_image
+        self.fill_rows(read_file_iterator, render_cache)
+        write_image(image_name, grid_array(self.grid), self.output_date,
+                    cell_size or CELL_SIZE)
+        self.grid.clear()
+
+    def fill_rows(self, read_file_iterator, render_cache):
+        """
+        Called by: make_output(), make_image()
+        """
+        if render_cache is None:
+            self.make_rows(read_file_iterator)
         else:
-            closest_quarter = 45
-        return closest_quarter
+            render_cache.make_rows(self)
 
-    def make_output(self, read_file_iterator):
+    def make_rows(self, read_file_iterator):
+        """
+        Start a new day row; add the rows read_file_iterator makes.
+
+        :return:
+        Called by: fill_rows(), RenderCache.make_rows()
+        """
+        self.row_out = bytearray(self.output_row)
+        self.spaces_left = QS_IN_DAY
+        self.add_rows(read_file_iterator)
+
+    def add_rows(self, read_file_iterator):
         """
 
         Make new day row.
         Insert any left over quarters to new day row.
 
+        The row being made is kept in self.row_out between calls.
         :return:
-        Called by: main()
+        Called by: make_rows(), RenderCache.make_week_rows()
         """
-        row_out = self.output_row[:]
-        self.spaces_left = QS_IN_DAY
-        
-        while True:
-            try:
-                curr_triple = next(read_file_iterator)
-                if curr_triple.start is None:  # reached end of input
-                    return
-            except StopIteration:
-                return
-
+        row_out = self.row_out
+        for curr_triple in read_file_iterator:
+            if curr_triple.start is None:  # reached end of input
+                break
             row_out = self.insert_leading_sleep_states(curr_triple, row_out)
             row_out = self.insert_to_row_out(curr_triple, row_out)  # sets self.quarters_carried.length
             if not self.spaces_left:
-                self.write_output(row_out)  # advances self.output_date
-                row_out = self.output_row[:]  # get fresh copy of row to output
+                self.write_output(row_out)
+                row_out = bytearray(self.output_row)  # get fresh copy of row to output
                 self.spaces_left = QS_IN_DAY
             if self.quarters_carried.length:
                 row_out = self.handle_quarters_carried(row_out)
+        self.row_out = row_out
 
     def insert_leading_sleep_states(self, curr_triple, row_out):
         """
@@ -258,9 +423,10 @@ class Chart:
             triple_to_insert = Triple(curr_posn,
                                       QS_IN_DAY - curr_posn, self.sleep_state)
             row_out = self.insert_to_row_out(triple_to_insert, row_out)
-            if not row_out.count(NO_DATA) or curr_triple.symbol == NO_DATA:  # row out is complete
+            if (NO_DATA_STATE not in row_out or
+                    curr_triple.symbol == NO_DATA):  # row out is complete
                 self.write_output(row_out)
-            row_out = self.output_row[:]
+            row_out = bytearray(self.output_row)
             self.spaces_left = QS_IN_DAY
             if curr_triple.start > 0:
                 triple_to_insert = Triple(0, curr_triple.start, self.sleep_state)
@@ -274,19 +440,14 @@ class Chart:
         return curr_output_row
 
     def insert_to_row_out(self, triple, output_row):
-        finish = triple.start + triple.length
+        start, length, symbol = triple
+        finish = start + length
         if finish > QS_IN_DAY:
-            self.quarters_carried = QuartersCarried(finish - QS_IN_DAY, triple.symbol)
-            triple = triple._replace(length=triple.length - self.quarters_carried.length)
-        for i in range(triple.start, triple.start + triple.length):
-            if DEBUG is True:
-                if not i % 4:
-                    output_row[i] = triple.symbol.upper()
-                else:
-                    output_row[i] = triple.symbol.lower()
-            else:
-                output_row[i] = triple.symbol
-            self.spaces_left -= 1
+            self.quarters_carried = QuartersCarried(finish - QS_IN_DAY, symbol)
+            finish = QS_IN_DAY
+        if finish > start:
+            output_row[start: finish] = STATE_BYTES[symbol] * (finish - start)
+            self.spaces_left -= finish - start
         return output_row
 
     def get_curr_posn(self):
@@ -294,16 +455,72 @@ class Chart:
 
     def write_output(self, my_output_row):
         """
+        Append a finished day row to the chart's grid
 
-        :param my_output_row:
+        The grid is a bytearray, so appending a row takes amortized
+        constant time.
+        :param my_output_row: a row of QS_IN_DAY states
+        :return:
+        Called by: add_rows(), insert_leading_sleep_states()
+        """
+        self.grid += my_output_row
+
+    def write_rows(self, rows):
+        """
+        Append finished day rows to the chart's grid
+
+        :param rows: rows of QS_IN_DAY states, one after another
+        :return:
+        Called by: RenderCache.make_rows()
+        """
+        self.grid += rows
+
+    @property
+    def num_rows(self):
+        """ The number of rows in the grid """
+        return len(self.grid) // QS_IN_DAY
+
+    def rows(self):
+        """
+        :yield: each row in the grid, in order
+        Called by: print_rows(), client code
+        """
+        grid = self.grid
+        for start in range(0, len(grid), QS_IN_DAY):
+            yield grid[start: start + QS_IN_DAY]
+
+    def row_text(self, row):
+        """
+        :param row: a row of QS_IN_DAY states
+        :return: the row's symbols, as a string
+        Called by: print_rows()
+        """
+        text = row.decode('ascii').translate(STATE_SYMBOLS)
+        if DEBUG is True:  # mark each hour
+            text = ''.join(symbol.upper() if not i % 4 else symbol
+                           for i, symbol in enumerate(text))
+        return text
+
+    def print_rows(self):
+        """
+        Print each row written to the grid, labeled with its date, and
+        the ruler after each Saturday's row
+
+        Dates are counted as ordinals, and formatted only as labels.
         :return:
         Called by: make_output()
         """
-        extended_output_row = []
-        for ix, val in enumerate(my_output_row):
-            extended_output_row.append(val)
-        print(f'{self.output_date} |{"".join(extended_output_row)}|')
-        self.output_date = self.advance_output_date(self.output_date)
+        lines = []
+        ordinal = self.output_ordinal
+        for row in self.rows():
+            lines.append(f'{date_label(ordinal)} |{self.row_text(row)}|')
+            if weekday(ordinal) == SATURDAY:
+                lines.append(RULER)
+            ordinal += 1
+        if lines:
+            print('\n'.join(lines))
+        self.output_ordinal = ordinal
+        self.grid.clear()
 
     def advance_date(self, my_date, make_ruler=False):
         """
@@ -313,11 +530,10 @@ class Chart:
         :return:
         Called by: advance_input_date(), advance_output_date()
         """
-        date_as_datetime = datetime.strptime(my_date, '%Y-%m-%d')
-        if make_ruler and date_as_datetime.date().weekday() == 5:
-            print(self.create_ruler())
-        date_as_datetime += timedelta(days=1)
-        return date_as_datetime.strftime('%Y-%m-%d')
+        ordinal = date.fromisoformat(my_date).toordinal()
+        if make_ruler and weekday(ordinal) == SATURDAY:
+            print(RULER)
+        return date_label(ordinal + 1)
 
     def advance_input_date(self, my_input_date):
         return self.advance_date(my_input_date)
@@ -330,10 +546,10 @@ class Chart:
         """
         Obtain from an interval the number of 15-minute chunks it contains
         :return: int: the number of chunks
-        Called by: read_file()
+        Called by: client code
         """
         if my_str:
-            m = re.search(r'(\d{1,2})\.(\d{2})', my_str)  # TODO: compile this
+            m = DURATION_RE.search(my_str)
             assert bool(m)
             return (int(m.group(1)) * 4 +  # 4 chunks per hour
                     int(m.group(2)) // 25) % QS_IN_DAY  # m.group(2) is decimal
@@ -343,15 +559,14 @@ class Chart:
     def get_start_posn(time_str):
         """
         Obtain from a time string its starting position in an output day
-        Called by: read_file()
+        Called by: client code
         :param time_str: a time expressed as 'HH:MM'
         :return: int: the starting position
         """
         if time_str:
-            m = re.search(r'(\d{1,2}):(\d{2})', time_str)  # TODO: compile this
+            m = TIME_RE.search(time_str)
             assert bool(m)
-            return (int(m.group(1)) * 4 +  # 4 chunks per hour
-                    int(m.group(2)) // 15) % QS_IN_DAY  # m.group(2) is base 60
+            return time_to_quarter(int(m.group(1)) * 60 + int(m.group(2)))
         return 0
 
     def compile_date_re(self):
@@ -363,14 +578,22 @@ class Chart:
 
     @staticmethod
     def create_ruler():
-        ruler = list(str(x) for x in range(12)) * 2
-        for ix, val in enumerate(ruler):
-            if ix == 0:
-                ruler[ix] = '12a'
-            elif ix == 12:
-                ruler[ix] = '12p'
-        ruler_line = ' ' * 12 + ''.join(v.ljust(4, ' ') for v in ruler)
-        return ruler_line
+        return RULER
+
+
+def add_image_arguments(parser):
+    """
+    Add the options that write the chart as an image to parser
+
+    Called by: main(), db_source.main()
+    """
+    parser.add_argument('--image', metavar='FILE',
+                        help='write the chart to FILE, a .png or .svg '
+                             'image, instead of printing it')
+    parser.add_argument('--cell-size', nargs=2, type=int,
+                        metavar=('WIDE', 'TALL'),
+                        help='the pixels a quarter hour is drawn with in '
+                             'the image (default: 4 2)')
 
 
 def main():
@@ -379,12 +602,34 @@ def main():
     sheet_file = os.path.join(stub, sheet_path)
     # chart = Chart('/jazcap53/python_projects/spreadsheet_etl/' +
     #               'xtraneous/transform_input_sheet_043b.txt')
-    chart = Chart(sheet_file)
+    parser = argparse.ArgumentParser(description='Chart the extract output')
+    parser.add_argument('file', nargs='?', default=sheet_file,
+                        help='the extract output (default: {})'.format(
+                            sheet_file))
+    parser.add_argument('--cache', metavar='FILE',
+                        help="keep each week's rows in FILE, and reuse "
+                             'those of the weeks whose input, and the '
+                             'state carried into them, are unchanged')
+    add_image_arguments(parser)
+    args = parser.parse_args()
+    chart = Chart(args.file)
     chart.compile_date_re()
-    read_file_iterator = chart.read_file()
-    ruler_line = chart.create_ruler()
-    print(ruler_line)
-    chart.make_output(read_file_iterator)
+    if args.cache:
+        from src.chart.render_cache import RenderCache
+        render_cache = RenderCache(args.cache)
+        read_file_iterator = None
+    else:
+        render_cache = None
+        read_file_iterator = chart.read_file()
+    if args.image:
+        chart.make_image(read_file_iterator, args.image, args.cell_size,
+                         render_cache)
+    else:
+        ruler_line = chart.create_ruler()
+        print(ruler_line)
+        chart.make_output(read_file_iterator, render_cache)
+    if render_cache is not None:
+        render_cache.save()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,191 @@
+#!/usr/bin/python3
+
+# file: src/chart/db_source.py
+# andrew jarcho
+# 2024-08-18
+
+
+"""
+Chart the nights and naps already loaded into the db.
+
+The nights in a date range, each with its naps, are read from sl_night
+and sl_nap with a server-side cursor, a block of rows at a time, so a
+short window of a long history is charted without reading the rest of it,
+or the extract stage's text dump. The rows are turned into the events
+Chart.read_events() takes, which stand for the lines Chart.read_file()
+would have read for the same days:
+    a night gives an 'action: b' or 'Y' (sleep) or 'N' (no_data) event
+    a nap gives an 'action: s' (sleep) event and an 'action: w' (wake)
+        event, but the night's first nap begins with the night, so it
+        gives only the 'w'
+    each day in the range gives a date event
+A nap is held in the db as its start time and duration, without a date:
+it is taken to begin at the first time after the night begins, or after
+the previous nap ends, that has its start time.
+
+usage: DB_USERNAME=... DB_PASSWORD=... DB_NAME=... \\
+       PYTHONPATH=.:src/extract python3 src/chart/db_source.py
+           [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+           [--image FILE.png|FILE.svg [--cell-size WIDE TALL]]
+"""
+import argparse
+import datetime
+import itertools
+import sys
+
+from src.chart.chart_new import Chart, RULER, add_image_arguments, \
+    date_label
+from src.load import load
+from src.sleep_time import MINUTES_PER_DAY, MINUTES_PER_HOUR
+
+
+YIELD_PER = 1000  # rows fetched from the db server at a time
+SELECT_NIGHTS_NAPS = """
+SELECT n.night_id, n.start_date, n.start_time, n.start_no_data,
+       p.start_time, p.duration
+FROM sl_night n LEFT JOIN sl_nap p ON p.night_id = n.night_id
+WHERE n.start_date BETWEEN CAST(:start_date AS date)
+                       AND CAST(:end_date AS date)
+ORDER BY n.start_date, n.start_time, n.night_id, p.nap_id
+"""
+
+
+def stream_nights_naps(connection, start_date=None, end_date=None,
+                       yield_per=YIELD_PER):
+    """
+    Read the nights in a date range, with their naps, from the db
+
+    :param connection: a db connection
+    :param start_date: the first night's date, or None for the earliest
+    :param end_date: the last night's date, or None for the latest
+    :param yield_per: the rows fetched from the db server at a time
+    :yield: a row (night_id, start_date, start_time, start_no_data,
+            nap start_time, nap duration) for each nap, in order; a night
+            without naps has a row whose nap fields are None
+    Called by: read_db()
+    """
+    result = connection.execution_options(
+            stream_results=True, yield_per=yield_per).execute(
+            load.sql(SELECT_NIGHTS_NAPS),
+            {'start_date': start_date or datetime.date.min,
+             'end_date': end_date or datetime.date.max})
+    try:
+        yield from result
+    finally:
+        result.close()
+
+
+def nights_from_rows(rows):
+    """
+    :param rows: rows as stream_nights_naps() yields them
+    :yield: (start_date, start minutes, start_no_data, naps) for each
+            night, naps being a list of (start minutes, duration minutes)
+    Called by: read_db()
+    """
+    for _, night_rows in itertools.groupby(rows, key=lambda row: row[0]):
+        night_rows = list(night_rows)
+        _, start_date, start_time, start_no_data = night_rows[0][:4]
+        naps = [(time_minutes(nap_time), duration // datetime.timedelta(
+                 minutes=1))
+                for *_, nap_time, duration in night_rows
+                if nap_time is not None]
+        yield start_date, time_minutes(start_time), start_no_data, naps
+
+
+def time_minutes(my_time):
+    """
+    :param my_time: a datetime.time
+    :return: my_time as minutes since midnight
+    Called by: nights_from_rows()
+    """
+    return my_time.hour * MINUTES_PER_HOUR + my_time.minute
+
+
+def chart_events(nights, start_date=None, end_date=None):
+    """
+    Turn nights into events for Chart.read_events()
+
+    :param nights: as nights_from_rows() yields them, in order
+    :param start_date: the first day charted, or None for the first
+                       night's
+    :param end_date: the last day charted, or None for the day of the
+                     last event
+    :yield: an event
+    Called by: read_db()
+    """
+    next_day = None if start_date is None else start_date.toordinal()
+    for night in nights:
+        for when, kind, minutes in night_events(*night):
+            day = when // MINUTES_PER_DAY
+            if next_day is None:
+                next_day = day
+            for ordinal in range(next_day, day + 1):
+                yield 'date', date_label(ordinal)
+            next_day = max(next_day, day + 1)
+            yield kind, minutes
+    if next_day is not None and end_date is not None:
+        for ordinal in range(next_day, end_date.toordinal() + 1):
+            yield 'date', date_label(ordinal)
+
+
+def night_events(start_date, start_minutes, start_no_data, naps):
+    """
+    :yield: (when, kind, minutes) for each event of a night, when being
+            its date ordinal * MINUTES_PER_DAY plus its time in minutes
+    Called by: chart_events()
+    """
+    when = start_date.toordinal() * MINUTES_PER_DAY + start_minutes
+    yield when, 'no_data' if start_no_data else 'sleep', start_minutes
+    for ix, (nap_minutes, duration) in enumerate(naps):
+        nap_when = when + (nap_minutes - when) % MINUTES_PER_DAY
+        if ix or nap_when != when:  # not the nap the night begins with
+            yield nap_when, 'sleep', nap_minutes
+        when = nap_when + duration
+        yield when, 'wake', duration
+
+
+def read_db(chart, connection, start_date=None, end_date=None,
+            yield_per=YIELD_PER):
+    """
+    Feed the nights in a date range from the db to chart
+
+    :yield: a Triple, as Chart.read_file() does
+    :return: None
+    Called by: main()
+    """
+    rows = stream_nights_naps(connection, start_date, end_date, yield_per)
+    yield from chart.read_events(
+            chart_events(nights_from_rows(rows), start_date, end_date))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            description='Chart the nights and naps loaded into the db')
+    parser.add_argument('--start', type=datetime.date.fromisoformat,
+                        help='the first day charted (default: the first '
+                             'night in the db)')
+    parser.add_argument('--end', type=datetime.date.fromisoformat,
+                        help='the last day charted (default: the last '
+                             'night in the db)')
+    add_image_arguments(parser)
+    args = parser.parse_args()
+    try:
+        url = load.db_url_from_env()
+    except KeyError:
+        print('Please set the environment variables DB_USERNAME, '
+              'DB_PASSWORD, and DB_NAME')
+        sys.exit(1)
+    engine = load.get_engine(url, pool_size=1)
+    chart = Chart(None)
+    with engine.connect() as connection:
+        read_file_iterator = read_db(chart, connection, args.start, args.end)
+        if args.image:
+            chart.make_image(read_file_iterator, args.image, args.cell_size)
+        else:
+            print(RULER)
+            chart.make_output(read_file_iterator)
+    engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
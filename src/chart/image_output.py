@@ -0,0 +1,184 @@
+# file: src/chart/image_output.py
+# andrew jarcho
+# 2024-08-25
+
+
+"""
+Write a chart's grid of sleep states as an image rather than as text.
+
+The grid has a row per day and a column per quarter hour, as
+Chart.make_rows() fills it; grid_array() gives it as a NumPy array, which
+the image is made from. Two formats are written, chosen by the output
+file's suffix:
+    .png  a palette image of 1 bit per pixel, or 2 if the grid has cells
+          of no data, whose rows are packed with numpy and compressed with
+          zlib; no imaging library is needed
+    .svg  a rect per run of asleep, or of no data, cells in a row, drawn
+          over a background of awake; the rects are sized in cells, and
+          the image is scaled to pixels by its viewBox
+Each cell is drawn cell_width pixels wide and cell_height pixels tall.
+"""
+import struct
+import zlib
+
+import numpy as np
+
+from src.chart.chart_new import ASLEEP_STATE, AWAKE_STATE, NO_DATA_STATE, \
+    QS_IN_DAY
+
+
+CELL_SIZE = (4, 2)  # the pixels (wide, tall) a cell is drawn with
+STATE_COLORS = {NO_DATA_STATE: (192, 192, 192), ASLEEP_STATE: (0, 0, 0),
+                AWAKE_STATE: (255, 255, 255)}
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_PALETTE_COLOR = 3  # the PNG color type of a palette image
+
+
+def grid_array(grid):
+    """
+    :param grid: rows of QS_IN_DAY states, one after another, as
+                 Chart.grid holds them
+    :return: a copy of grid, as a days x QS_IN_DAY array
+    Called by: Chart.make_image()
+    """
+    return np.frombuffer(bytes(grid), np.uint8).reshape(-1, QS_IN_DAY)
+
+
+def write_image(filename, grid, first_date, cell_size=CELL_SIZE):
+    """
+    Write grid to filename, as a PNG or an SVG image by its suffix
+
+    :param filename: a name ending in '.png' or '.svg'
+    :param grid: a days x QS_IN_DAY array of states
+    :param first_date: the first row's date, as 'YYYY-MM-DD'
+    :param cell_size: the pixels (wide, tall) a cell is drawn with
+    :return: None
+    :raise ValueError: if the suffix is neither, or grid has no rows
+    Called by: Chart.make_image()
+    """
+    if not len(grid):
+        raise ValueError('no days to chart')
+    title = 'sleep chart: {} days from {}'.format(len(grid), first_date)
+    if filename.lower().endswith('.png'):
+        with open(filename, 'wb') as outfile:
+            outfile.write(png_bytes(grid, cell_size, title))
+    elif filename.lower().endswith('.svg'):
+        with open(filename, 'w') as outfile:
+            outfile.write(svg_text(grid, cell_size, title))
+    else:
+        raise ValueError('{}: not a .png or .svg file name'.format(filename))
+
+
+def png_bytes(grid, cell_size=CELL_SIZE, title=None):
+    """
+    :param grid: a days x QS_IN_DAY array of states
+    :param cell_size: the pixels (wide, tall) a cell is drawn with
+    :param title: if given, stored in the image's text
+    :return: grid as a PNG image
+    Called by: write_image()
+    """
+    if (grid == NO_DATA_STATE).any():
+        bit_depth, states = 2, (NO_DATA_STATE, ASLEEP_STATE, AWAKE_STATE)
+    else:
+        bit_depth, states = 1, (ASLEEP_STATE, AWAKE_STATE)
+    palette_index = np.zeros(max(STATE_COLORS) + 1, np.uint8)
+    palette_index[list(states)] = np.arange(len(states))
+    cell_width, cell_height = cell_size
+    pixels = np.repeat(np.repeat(palette_index[grid], cell_height, axis=0),
+                       cell_width, axis=1)
+    height, width = pixels.shape
+    scanlines = np.zeros((height, 1 + -(-width * bit_depth // 8)), np.uint8)
+    scanlines[:, 1:] = pack_pixels(pixels, bit_depth)  # after filter byte 0
+    chunks = [(b'IHDR', struct.pack('>IIBBBBB', width, height, bit_depth,
+                                    PNG_PALETTE_COLOR, 0, 0, 0)),
+              (b'PLTE', bytes(value for state in states
+                              for value in STATE_COLORS[state]))]
+    if title:
+        chunks.append((b'tEXt', b'Title\0' + title.encode('latin-1')))
+    chunks += [(b'IDAT', zlib.compress(scanlines.tobytes(), 9)),
+               (b'IEND', b'')]
+    return PNG_SIGNATURE + b''.join(
+            struct.pack('>I', len(data)) + kind + data +
+            struct.pack('>I', zlib.crc32(kind + data))
+            for kind, data in chunks)
+
+
+def pack_pixels(pixels, bit_depth):
+    """
+    Pack each row of pixels into bytes, bit_depth bits a pixel, leftmost
+    pixel in the high bits, as a PNG scanline holds them
+
+    :param pixels: a 2-d array of palette indexes, each < 2 ** bit_depth
+    :param bit_depth: 1, 2, 4, or 8
+    :return: a 2-d array of bytes, a row per row of pixels
+    Called by: png_bytes()
+    """
+    per_byte = 8 // bit_depth
+    height, width = pixels.shape
+    padded = np.zeros((height, -(-width // per_byte) * per_byte), np.uint8)
+    padded[:, :width] = pixels
+    shifts = np.arange(8 - bit_depth, -1, -bit_depth, dtype=np.uint8)
+    return np.bitwise_or.reduce(
+            padded.reshape(height, -1, per_byte) << shifts, axis=2)
+
+
+def svg_text(grid, cell_size=CELL_SIZE, title=None):
+    """
+    :param grid: a days x QS_IN_DAY array of states
+    :param cell_size: the pixels (wide, tall) a cell is drawn with
+    :param title: if given, the image's title
+    :return: grid as an SVG image
+    Called by: write_image()
+    """
+    days = len(grid)
+    cell_width, cell_height = cell_size
+    lines = ['<svg xmlns="http://www.w3.org/2000/svg" width="{}" '
+             'height="{}" viewBox="0 0 {} {}" preserveAspectRatio="none" '
+             'shape-rendering="crispEdges">'.format(
+                 QS_IN_DAY * cell_width, days * cell_height, QS_IN_DAY,
+                 days)]
+    if title:
+        lines.append('<title>{}</title>'.format(title))
+    lines.append('<rect width="{}" height="{}" fill="{}"/>'.format(
+        QS_IN_DAY, days, svg_color(AWAKE_STATE)))
+    starts, lengths, states = row_runs(grid)
+    rows, columns = np.divmod(starts, QS_IN_DAY)
+    for state in (ASLEEP_STATE, NO_DATA_STATE):
+        in_state = states == state
+        if not in_state.any():
+            continue
+        lines.append('<g fill="{}">'.format(svg_color(state)))
+        lines.extend('<rect x="{}" y="{}" width="{}" height="1"/>'.format(
+                         column, row, length)
+                     for row, column, length in zip(
+                         rows[in_state].tolist(), columns[in_state].tolist(),
+                         lengths[in_state].tolist()))
+        lines.append('</g>')
+    lines.append('</svg>')
+    return '\n'.join(lines) + '\n'
+
+
+def row_runs(grid):
+    """
+    Find each run of cells of one state within a row of grid
+
+    :param grid: a days x QS_IN_DAY array of states
+    :return: arrays of each run's start, as an index into grid.ravel(),
+             its length, and its state
+    Called by: svg_text()
+    """
+    cells = grid.ravel()
+    begins_run = np.ones(len(cells), bool)
+    begins_run[1:] = cells[1:] != cells[:-1]
+    begins_run[::QS_IN_DAY] = True  # a run ends with its row
+    starts = np.flatnonzero(begins_run)
+    lengths = np.diff(np.append(starts, len(cells)))
+    return starts, lengths, cells[starts]
+
+
+def svg_color(state):
+    """
+    :return: the color of state, as '#rrggbb'
+    Called by: svg_text()
+    """
+    return '#{:02x}{:02x}{:02x}'.format(*STATE_COLORS[state])
@@ -0,0 +1,222 @@
+# file: src/chart/render_cache.py
+# andrew jarcho
+# 2024-09-01
+
+
+"""
+A persistent cache of the chart rows made from each week of input.
+
+The chart's input is split into weeks at its 'Week of Sunday, ' lines.
+The rows a week makes depend only on the week's lines and on the state
+the chart carries into the week: quarters_carried, sleep_state, the row
+being made and its spaces_left, and the last sleep time, start position,
+and date read. A week's entry in the cache is keyed by a hash of both,
+and holds the rows the week made and the state it carried out, so a
+week seen before is not parsed again: its rows are spliced into the
+chart's grid, and its state restored. As weeks already charted rarely
+change, charting the input again costs about what its new weeks do.
+
+The cache is a JSON file. Only the entries used by the last chart made
+are kept in it, so it holds no more weeks than the input does.
+"""
+import hashlib
+import io
+import json
+import logging
+
+from src.chart.chart_new import QS_IN_DAY, QuartersCarried
+from src.json_state import save_json_state
+
+
+RENDER_CACHE_VERSION = 1
+WEEK_START = 'Week of Sunday, '
+# a row of states is stored as a string of digits
+STATES_TO_DIGITS = bytes.maketrans(bytes(range(10)), b'0123456789')
+DIGITS_TO_STATES = bytes.maketrans(b'0123456789', bytes(range(10)))
+
+render_cache_logger = logging.getLogger('chart.render_cache')
+
+
+class RenderCache:
+    """
+    The rows made from each week of a chart's input, and the state
+    carried out of it, keyed by week_key()
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = load_entries(path)
+        self.used = {}  # the entries of the chart made, to save
+        self.hits = self.misses = 0
+
+    def make_rows(self, chart):
+        """
+        Make the rows of chart.filename, a week at a time, reusing the
+        rows of each week in the cache
+
+        :param chart: a Chart
+        :return: None
+        Called by: Chart.fill_rows()
+        """
+        chart.row_out = bytearray(chart.output_row)
+        chart.spaces_left = QS_IN_DAY
+        with open(chart.filename) as infile:
+            weeks = split_weeks(infile)
+        for week in weeks:
+            state = carry_state(chart)
+            key = week_key(state, week)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                entry = self.make_week_rows(chart, state, week)
+            else:
+                self.hits += 1
+                chart.write_rows(text_to_rows(entry['rows']))
+                restore_state(chart, entry['state'])
+                if entry['output_date'] is not None:
+                    chart.output_date = entry['output_date']
+            self.used[key] = entry
+            if entry['input_ended']:
+                break
+        render_cache_logger.info('{} weeks charted from the cache, {} '
+                                 'parsed'.format(self.hits, self.misses))
+
+    @staticmethod
+    def make_week_rows(chart, state, week):
+        """
+        Parse a week of input, and add the rows it makes to chart
+
+        :param state: the state chart carries into the week
+        :param week: the week's lines
+        :return: the week's cache entry
+        Called by: make_rows()
+        """
+        first_state = len(chart.grid)
+        week_file = WeekFile(''.join(week))
+        chart.add_rows(chart.read_infile(week_file))
+        return {'rows': rows_to_text(chart.grid[first_state:]),
+                'state': carry_state(chart),
+                # the first date read names the chart's first row
+                'output_date': (chart.output_date
+                                if state['last_date_read'] is None
+                                else None),
+                # Chart.get_a_line() ended the input before the file did
+                'input_ended': not week_file.at_end}
+
+    def save(self):
+        """
+        Write the entries used by the last chart made, replacing the
+        cache file only once the new one is complete
+
+        Called by: main()
+        """
+        save_json_state(self.path, RENDER_CACHE_VERSION,
+                        {'entries': self.used})
+
+
+class WeekFile(io.StringIO):
+    """
+    A week of input, read as Chart.get_a_line() reads a file, which
+    notes whether its last readline() found the end of the week, or a
+    line of it
+    """
+    at_end = False
+
+    def readline(self, *args):
+        line = super().readline(*args)
+        self.at_end = line == ''
+        return line
+
+
+def load_entries(path):
+    """
+    Read a cache file; return no entries if there is none, or it cannot
+    be used
+
+    Called by: RenderCache.__init__()
+    """
+    try:
+        with open(path) as infile:
+            cache = json.load(infile)
+        if cache['version'] != RENDER_CACHE_VERSION:
+            raise ValueError('unknown render cache version')
+        return cache['entries']
+    except FileNotFoundError:
+        return {}
+    except (ValueError, KeyError, TypeError) as e:
+        render_cache_logger.warning('Ignoring render cache {}: {}'.format(
+            path, e))
+        return {}
+
+
+def split_weeks(lines):
+    """
+    :param lines: the lines of a chart's input
+    :return: a list of weeks, each a list of lines beginning with a
+             'Week of Sunday, ' line, after any lines before the first one
+    Called by: RenderCache.make_rows()
+    """
+    weeks = [[]]
+    for line in lines:
+        if line.startswith(WEEK_START):
+            weeks.append([])
+        weeks[-1].append(line)
+    return weeks if weeks[0] else weeks[1:]
+
+
+def week_key(state, week):
+    """
+    :param state: the state a chart carries into week
+    :param week: a week's lines
+    :return: the hex sha256 of state and week
+    Called by: RenderCache.make_rows()
+    """
+    hasher = hashlib.sha256(json.dumps(state, sort_keys=True).encode())
+    hasher.update(''.join(week).encode())
+    return hasher.hexdigest()
+
+
+def carry_state(chart):
+    """
+    :return: the state chart carries from one week into the next
+    Called by: RenderCache.make_rows(), RenderCache.make_week_rows()
+    """
+    return {'quarters_carried': list(chart.quarters_carried),
+            'sleep_state': chart.sleep_state,
+            'row_out': rows_to_text(chart.row_out),
+            'spaces_left': chart.spaces_left,
+            'last_sleep_minutes': chart.last_sleep_minutes,
+            'last_start_posn': chart.last_start_posn,
+            'last_date_read': chart.last_date_read}
+
+
+def restore_state(chart, state):
+    """
+    Set the state chart carries from one week into the next
+
+    Called by: RenderCache.make_rows()
+    """
+    chart.quarters_carried = QuartersCarried(*state['quarters_carried'])
+    chart.sleep_state = state['sleep_state']
+    chart.row_out = bytearray(text_to_rows(state['row_out']))
+    chart.spaces_left = state['spaces_left']
+    chart.last_sleep_minutes = state['last_sleep_minutes']
+    chart.last_start_posn = state['last_start_posn']
+    chart.last_date_read = state['last_date_read']
+
+
+def rows_to_text(rows):
+    """
+    :param rows: states, as bytes
+    :return: the states as a string of digits
+    Called by: RenderCache.make_week_rows(), carry_state()
+    """
+    return rows.translate(STATES_TO_DIGITS).decode('ascii')
+
+
+def text_to_rows(text):
+    """
+    :param text: states as rows_to_text() writes them
+    :return: the states, as bytes
+    Called by: RenderCache.make_rows(), restore_state()
+    """
+    return text.encode('ascii').translate(DIGITS_TO_STATES)
@@ -0,0 +1,64 @@
+# file: src/copy_format.py
+# andrew jarcho
+# 2024-07-07
+
+
+"""
+NIGHT and NAP rows in the text format of PostgreSQL's COPY ... FROM STDIN.
+
+The rows hold the columns of the load stage's staging tables, in order
+(see load.COPY_NIGHT_STAGE and load.COPY_NAP_STAGE):
+    night rows: night_seq, start_date, start_time, start_no_data,
+                end_no_data
+    nap rows:   nap_seq, night_seq, start_time, duration
+Sequence numbers start at 1. Each nap carries the sequence number of the
+night before it, and its duration is an interval, e.g., '04:15'.
+
+The transform stage writes the rows to files, which the load stage copies
+to the db as they are; or the load stage splits records into rows itself.
+"""
+from src.sleep_time import decimal_to_interval
+
+
+def split_nights_naps(records, add_night, add_nap, logger):
+    """
+    Split NIGHT and NAP records into night rows and nap rows
+
+    A nap that comes before any night has no night to belong to, and is
+    dropped, as is a nap whose duration is not a whole number of quarter
+    hours.
+    :param records: records from the transform stage, e.g.,
+                    ('NAP', '04:45', '01.50')
+    :param add_night: called with each night row, a tuple of strings
+    :param add_nap: called with each nap row, a tuple of strings
+    :param logger: logs each nap dropped
+    :return: the number of night rows and of nap rows
+    Called by: load.split_nights_naps(), Transform.write_copy_rows()
+    """
+    n_nights = n_naps = 0
+    for line_num, record in enumerate(records, 1):
+        if record[0] == 'NIGHT':
+            n_nights += 1
+            add_night((str(n_nights), *record[1:]))
+        elif record[0] == 'NAP':
+            interval_str = decimal_to_interval(record[2])
+            if not n_nights:
+                logger.warning('NAP before any NIGHT at line {} '
+                               'dropped'.format(line_num))
+            elif interval_str is None:
+                logger.warning('NAP with bad duration at line {} '
+                               'dropped'.format(line_num))
+            else:
+                n_naps += 1
+                add_nap((str(n_naps), str(n_nights), record[1],
+                         interval_str))
+    return n_nights, n_naps
+
+
+def format_row(row) -> str:
+    """
+    A row as a line of COPY text: tab-separated, ending in '\\n'
+
+    Called by: load.copy_rows(), Transform.write_copy_rows()
+    """
+    return '\t'.join(row) + '\n'
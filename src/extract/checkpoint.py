@@ -0,0 +1,159 @@
+# file: src/extract/checkpoint.py
+# andrew jarcho
+# 2024-06-16
+
+
+"""
+Checkpoints for incremental extraction of an append-only spreadsheet.
+
+A checkpoint records where the last fully-completed Week ended in the .csv
+file, a hash of the file up to there, and the Extract state needed to go
+on from there: new_week, in_missing_data, the output buffer, and the last
+day header written. See Extract.lines_in_weeks_out_since().
+
+A checkpoint records what extract has written out, not what has been
+loaded. A run whose output is loaded afterwards can write its checkpoint
+to pending_path() instead, and the caller moves it into place with
+commit_checkpoint() once the load has succeeded; if the load fails, the
+next run starts from the old checkpoint, and writes those weeks again.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+from collections import namedtuple
+from typing import Optional
+
+from container_objs import Week, Day, Event, OutputBuffer
+from src.json_state import save_json_state
+
+
+CHECKPOINT_VERSION = 1
+PENDING_SUFFIX = '.pending'
+HASH_CHUNK_BYTES = 1 << 20
+
+checkpoint_logger = logging.getLogger('extract.checkpoint')
+
+
+class Checkpoint(namedtuple('CheckpointTuple',
+                            'offset, prefix_sha256, new_week, '
+                            'in_missing_data, kept, events, '
+                            'last_day_header')):
+    """
+    Each CheckpointTuple holds:
+        offset -- the byte offset just past the blank line that ended the
+                  last fully-completed Week
+        prefix_sha256 -- the hex sha256 of the file's bytes before offset
+        new_week -- the last Week, or None
+        in_missing_data -- Extract.in_missing_data
+        kept, events -- the contents of the OutputBuffer
+        last_day_header -- the last day header line written, or None
+    """
+    pass
+
+
+def hash_bytes(hasher, data, start: int, stop: int) -> None:
+    """
+    Update hasher with data[start:stop], a chunk at a time
+
+    Called by: Extract.lines_in_weeks_out_since(), prefix_matches()
+    """
+    for chunk_start in range(start, stop, HASH_CHUNK_BYTES):
+        hasher.update(data[chunk_start:min(chunk_start + HASH_CHUNK_BYTES,
+                                           stop)])
+
+
+def prefix_matches(data, checkpoint: Checkpoint) -> Optional[object]:
+    """
+    If data holds the bytes the checkpoint was made from, up to its
+    offset, return a sha256 hasher updated with those bytes; else None
+
+    Called by: Extract.lines_in_weeks_out_since()
+    """
+    if len(data) < checkpoint.offset:
+        return None
+    hasher = hashlib.sha256()
+    hash_bytes(hasher, data, 0, checkpoint.offset)
+    return hasher if hasher.hexdigest() == checkpoint.prefix_sha256 else None
+
+
+def restore_buffer(checkpoint: Checkpoint) -> OutputBuffer:
+    """
+    Called by: Extract.lines_in_weeks_out_since()
+    """
+    out_buffer = OutputBuffer()
+    out_buffer.kept.extend(checkpoint.kept)
+    out_buffer.events.extend(tuple(event) for event in checkpoint.events)
+    return out_buffer
+
+
+def load_checkpoint(path: str) -> Optional[Checkpoint]:
+    """
+    Read a checkpoint file; return None if there is none, or it cannot
+    be used
+
+    Called by: Extract.lines_in_weeks_out_since()
+    """
+    try:
+        with open(path) as infile:
+            state = json.load(infile)
+        if state.pop('version') != CHECKPOINT_VERSION:
+            raise ValueError('unknown checkpoint version')
+        state['new_week'] = _week_from_json(state['new_week'])
+        return Checkpoint(**state)
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError) as e:
+        checkpoint_logger.warning('Ignoring checkpoint {}: {}'.format(path, e))
+        return None
+
+
+def save_checkpoint(path: str, checkpoint: Checkpoint) -> None:
+    """
+    Write a checkpoint file, replacing any earlier one only once the new
+    one is complete
+
+    Called by: Extract.lines_in_weeks_out_since()
+    """
+    state = checkpoint._asdict()
+    state['new_week'] = _week_to_json(checkpoint.new_week)
+    save_json_state(path, CHECKPOINT_VERSION, state)
+
+
+def pending_path(path: str) -> str:
+    """
+    The file a checkpoint for path waits in until commit_checkpoint()
+
+    Called by: Extract.lines_in_weeks_out_since(), commit_checkpoint()
+    """
+    return path + PENDING_SUFFIX
+
+
+def commit_checkpoint(path: str) -> bool:
+    """
+    Replace the checkpoint in path with the one pending for it; return
+    False if none is pending
+
+    Called by: run_it.main(), client code
+    """
+    try:
+        os.replace(pending_path(path), path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _week_to_json(week: Optional[Week]) -> Optional[list]:
+    if week is None:
+        return None
+    return [[day.dt_date.isoformat(), [list(event) for event in day.events]]
+            for day in week]
+
+
+def _week_from_json(days: Optional[list]) -> Optional[Week]:
+    if days is None:
+        return None
+    return Week(*[Day(datetime.date.fromisoformat(dt_date),
+                      [Event(*event) for event in events])
+                  for dt_date, events in days])
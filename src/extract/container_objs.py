@@ -7,21 +7,40 @@
 
 import datetime
 import re
+from array import array
 from collections import namedtuple
 
 
+# each must match a whole field: use fullmatch()
+TIME_RE = re.compile(r'([012]?\d):(\d{2})')
+HOURS_RE = re.compile(r'[12]?\d\.\d{2}')
+
+
+def time_minutes(mil_time):
+    """
+    Return mil_time ('H:MM' or 'HH:MM') as minutes since midnight,
+    or None if it is not such a time
+    """
+    match = TIME_RE.fullmatch(mil_time)
+    if match is None:
+        return None
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
 def validate_segment(segment):
     """
     valid segments: 'b', time, ''
                     'b', time, str(float)
                     's', time, ''
                     'w', time, str(float)
+    A time or hours field with anything after it, e.g., '1:30pm', is not
+    valid.
     """
     if not any(segment) or not all(segment[0:2]):
         return False
-    if not re.match(r'[012]?\d:\d{2}', segment[1]):
+    if time_minutes(segment[1]) is None:
         return False
-    if segment[2] and not re.match(r'[12]?\d\.\d{2}', segment[2]):
+    if segment[2] and not HOURS_RE.fullmatch(segment[2]):
         return False
     if segment[0]:
         return check_segment_0(segment)  # this test must go last
@@ -46,7 +65,12 @@ class Event(namedtuple('EventTuple', 'action, mil_time, hours')):
                  after. Its value may not be zero (0.00), but may be
                  the empty string.
     """
-    pass
+    __slots__ = ()
+
+    @property
+    def minutes(self):
+        """ mil_time as minutes since midnight """
+        return time_minutes(self.mil_time)
 
 
 class Day(namedtuple('DayTuple', 'dt_date, events')):
@@ -54,6 +78,8 @@ class Day(namedtuple('DayTuple', 'dt_date, events')):
     Each DayTuple holds a datetime.date and a (possibly empty)
     list of Events
     """
+    __slots__ = ()
+
     def __init__(self, d, e):
         """ Ctor used just to filter input """
         if not isinstance(d, datetime.date):
@@ -66,12 +92,178 @@ class Week(namedtuple('WeekTuple',
                       'Sunday, Monday, Tuesday, Wednesday, Thursday, Friday,'
                       ' Saturday')):
     """ Each WeekTuple holds seven named Day tuples """
+    __slots__ = ()
+
     def __init__(self, *day_list):
         """ Ctor used just to filter input """
-        self.day_list = day_list
-        for ix, p in enumerate(self.day_list):
+        for ix, p in enumerate(day_list):
             if not isinstance(p, Day):
                 raise TypeError('Week ctor with non-Day in param list')
             if not ix and p.dt_date.weekday() != 6:
                 raise ValueError('Week ctor called with non-Sunday start'
                                  'date')
+
+
+class Night(namedtuple('NightTuple', 'dt_date, action, mil_time, events')):
+    """
+    Each NightTuple holds:
+        dt_date -- the datetime.date of the Day the night starts on
+        action -- 'b' for a complete night, 'N' for a night whose end
+                  is missing, or 'Y' for a complete night whose start
+                  follows missing data
+        mil_time -- the time the night starts, as in Event
+        events -- the list of Events after the night's 'b' Event,
+                  empty for an 'N' Night
+    """
+    __slots__ = ()
+
+
+class PackedWeek:
+    """
+    A Week, with its Events packed into an array of small integers:
+    four per Event,
+        (day index, action code, minutes since midnight,
+         hours in quarter-hours or NO_HOURS)
+    Holding many years of Weeks this way takes a fraction of the memory
+    of Week, Day, and Event objects, which hold times and hours as strings.
+
+    PackedWeek offers the read-only accessors of Week: len(), iteration,
+    indexing, and the named Days (Sunday, ..., Saturday). Each access
+    builds the Day and its Events, so code that reads a Day more than
+    once should keep it, or call to_week().
+
+    An Event the packed form would not give back exactly (such as an
+    action of 'bx', a time of '03:45', or hours of '7.30': all allowed by
+    validate_segment()) is kept as an Event, with action code ODD_EVENT.
+    """
+    __slots__ = ('sunday_ordinal', 'packed', 'odd_events')
+
+    ACTIONS = 'bsw'
+    ODD_EVENT = -1
+    NO_HOURS = -1
+    FIELDS = 4
+    MAX_FIELD = 2 ** 15 - 1  # array('h')
+
+    def __init__(self, sunday_date, packed, odd_events=None):
+        self.sunday_ordinal = sunday_date.toordinal()
+        self.packed = packed
+        self.odd_events = odd_events  # {Event index: Event}, or None
+
+    @classmethod
+    def from_week(cls, week):
+        packed = array('h')
+        odd_events = {}
+        for day_ix, day in enumerate(week):
+            for event in day.events:
+                fields = cls._pack_event(event)
+                if fields is None:
+                    odd_events[len(packed) // cls.FIELDS] = event
+                    fields = (cls.ODD_EVENT, 0, cls.NO_HOURS)
+                packed.append(day_ix)
+                packed.extend(fields)
+        return cls(week[0].dt_date, packed, odd_events or None)
+
+    @classmethod
+    def _pack_event(cls, event):
+        """
+        Return (action code, minutes, quarter-hours) for event, or None if
+        unpacking them would not give back event
+        """
+        action_code = cls.ACTIONS.find(event.action)
+        minutes = event.minutes
+        if action_code < 0 or len(event.action) != 1 or minutes is None:
+            return None
+        quarters = cls.NO_HOURS
+        if event.hours:
+            try:
+                quarters = round(float(event.hours) * 4)
+            except ValueError:
+                return None
+        if max(minutes, quarters) > cls.MAX_FIELD:
+            return None
+        fields = (action_code, minutes, quarters)
+        return fields if cls._unpack_event(fields) == event else None
+
+    @classmethod
+    def _unpack_event(cls, fields):
+        action_code, minutes, quarters = fields
+        hours = '' if quarters == cls.NO_HOURS else \
+            '{:.2f}'.format(quarters / 4)
+        return Event(cls.ACTIONS[action_code],
+                     '{}:{:02d}'.format(*divmod(minutes, 60)), hours)
+
+    def to_week(self):
+        return Week(*self)
+
+    def __len__(self):
+        return 7
+
+    def __getitem__(self, day_ix):
+        if not -7 <= day_ix < 7:
+            raise IndexError('PackedWeek index out of range')
+        day_ix %= 7
+        events = []
+        packed = self.packed
+        for ix in range(0, len(packed), self.FIELDS):
+            if packed[ix] == day_ix:
+                if packed[ix + 1] == self.ODD_EVENT:
+                    events.append(self.odd_events[ix // self.FIELDS])
+                else:
+                    events.append(self._unpack_event(packed[ix + 1:
+                                                            ix + self.FIELDS]))
+        return Day(datetime.date.fromordinal(self.sunday_ordinal + day_ix),
+                   events)
+
+    def __iter__(self):
+        return (self[day_ix] for day_ix in range(7))
+
+    def __eq__(self, other):
+        if isinstance(other, (PackedWeek, Week)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __getattr__(self, name):
+        if name in Week._fields:
+            return self[Week._fields.index(name)]
+        raise AttributeError(name)
+
+
+class OutputBuffer:
+    """
+    Output lines waiting for the end of a night to be seen.
+
+    Lines are kept in two lists. 'kept' lines (week and day headers, and
+    any event line the discard rules do not recognize) are never
+    discarded. 'events' holds the event lines of the pending night(s),
+    each as a tuple:
+        (number of kept lines before it, line, is a 3-element 'b' event)
+    so an incomplete night can be discarded without searching or
+    popping from the middle of a list, and the remaining lines can still
+    be written in their original order.
+    """
+    def __init__(self):
+        self.kept = []
+        self.events = []
+
+    def __len__(self):
+        return len(self.kept) + len(self.events)
+
+    def append_kept(self, line):
+        self.kept.append(line)
+
+    def append_event(self, line, is_complete_b=False):
+        self.events.append((len(self.kept), line, is_complete_b))
+
+    def lines(self):
+        """ Yield all lines, in the order they were appended """
+        kept_ix = 0
+        for position, line, _ in self.events:
+            while kept_ix < position:
+                yield self.kept[kept_ix]
+                kept_ix += 1
+            yield line
+        yield from self.kept[kept_ix:]
+
+    def clear(self):
+        self.kept.clear()
+        self.events.clear()
@@ -0,0 +1,132 @@
+# file: src/extract/line_tokenizer.py
+# andrew jarcho
+# 2024-06-02
+
+
+"""
+Single-pass tokenizer for the lines of the .csv spreadsheet.
+
+Each line holds a date field followed by 7 segments of 3 fields each
+(action, time, hours), one segment per day of the week. tokenize_line()
+splits a line once, strips each field once, and validates each full
+segment as it goes, with precompiled regexes. It replaces the
+split / strip / slice / strip / validate_segment() sequence that
+Extract used to run on every line.
+"""
+import re
+from collections import namedtuple
+from typing import List, Tuple, Union
+
+from container_objs import Event, TIME_RE, HOURS_RE
+
+
+DATE_RE = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})')
+
+FIELDS_PER_LINE = 22
+SEGMENTS_PER_LINE = 7
+
+# row kinds
+BLANK_ROW = 'blank'
+WEEK_START_ROW = 'week start'  # first field starts with a date
+EVENT_ROW = 'event'
+# a row a reader did not tokenize, because it is outside a week and cannot
+# start one (see mmap_reader.py)
+SKIPPED_ROW = 'skipped'
+
+# A segment token is an Event, None for a blank segment, or, for a segment
+# that is not valid or that comes from a short line, its stripped fields as
+# a list.
+SegmentToken = Union[Event, None, List[str]]
+
+
+class LineTokens(namedtuple('LineTokensTuple',
+                            'kind, date_match, segments')):
+    """
+    Each LineTokensTuple holds:
+        kind -- BLANK_ROW, WEEK_START_ROW, EVENT_ROW, or SKIPPED_ROW
+        date_match -- the match object for a date at the start of the
+                      line's first field, or None
+        segments -- a list of SEGMENTS_PER_LINE SegmentTokens; empty for
+                    a BLANK_ROW
+    """
+    pass
+
+
+def tokenize_line(line: str) -> LineTokens:
+    """
+    Split, strip, classify, and validate one line of the .csv file
+
+    Called by: Extract._scan_weeks()
+    """
+    fields = line.strip().split(',', FIELDS_PER_LINE)
+    first = fields[0]
+    segments, has_data = _tokenize_segments(fields)
+    if first or has_data:
+        date_match = DATE_RE.match(first)
+        return LineTokens(WEEK_START_ROW if date_match else EVENT_ROW,
+                          date_match, segments)
+    return LineTokens(BLANK_ROW, None, [])
+
+
+def tokenize_segments(fields: List[str]) -> List[SegmentToken]:
+    """
+    Make a SegmentToken for each of the 7 segments following the first
+    field in fields
+
+    The segments of a full line are validated here, with the same rules as
+    container_objs.validate_segment(). The segments of a short line are
+    returned as lists, for the caller to pass to validate_segment().
+    Called by: Extract._get_events()
+    """
+    return _tokenize_segments(fields)[0]
+
+
+def _tokenize_segments(fields: List[str]) -> Tuple[List[SegmentToken], bool]:
+    """
+    Return the SegmentTokens for fields, and whether any field after the
+    first is non-blank
+
+    Called by: tokenize_line(), tokenize_segments()
+    """
+    if len(fields) < FIELDS_PER_LINE:
+        return _tokenize_short_segments(fields)
+    stripped = [field.strip() for field in fields[1:FIELDS_PER_LINE]]
+    if not any(stripped):
+        return [None] * SEGMENTS_PER_LINE, False
+    time_match = TIME_RE.fullmatch
+    hours_match = HOURS_RE.fullmatch
+    segments = []
+    append = segments.append
+    for ix in range(0, FIELDS_PER_LINE - 1, 3):
+        action = stripped[ix]
+        mil_time = stripped[ix + 1]
+        hours = stripped[ix + 2]
+        if not (action or mil_time or hours):
+            append(None)
+            continue
+        if action and mil_time and time_match(mil_time) and \
+                (not hours or hours_match(hours)):
+            first_char = action[0]
+            if first_char == 'b' or (first_char == 's' and not hours) or \
+                    (first_char == 'w' and hours):
+                append(Event(action, mil_time, hours))
+                continue
+        append([action, mil_time, hours])
+    return segments, True
+
+
+def _tokenize_short_segments(fields: List[str]) \
+        -> Tuple[List[SegmentToken], bool]:
+    """
+    As _tokenize_segments(), for a line with fewer than FIELDS_PER_LINE
+    fields: each segment is returned as a list
+
+    Called by: _tokenize_segments()
+    """
+    stripped = [field.strip() for field in fields[1:]]
+    segments = [stripped[ix:ix + 3]
+                for ix in range(0, FIELDS_PER_LINE - 1, 3)]
+    for ix, segment in enumerate(segments):
+        if segment == ['', '', '']:
+            segments[ix] = None
+    return segments, any(stripped)
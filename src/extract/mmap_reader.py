@@ -0,0 +1,186 @@
+# file: src/extract/mmap_reader.py
+# andrew jarcho
+# 2024-06-09
+
+
+"""
+Read a .csv file through mmap, for Extract.
+
+Extract only needs the segments of lines inside a Week. Outside a Week, it
+only needs to know whether a line starts with a date. MmapReader scans the
+mapped bytes, and skips blank lines and lines that cannot start with a
+date (the 'w,Sun,,,Mon...' header, rows between weeks) without copying or
+decoding them. Only lines that may hold data are decoded and tokenized.
+
+The encoding must be ASCII-compatible (utf-8, latin-1, ...).
+"""
+import mmap
+import re
+from typing import Callable, Iterator
+
+from line_tokenizer import tokenize_line, LineTokens, BLANK_ROW, \
+    SKIPPED_ROW
+
+
+# a line of nothing but commas and whitespace
+BLANK_LINE_RE = re.compile(rb'[ ,\t\r\x0b\x0c]*(?:\n|\Z)')
+# a line whose first non-whitespace byte is plain ASCII, and not a digit:
+# it cannot start with a date. Bytes str.strip() might treat differently
+# from bytes.strip() (\x1c-\x1f, non-ASCII) are left to tokenize_line().
+NO_DATE_LINE_RE = re.compile(
+        rb'[ \t\r\x0b\x0c]*[^0-9\x80-\xff\x1c-\x1f \t\n\r\x0b\x0c]')
+LONE_CR_RE = re.compile(rb'\r(?!\n)')
+
+# pages of the mapping already read are released every RELEASE_BYTES, so
+# the mapped file does not count against resident memory
+RELEASE_BYTES = 1 << 20  # 1 MiB
+
+BLANK_TOKENS = LineTokens(BLANK_ROW, None, [])
+SKIPPED_TOKENS = LineTokens(SKIPPED_ROW, None, [])
+
+
+class MmapReader:
+    """
+    Pass an MmapReader to read_fns.open_infile() in place of a
+    FileReadAccessWrapper. Iterating over the opened reader yields its
+    lines, as a file opened for read in text mode would.
+
+    Reading starts at byte offset self.start, which must be the start of
+    a line. While lines are read, self.pos is the byte offset just past the
+    last line yielded. Neither is used in text mode.
+    """
+    def __init__(self, filename: str, encoding: str = 'utf-8') -> None:
+        self.filename = filename
+        self.encoding = encoding
+        self.start = 0
+        self.pos = 0
+        self._file = None
+        self._mmap = None
+        self._text_mode = False
+
+    @property
+    def data(self):
+        """ The mapped bytes """
+        return self._mmap
+
+    @property
+    def text_mode(self) -> bool:
+        """ Is the file read in text mode, without byte offsets? """
+        return self._text_mode
+
+    def open(self) -> 'MmapReader':
+        """
+        Map the file
+
+        A file with a lone '\\r' line ending is read in text mode instead,
+        since text mode would split lines there.
+        Called by: read_fns.open_infile()
+        """
+        self._file = open(self.filename, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+            if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                self._mmap.madvise(mmap.MADV_SEQUENTIAL)
+        except ValueError:  # an empty file cannot be mapped
+            self._mmap = b''
+        self._text_mode = self._has_lone_cr()
+        return self
+
+    def _has_lone_cr(self) -> bool:
+        """
+        Search the mapping for a '\r' not followed by '\n', a chunk at a
+        time, releasing each chunk's pages when done with it
+
+        Called by: open()
+        """
+        data = self._mmap
+        end = len(data)
+        for start in range(0, end, RELEASE_BYTES):
+            # one byte past the chunk, to see the '\n' after a final '\r'
+            stop = min(start + RELEASE_BYTES + 1, end)
+            match = LONE_CR_RE.search(data, start, stop)
+            if match and (match.start() < stop - 1 or stop == end):
+                return True
+            self._release(start, stop - 1)
+        return False
+
+    def close(self) -> None:
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        if self._file:
+            self._file.close()
+        self._mmap = self._file = None
+
+    def _page_start(self) -> int:
+        """ The start of the page holding self.start """
+        return self.start - self.start % mmap.PAGESIZE
+
+    def _release(self, released: int, pos: int) -> int:
+        """
+        Release the pages of the mapping from released to pos, if
+        RELEASE_BYTES or more of them are still held; return the new end
+        of the released pages
+
+        Called by: _has_lone_cr(), __iter__(), iter_tokens()
+        """
+        if pos - released < RELEASE_BYTES or \
+                not hasattr(mmap, 'MADV_DONTNEED'):
+            return released
+        page_end = pos - pos % mmap.PAGESIZE
+        if page_end <= released:
+            return released
+        self._mmap.madvise(mmap.MADV_DONTNEED, released, page_end - released)
+        return page_end
+
+    def __enter__(self) -> 'MmapReader':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[str]:
+        if self._text_mode:
+            with open(self.filename, encoding=self.encoding) as infile:
+                yield from infile
+            return
+        data = self._mmap
+        pos, end, released = self.start, len(data), self._page_start()
+        while pos < end:
+            line_end = data.find(b'\n', pos) + 1 or end
+            line = data[pos:line_end].decode(self.encoding)
+            if line.endswith('\r\n'):
+                line = line[:-2] + '\n'
+            self.pos = line_end
+            yield line
+            pos = line_end
+            released = self._release(released, pos)
+
+    def iter_tokens(self, in_week: Callable[[], bool]) \
+            -> Iterator[LineTokens]:
+        """
+        Yield LineTokens for each line
+
+        in_week() tells whether the line about to be yielded is inside a
+        Week. If not, a line that cannot start with a date is yielded as
+        SKIPPED_TOKENS. A blank line is yielded as BLANK_TOKENS. Neither is
+        decoded.
+        Called by: Extract._iter_tokens()
+        """
+        if self._text_mode:
+            yield from map(tokenize_line, self)
+            return
+        data = self._mmap
+        find = data.find
+        pos, end, released = self.start, len(data), self._page_start()
+        while pos < end:
+            line_end = find(b'\n', pos) + 1 or end
+            self.pos = line_end
+            if BLANK_LINE_RE.match(data, pos, line_end):
+                yield BLANK_TOKENS
+            elif not in_week() and NO_DATE_LINE_RE.match(data, pos, line_end):
+                yield SKIPPED_TOKENS
+            else:
+                yield tokenize_line(data[pos:line_end].decode(self.encoding))
+            pos = line_end
+            released = self._release(released, pos)
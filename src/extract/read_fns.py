@@ -87,13 +87,21 @@ Event strings not discarded, along with header strings for each calendar
 week and day, are written to sys.stdout by default.
 """
 import datetime
+import hashlib
+import io
 import re
 import logging
+import logging.handlers
+import multiprocessing
 import sys
-from typing import Tuple, Optional, Union, List
+from typing import Tuple, Optional, Union, List, Iterator, Iterable
 from datetime import date
 
-from container_objs import validate_segment, Week, Day, Event
+from container_objs import validate_segment, Week, Day, Event, Night, \
+    OutputBuffer, PackedWeek
+from line_tokenizer import tokenize_line, tokenize_segments, DATE_RE, \
+    BLANK_ROW, LineTokens, SegmentToken
+import checkpoint
 # from tests.file_access_wrappers import FileReadAccessWrapper
 from io import TextIOWrapper
 
@@ -101,6 +109,13 @@ from io import TextIOWrapper
 read_logger = logging.getLogger('extract.read_fns')
 read_logger.setLevel('DEBUG')
 
+SHARD_LINES = 1000  # minimum number of input lines per shard
+
+# A WeekLine holds one line of output for a Week, and what to do with it:
+#     (line, 'b' Event that starts a night or None, date of the Event's Day,
+#      is an event line that may be discarded, is a 3-element 'b' event line)
+WeekLine = Tuple[str, Optional[Event], Optional[date], bool, bool]
+
 
 def open_infile(filename) -> TextIOWrapper:
     """
@@ -120,49 +135,326 @@ class Extract:
         self.infile = infile
         # self.sunday_date = None
         self.new_week = None
+        self.in_week = False
         self.line_as_list = []
         self.in_missing_data = False  # TODO: new 2019-09-03
+        self.outfile = None  # None means sys.stdout
 
-    def lines_in_weeks_out(self) -> None:
+    def lines_in_weeks_out(self, jobs: int = 1) -> None:
         """
         Read lines from .csv file; output weeks, days, and events
 
+        :param jobs: if more than 1, read the file in shards with a pool
+                     of this many processes (see _scan_shards())
         Called by: client code
         """
-        in_week = False
-        out_buffer = []
-        for line in self.infile:
-            self.line_as_list = line.strip().split(',')[:22]
-            self.line_as_list = (
-                    self.line_as_list[:1] + [item.strip() for item in
-                                             self.line_as_list[1:]])
-            date_match_obj = self._re_match_date(self.line_as_list[0])
-            if not in_week:
-                self.new_week = None
-                if date_match_obj:
-                    in_week = self._look_for_week(date_match_obj)
-            if in_week:  # 'if' is correct here
-                # output good data and discard bad data
-                in_week = self._handle_week(out_buffer)
+        for _ in self._weeks_out(jobs):
+            pass
+
+    def lines_in_weeks_out_since(self, checkpoint_path: str,
+                                 pending: bool = False) \
+            -> Optional[checkpoint.Checkpoint]:
+        """
+        Read the .csv file from the checkpoint in checkpoint_path; output
+        the weeks, days, and events of the Weeks completed since
+
+        self.infile must be an open mmap_reader.MmapReader. Output is
+        written a Week at a time, when the blank line ending the Week is
+        read, and the checkpoint is then moved past that Week: an
+        unfinished Week at the end of the file is written by a later run.
+        A resumed run first writes the last day header written before the
+        checkpoint, so the transform stage knows the current date.
+        If the file before the checkpoint has changed, or there is no
+        checkpoint, the whole file is read.
+
+        The new checkpoint marks the Weeks written, not the Weeks loaded.
+        :param pending: if True, save the new checkpoint to
+                        checkpoint.pending_path(checkpoint_path), for the
+                        caller to commit once the output is loaded (see
+                        checkpoint.commit_checkpoint()); else save it to
+                        checkpoint_path
+        :return: the new checkpoint, or None if the file was read with no
+                 checkpoint
+        Called by: run_it.main(), client code
+        """
+        reader = self.infile
+        if reader.text_mode:
+            read_logger.warning('File has lone \\r line endings: '
+                                'reading it all, with no checkpoint')
+            self.lines_in_weeks_out()
+            return None
+        outfile = self.outfile or sys.stdout
+        out_buffer = OutputBuffer()
+        last_day_header = None
+        hasher = hashlib.sha256()
+        saved = checkpoint.load_checkpoint(checkpoint_path)
+        if saved:
+            prefix_hasher = checkpoint.prefix_matches(reader.data, saved)
+            if prefix_hasher:
+                hasher = prefix_hasher
+                reader.start = saved.offset
+                self.new_week = saved.new_week
+                self.in_missing_data = saved.in_missing_data
+                out_buffer = checkpoint.restore_buffer(saved)
+                last_day_header = saved.last_day_header
+                if last_day_header is not None:
+                    print(last_day_header, file=outfile)
+            else:
+                read_logger.warning('File changed before checkpoint: '
+                                    'reading it all')
+        offset = reader.start
+
+        def make_checkpoint():
+            return checkpoint.Checkpoint(
+                    offset, hasher.hexdigest(), self.new_week,
+                    self.in_missing_data, list(out_buffer.kept),
+                    list(out_buffer.events), last_day_header)
+
+        last_checkpoint = make_checkpoint()
+        week_out = io.StringIO()
+        self.outfile = week_out
+        try:
+            for _ in self._scan_weeks():
+                self._buffer_week_lines(self._get_week_lines(), out_buffer)
+                text = week_out.getvalue()
+                week_out.seek(0)
+                week_out.truncate()
+                outfile.write(text)
+                last_day_header = self._find_last_day_header(
+                        text, last_day_header)
+                checkpoint.hash_bytes(hasher, reader.data, offset,
+                                      reader.pos)
+                offset = reader.pos
+                last_checkpoint = make_checkpoint()
+        finally:
+            self.outfile = outfile
+            checkpoint.save_checkpoint(
+                    checkpoint.pending_path(checkpoint_path) if pending
+                    else checkpoint_path, last_checkpoint)
+        return last_checkpoint
+
+    @staticmethod
+    def _find_last_day_header(text: str, last_day_header: Optional[str]) \
+            -> Optional[str]:
+        """
+        Return the last day header line in text, or last_day_header if
+        there is none
+
+        Called by: lines_in_weeks_out_since()
+        """
+        for line in reversed(text.split('\n')):
+            if line.startswith('    '):
+                return line
+        return last_day_header
+
+    def iter_lines(self, jobs: int = 1) -> Iterator[str]:
+        """
+        Read lines from .csv file; yield the lines lines_in_weeks_out()
+        would write, as soon as they are known to be complete
+
+        :param jobs: as for lines_in_weeks_out()
+        Called by: client code
+        """
+        self.outfile = io.StringIO()
+        for _ in self._weeks_out(jobs):
+            text = self.outfile.getvalue()
+            if text:
+                self.outfile.seek(0)
+                self.outfile.truncate()
+                yield from text.split('\n')[:-1]
+
+    def iter_weeks(self, packed: bool = False) \
+            -> Iterator[Union[Week, PackedWeek]]:
+        """
+        Read lines from .csv file; yield each Week as soon as it is
+        complete, writing nothing
+
+        A Week is complete at the blank line that ends it, or at the end
+        of input. Its Days hold only Events from valid segments; nights
+        are not checked for completeness.
+        :param packed: if True, yield PackedWeeks, for callers that keep
+                       many Weeks in memory
+        Called by: iter_nights(), client code
+        """
+        weeks = self._scan_weeks()
+        if packed:
+            weeks = map(PackedWeek.from_week, weeks)
+        yield from weeks
+        if self.in_week:
+            yield PackedWeek.from_week(self.new_week) if packed \
+                else self.new_week
+
+    def iter_nights(self) -> Iterator[Night]:
+        """
+        Read lines from .csv file; yield each complete Night, writing
+        nothing
+
+        A Night is yielded once the 'b' Event that starts the next night
+        is seen, following the same rules as lines_in_weeks_out():
+        a night that starts with a 3-element 'b' Event and has complete
+        data is a 'b' Night; one whose end is missing is an 'N' Night with
+        no Events; one that follows missing data and is itself complete is
+        a 'Y' Night. Other nights, and Events before the first 'b' Event,
+        are dropped.
+        Called by: client code
+        """
+        night = None  # the Night currently being read
+        for week in self.iter_weeks():
+            for day in week:
+                for event in day.events:
+                    if event.action != 'b':
+                        if night:
+                            night.events.append(event)
+                        continue
+                    if night:
+                        if event.hours:  # night is complete
+                            yield night
+                        elif night.action == 'b':
+                            yield night._replace(action='N', events=[])
+                    action = 'b' if event.hours else 'Y'
+                    night = Night(day.dt_date, action, event.mil_time, [])
+
+    def _weeks_out(self, jobs: int = 1) -> Iterator[None]:
+        """
+        Pass each Week read to the output buffer, which writes good data
+        and discards bad data; yield after each Week
+
+        Called by: lines_in_weeks_out(), iter_lines()
+        """
+        out_buffer = OutputBuffer()
+        if jobs > 1:
+            all_week_lines = self._scan_shards(jobs)
+        else:
+            all_week_lines = (self._get_week_lines()
+                              for _ in self._scan_weeks())
+        for week_lines in all_week_lines:
+            self._buffer_week_lines(week_lines, out_buffer)
+            yield
         # handle any data left in buffer
         if out_buffer:
             self._handle_leftovers(out_buffer)
+        yield
+
+    def _scan_weeks(self) -> Iterator[Week]:
+        """
+        Read lines from .csv file; yield each Week when a blank line
+        ends it
+
+        self.new_week is left holding the last Week seen, if any, and
+        self.in_week tells whether input ended inside that Week.
+        Called by: _weeks_out(), iter_weeks()
+        """
+        self.in_week = False
+        for tokens in self._iter_tokens():
+            if not self.in_week:
+                self.new_week = None
+                if tokens.date_match:
+                    self.in_week = self._look_for_week(tokens.date_match)
+            if self.in_week:  # 'if' is correct here
+                if tokens.kind != BLANK_ROW:
+                    # adds events to Week
+                    self.in_week = self._get_events(tokens.segments)
+                else:  # we saw a blank line: our week has ended
+                    self.in_week = False
+                    yield self.new_week
+
+    def _iter_tokens(self) -> Iterator[LineTokens]:
+        """
+        Yield LineTokens for each line of self.infile
+
+        An infile that tokenizes its own lines, like MmapReader, is passed
+        a callable telling it whether the scan is inside a Week, so it may
+        skip the lines outside a Week that cannot start one.
+        Called by: _scan_weeks()
+        """
+        iter_tokens = getattr(self.infile, 'iter_tokens', None)
+        if iter_tokens:
+            return iter_tokens(lambda: self.in_week)
+        return map(tokenize_line, self.infile)
+
+    def _scan_shards(self, jobs: int) -> Iterator[Iterable[WeekLine]]:
+        """
+        Split the .csv file into shards at blank lines, and scan the
+        shards and make their WeekLines in a pool of 'jobs' processes;
+        yield the WeekLines for each Week, in input order
+
+        A blank line always leaves _scan_weeks() outside a Week, so each
+        shard can be scanned by a fresh Extract. Which nights are complete
+        depends on the nights before them, so the WeekLines are passed to
+        the output buffer here, in order, by _weeks_out(). Log records
+        made by the workers are handled here too, in the order the serial
+        path would make them, and an exception raised by a worker is
+        raised here once the WeekLines made before it have been yielded.
+        On return, self.in_week and self.new_week are as _scan_weeks()
+        would leave them.
+        Called by: _weeks_out()
+        """
+        with multiprocessing.Pool(jobs) as pool:
+            for shard_weeks, records, in_week, new_week, error in \
+                    pool.imap(_scan_shard, _iter_shards(self.infile)):
+                for week_records, week_lines in shard_weeks:
+                    self._handle_records(week_records)
+                    yield week_lines
+                self._handle_records(records)
+                self.in_week, self.new_week = in_week, new_week
+                if error:
+                    raise error
+
+    def _scan_shard(self) -> Tuple[list, list, bool, Optional[Week],
+                                   Optional[Exception]]:
+        """
+        Scan the lines of one shard, and make the WeekLines for each Week
+
+        Log records are collected rather than handled. Returns
+            a list of (log records, WeekLines) for each Week,
+            the log records made after the last Week,
+            self.in_week and self.new_week,
+            the exception that stopped the scan, or None
+        Called by: _scan_shard() (module level)
+        """
+        collector = logging.handlers.BufferingHandler(sys.maxsize)
+        handlers, propagate = read_logger.handlers, read_logger.propagate
+        read_logger.handlers, read_logger.propagate = [collector], False
+        shard_weeks = []
+        error = None
+        try:
+            for _ in self._scan_weeks():
+                week_records, collector.buffer = collector.buffer, []
+                week_lines = []
+                shard_weeks.append((week_records, week_lines))
+                week_lines.extend(self._get_week_lines())
+        except Exception as e:
+            error = e
+        finally:
+            read_logger.handlers, read_logger.propagate = handlers, propagate
+        return (shard_weeks, collector.buffer, self.in_week, self.new_week,
+                error)
+
+    @staticmethod
+    def _handle_records(records: List[logging.LogRecord]) -> None:
+        """
+        Handle log records collected by a worker process
+
+        Called by: _scan_shards()
+        """
+        for record in records:
+            read_logger.handle(record)
 
     @staticmethod
     def _re_match_date(field: str) -> re.match:
         """
         Check for a date at start of param 'field'.
 
-        Called by: lines_in_weeks_out()
+        Called by: _scan_weeks()
         """
-        return re.match(r'(\d{1,2})/(\d{1,2})/(\d{4})', field)
+        return DATE_RE.match(field)
 
     def _look_for_week(self, date_match_obj: re.match) -> \
             bool:
         """
         Does current input line represent the start of a week?
 
-        Called by: lines_in_weeks_out()
+        Called by: _scan_weeks()
         """
         sunday_date = self._match_obj_to_date(date_match_obj)
         if self._is_a_sunday(sunday_date):
@@ -195,31 +487,12 @@ class Extract:
                     [])  # [] will hold Event list for Day
                 for x in range(Extract.DAYS_IN_A_WEEK)]
 
-    def _handle_week(self, out_buffer: list) -> bool:
-        """
-        if there are valid events in self.line_as_list:
-            call self._get_events() to store them as Event objects in Week
-            object new_week
-        else:
-            call self._manage_output_buffer() to write good data, discard
-            incomplete data from self.output_buffer
-        return False iff our week is over
-
-        Called by: lines_in_weeks_out()
-        """
-        have_events = False
-        if any(self.line_as_list):
-            have_events = self._get_events()  # adds events to Week
-        else:  # we saw a blank line: our week has ended
-            self._manage_output_buffer(out_buffer)
-        return have_events
-
-    def _handle_leftovers(self, out_buffer: list) -> None:
+    def _handle_leftovers(self, out_buffer: OutputBuffer) -> None:
         """
         If there is data left in output_buffer, calls
                 self._manage_output_buffer().
 
-        Called by: lines_in_weeks_out()
+        Called by: _weeks_out()
         """
         self._manage_output_buffer(out_buffer)
 
@@ -228,7 +501,7 @@ class Extract:
         """
         Convert a successful regex match to a datetime.date object
 
-        Called by: lines_in_weeks_out()
+        Called by: _look_for_week()
         """
         if m:
             # group(3) is the year, group(1) is the month, group(2) is the day
@@ -237,57 +510,86 @@ class Extract:
         else:
             return None
 
-    def _get_events(self) -> bool:
+    def _get_events(self, segments: Optional[List[SegmentToken]] = None) \
+            -> bool:
         """
-        Add each valid event in self.line_as_list to self.new_week.
+        Add each valid event in segments to self.new_week.
 
+        :param segments: the segment tokens of a line, from tokenize_line();
+                         if None, self.line_as_list is tokenized
         return True iff we successfully read at least one event
-                       from self.line_as_list
-        Called by: _handle_week()
+                       from the line
+        Called by: _scan_weeks()
         """
-        shorter_line = self.line_as_list[1:]
+        if segments is None:
+            segments = tokenize_segments(self.line_as_list)
         have_events = False
-        for ix in range(7):
-            # a segment is a list of 3 consecutive fields from the .csv file
-            segment = shorter_line[3 * ix: 3 * ix + 3]
-            segment = [seg.strip() for seg in segment]
-            if validate_segment(segment):
-                an_event = Event(*segment)
-            # elif [seg.strip() for seg in segment] == ['', '', '']:
-            elif segment == ['', '', '']:
-                an_event = None
-            else:
-                read_logger.warning('segment {} not valid in _get_events()\n'
-                                    '\tsegment date is {}'.
-                                    format(segment,
-                                           self.new_week[ix].dt_date))
-                continue
+        for ix, an_event in enumerate(segments):
+            # a list is a segment not valid, or cut short by a short line
+            if isinstance(an_event, list):
+                if validate_segment(an_event):
+                    an_event = Event(*an_event)
+                else:
+                    read_logger.warning('segment {} not valid in '
+                                        '_get_events()\n'
+                                        '\tsegment date is {}'.
+                                        format(an_event,
+                                               self.new_week[ix].dt_date))
+                    continue
             if self.new_week and an_event and an_event.action:
                 self.new_week[ix].events.append(an_event)
                 have_events = True
         return have_events
 
     # TODO: explain
-    def _manage_output_buffer(self, out_buffer: list) -> None:
+    def _manage_output_buffer(self, out_buffer: OutputBuffer) -> None:
         """
         Convert the Events in self.new_week into strings, place the strings
         into output buffer, and pass output buffer to _write_or_discard_night()
 
         :return: None
-        Called by: _handle_leftovers(), _handle_week()
+        Called by: _handle_leftovers()
         """
         if self.new_week:  # a Week of 7 Days beginning with a Sunday
-            out_buffer.append(self._get_week_header())
-            for day in self.new_week:
-                out_buffer.append(self._get_day_header(day))
-                for event in day.events:
-                    event_str = 'action: {}, time: {}'.format(event.action,
-                                                              event.mil_time)
-                    if event.hours:
-                        event_str += ', hours: {:.2f}'.format(float(event.hours))
-                    if event.action == 'b':
-                        self._write_or_discard_night(event, day.dt_date, out_buffer)
-                    out_buffer.append(event_str)
+            self._buffer_week_lines(self._get_week_lines(), out_buffer)
+
+    def _get_week_lines(self) -> Iterator[WeekLine]:
+        """
+        Convert self.new_week and its Days and Events into WeekLines
+
+        Called by: _manage_output_buffer(), _weeks_out(), _scan_shard()
+        """
+        yield self._get_week_header(), None, None, False, False
+        for day in self.new_week:
+            yield self._get_day_header(day), None, None, False, False
+            for event in day.events:
+                event_str = 'action: {}, time: {}'.format(event.action,
+                                                          event.mil_time)
+                hours_str = ''
+                if event.hours:
+                    hours_str = '{:.2f}'.format(float(event.hours))
+                    event_str += ', hours: ' + hours_str
+                yield (event_str,
+                       event if event.action == 'b' else None,
+                       day.dt_date,
+                       self._is_event(event, hours_str),
+                       self._is_complete_b_event(event, hours_str))
+
+    def _buffer_week_lines(self, week_lines: Iterable[WeekLine],
+                           out_buffer: OutputBuffer) -> None:
+        """
+        Place WeekLines into output buffer, passing output buffer to
+        _write_or_discard_night() at the start of each night
+
+        Called by: _manage_output_buffer(), _weeks_out()
+        """
+        for line, b_event, dt_date, is_event, is_complete_b in week_lines:
+            if b_event:
+                self._write_or_discard_night(b_event, dt_date, out_buffer)
+            if is_event:
+                out_buffer.append_event(line, is_complete_b)
+            else:  # never discarded
+                out_buffer.append_kept(line)
 
     def _get_week_header(self) -> str:
         """
@@ -308,15 +610,18 @@ class Extract:
 
     def _write_or_discard_night(self, action_b_event: Event,
                                 datetime_date: date,
-                                out_buffer: list,
-                                outfile: TextIOWrapper = sys.stdout) -> None:
+                                out_buffer: OutputBuffer,
+                                outfile: TextIOWrapper = None) -> None:
         """
         Write (only) complete nights from out_buffer to outfile.
 
         action_b_event is the first Event for some night. It will have an
         'hours' field iff we have complete data for the preceding night.
+        outfile defaults to self.outfile, or to sys.stdout if that is None.
         Called by: _manage_output_buffer()
         """
+        if outfile is None:
+            outfile = self.outfile or sys.stdout
         if action_b_event.hours:  # we have complete data for preceding night
             self._write_complete_night(out_buffer, outfile)
         else:
@@ -324,14 +629,14 @@ class Extract:
                              format(datetime_date))
             self._discard_incomplete_night(out_buffer, outfile)
 
-    def _write_complete_night(self, out_buffer: list, outfile: TextIOWrapper) \
-            -> None:
+    def _write_complete_night(self, out_buffer: OutputBuffer,
+                              outfile: TextIOWrapper) -> None:
         """
         Write a complete night from output buffer to outfile
         # TODO: break this into 2 functions (?)  CHECK LINE THAT CAUSES ERROR
         Called by: _write_or_discard_night()
         """
-        for line in out_buffer:
+        for line in out_buffer.lines():
             if self.in_missing_data:
                 if line.startswith('action: b'):
                     line = line.replace('b', 'Y', 1)  # TODO: CHECK THIS !!!
@@ -339,58 +644,113 @@ class Extract:
             print(line, file=outfile)
         out_buffer.clear()
 
-    def _discard_incomplete_night(self, out_buffer: list,
+    def _discard_incomplete_night(self, out_buffer: OutputBuffer,
                                   outfile: TextIOWrapper) -> None:
         """
+        Discard the event lines in output buffer, leaving kept lines
 
+        A 3-element 'b' event line means there's good data before it: its
+        night's start is written as an 'N' event line.
         Called by: _write_or_discard_night()
         """
-        # pop incomplete data from end of output buffer
-        for buf_ix in range(len(out_buffer) - 1, -1, -1):
-            this_line = out_buffer[buf_ix]
-            # if we see a 3-element 'b' event, there's good data before it
-            if self._match_complete_b_event_line(this_line):
-                no_data_line = self._get_no_data_line(out_buffer, buf_ix)
-                print(no_data_line, file=outfile)
-            elif self._match_event_line(this_line):  # pop only Event lines
-                out_buffer.pop(buf_ix)  # leave headers in buffer
+        for _, line, is_complete_b in reversed(out_buffer.events):
+            if is_complete_b:
+                print(self._get_no_data_line(line), file=outfile)
+        out_buffer.events.clear()
         self.in_missing_data = True
 
     @staticmethod
-    def _match_complete_b_event_line(line: str) -> re.match:
-        """
-        Called by: _write_or_discard_night()
+    def _get_no_data_line(line: str) -> str:
         """
-        return re.match(r'action: b, time: \d{1,2}:\d{2},'
-                        r' hours: \d{1,2}\.\d{2}$', line)
+        Convert a 3-element 'b' event line to a 2-element 'N' event line
 
-    # TODO: fix docstring
-    @staticmethod
-    def _get_no_data_line(out_buffer: list, buf_ix: int) -> str:
-        """
-
-        :param out_buffer:
-        :param buf_ix:
-        :return:
         Called by: _discard_incomplete_night()
         """
-        line = out_buffer.pop(buf_ix).replace('b', 'N', 1)
+        line = line.replace('b', 'N', 1)
         if line.count(',') == 2:
             pos = line.rfind(',')
             line = line[:pos]
         return line
 
     @staticmethod
-    def _match_event_line(line: str) -> re.match:
+    def _is_complete_b_event(event: Event, hours_str: str) -> bool:
         """
-        Called by: _write_or_discard_night()
+        Is event a 3-element 'b' event, with time and hours in the formats
+        lines_in_weeks_out() writes?
+
+        hours_str is event.hours as written, or '' if event has no hours.
+        Called by: _manage_output_buffer()
+        """
+        return (event.action == 'b' and Extract._is_time_str(event.mil_time)
+                and Extract._is_hours_str(hours_str))
+
+    @staticmethod
+    def _is_event(event: Event, hours_str: str) -> bool:
         """
-        # b events may have 2 or 3 elements
-        match_line = r'(?:action: b, time: \d{1,2}:\d{2})' \
-                     r'(?:, hours: \d{1,2}\.\d{2})?$'
-        # s events must have 2 elements
-        match_line += r'|(?:action: s, time: \d{1,2}:\d{2}$)'
-        # w events must have 3 elements
-        match_line += r'|(?:action: w, time: \d{1,2}:\d{2}, ' \
-                      r'hours: \d{1,2}\.\d{2}$)'
-        return re.match(match_line, line)
+        Is event a 2- or 3-element 'b' event, a 2-element 's' event, or a
+        3-element 'w' event, with time and hours in the formats
+        lines_in_weeks_out() writes? Only such events are discarded with
+        an incomplete night.
+
+        hours_str is event.hours as written, or '' if event has no hours.
+        Called by: _manage_output_buffer()
+        """
+        if not Extract._is_time_str(event.mil_time):
+            return False
+        if event.action == 'b':
+            return not hours_str or Extract._is_hours_str(hours_str)
+        if event.action == 's':
+            return not hours_str
+        if event.action == 'w':
+            return Extract._is_hours_str(hours_str)
+        return False
+
+    @staticmethod
+    def _is_time_str(time_str: str) -> bool:
+        """
+        Does time_str hold 1 or 2 digits, a colon, and 2 digits?
+
+        Called by: _is_event(), _is_complete_b_event()
+        """
+        hrs, colon, mins = time_str.partition(':')
+        return (bool(colon) and 0 < len(hrs) < 3 and hrs.isdecimal() and
+                len(mins) == 2 and mins.isdecimal())
+
+    @staticmethod
+    def _is_hours_str(hours_str: str) -> bool:
+        """
+        Does hours_str hold 1 or 2 digits, a decimal point, and 2 digits?
+
+        Called by: _is_event(), _is_complete_b_event()
+        """
+        whole, point, frac = hours_str.partition('.')
+        return (bool(point) and 0 < len(whole) < 3 and whole.isdecimal() and
+                len(frac) == 2 and frac.isdecimal())
+
+
+def _iter_shards(lines: Iterable[str]) -> Iterator[List[str]]:
+    """
+    Split lines into shards of at least SHARD_LINES lines (except maybe
+    the last), each but the last ending with a blank line
+
+    Called by: Extract._scan_shards()
+    """
+    shard = []
+    for line in lines:
+        shard.append(line)
+        if len(shard) >= SHARD_LINES and \
+                tokenize_line(line).kind == BLANK_ROW:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+def _scan_shard(lines: List[str]) -> Tuple[list, list, bool, Optional[Week],
+                                           Optional[Exception]]:
+    """
+    Run in a worker process: scan one shard
+
+    Called by: Extract._scan_shards()
+    """
+    return Extract(lines)._scan_shard()
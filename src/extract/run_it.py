@@ -18,7 +18,9 @@ import logging
 import logging.handlers
 
 # import container_objs
+import checkpoint
 import read_fns
+from mmap_reader import MmapReader
 from tests.file_access_wrappers import FileReadAccessWrapper
 
 
@@ -45,13 +47,52 @@ def set_up_loggers():
     read_logger.propagate = False
 
 
-if __name__ == '__main__':
+def main():
+    """
+    Run the extract stage, with the arguments in sys.argv
+    Called by: __main__, src/__main__.py
+    """
     set_up_loggers()
     logging.info('extract start')
     parser = argparse.ArgumentParser()
-    parser.add_argument('infile_name', help='The name of a .csv file to read')
+    parser.add_argument('infile_name', nargs='?',
+                        help='The name of a .csv file to read')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Read the file in shards with this many '
+                             'processes')
+    parser.add_argument('-m', '--mmap', action='store_true',
+                        help='Read the file through mmap')
+    parser.add_argument('-c', '--checkpoint',
+                        help='Output only the weeks completed since the '
+                             'checkpoint in this file, and update it '
+                             '(reads the file through mmap)')
+    parser.add_argument('--pending', action='store_true',
+                        help='With --checkpoint, write the updated '
+                             'checkpoint to CHECKPOINT.pending, to be '
+                             'committed once the output is loaded')
+    parser.add_argument('--commit-checkpoint', metavar='CHECKPOINT',
+                        help='Replace CHECKPOINT with CHECKPOINT.pending, '
+                             'after the output of a run with --pending is '
+                             'loaded, and read no file')
     args = parser.parse_args()
-    infile = read_fns.open_infile(FileReadAccessWrapper(args.infile_name))
+    if args.commit_checkpoint:
+        if not checkpoint.commit_checkpoint(args.commit_checkpoint):
+            logging.warning('no checkpoint pending for {}'.format(
+                args.commit_checkpoint))
+        logging.info('extract finish')
+        return
+    if args.infile_name is None:
+        parser.error('the infile_name argument is required')
+    use_mmap = args.mmap or args.checkpoint
+    wrapper = MmapReader if use_mmap else FileReadAccessWrapper
+    infile = read_fns.open_infile(wrapper(args.infile_name))
     extract = read_fns.Extract(infile)
-    extract.lines_in_weeks_out()
+    if args.checkpoint:
+        extract.lines_in_weeks_out_since(args.checkpoint, args.pending)
+    else:
+        extract.lines_in_weeks_out(args.jobs)
     logging.info('extract finish')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+# file: src/json_state.py
+# andrew jarcho
+# 2024-09-01
+
+
+"""
+State kept between runs in a JSON file: extract's checkpoint, the chunked
+load's resume point, and the chart's render cache.
+
+Each file holds a dict with a 'version' key, which the code that reads it
+checks. A file is written to a '.tmp' file beside it, which then replaces
+it, so a run that is stopped while writing leaves the last complete file
+in place.
+"""
+import json
+import os
+
+
+def save_json_state(path, version, state):
+    """
+    Write state, and its version, to path, replacing any earlier file only
+    once the new one is complete
+
+    :param path: the file's name
+    :param version: the version of the file's format
+    :param state: a dict that json.dump() can write
+    :return: None
+    Called by: checkpoint.save_checkpoint(),
+               chunked_load.save_resume_point(), RenderCache.save()
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as outfile:
+        json.dump(dict(state, version=version), outfile)
+    os.replace(tmp_path, path)
@@ -0,0 +1,332 @@
+# file: src/load/chunked_load.py
+# andrew jarcho
+# 2024-07-21
+
+
+"""
+Load NIGHT and NAP records a chunk of nights at a time, so a bad row does
+not throw away a whole load.
+
+Each chunk is committed in a transaction of its own. A row the db rejects
+is written to a quarantine file, with its input line number and the
+reason, and the rest of its chunk is still loaded:
+    sl_insert_night() and sl_insert_nap() catch their own errors and
+        return 'error inserting ... into db'; that row is rejected
+    a nap whose duration is not a number of quarter hours is rejected
+        without being sent
+    a row that raises an error rolls its chunk back, and the chunk is
+        loaded again with a savepoint around each row, so only that row
+        is lost
+A nap whose night was rejected is rejected with it, as it has no night to
+belong to.
+
+After each chunk is committed, a resume file records how many input lines
+have been loaded, and a hash of them. A load given the same resume file
+starts after those lines, as long as the input still begins with them;
+so a load that stopped part way, or a re-run after lines were appended,
+sends only the lines not yet loaded.
+"""
+import collections
+import hashlib
+import itertools
+import json
+import logging
+from typing import Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.json_state import save_json_state
+from src.load import load
+
+
+RESUME_VERSION = 1
+COMMIT_EVERY = 7  # nights per chunk: about a week
+RECORD_LENGTHS = {'NIGHT': 5, 'NAP': 3}
+
+load_logger = logging.getLogger('load.load')
+
+
+class ResumePoint(collections.namedtuple('ResumePointTuple',
+                                         'lines, prefix_sha256')):
+    """
+    Each ResumePointTuple holds:
+        lines -- the number of input lines loaded and committed
+        prefix_sha256 -- the hex sha256 of those lines, as loaded
+    """
+    pass
+
+
+def load_records_chunked(engine, records, commit_every=COMMIT_EVERY,
+                         quarantine_name=None, resume_name=None,
+                         incremental=False):
+    """
+    Load NIGHT and NAP records, committing every commit_every nights
+
+    :param engine: the db engine
+    :param records: an iterable of records from the transform stage
+    :param commit_every: the most nights in a chunk
+    :param quarantine_name: if given, append rejected rows to this file;
+                            else only log them
+    :param resume_name: if given, start after the lines this file says
+                        were loaded, and update it as chunks are committed
+    :param incremental: if True, skip the nights and naps already in the
+                        db
+    :return: the number of rows rejected
+    Called by: load.load_records()
+    """
+    line_hasher = _LineHasher()
+    numbered = line_hasher.read(enumerate(records, 1))
+    if resume_name:
+        numbered = _skip_loaded_lines(numbered, load_resume_point(resume_name),
+                                      line_hasher)
+    n_rejected = 0
+    quarantine = open(quarantine_name, 'a') if quarantine_name else None
+    connection = engine.connect()
+    try:
+        if incremental:
+            with connection.begin():
+                night_ids, loaded_naps = load.select_loaded_nights(connection)
+            numbered = _skip_loaded_nights(numbered, night_ids, loaded_naps)
+        for chunk in iter_chunks(numbered, commit_every):
+            rejected = store_chunk(connection, chunk)
+            n_rejected += len(rejected)
+            _quarantine(quarantine, rejected)
+            if resume_name:
+                last_line = chunk[-1][0]
+                save_resume_point(resume_name, ResumePoint(
+                    last_line, line_hasher.hexdigest_through(last_line)))
+    finally:
+        connection.close()
+        if quarantine:
+            quarantine.close()
+    return n_rejected
+
+
+def iter_chunks(numbered, commit_every):
+    """
+    Group (line number, record) pairs into lists of up to commit_every
+    nights, along with the naps that follow each of them
+
+    Chunks are only ever split just before a NIGHT record.
+    Called by: load_records_chunked()
+    """
+    chunk = []
+    n_nights = 0
+    for line_num, record in numbered:
+        if record[0] == 'NIGHT':
+            if n_nights == commit_every:
+                yield chunk
+                chunk, n_nights = [], 0
+            n_nights += 1
+        chunk.append((line_num, record))
+    if chunk:
+        yield chunk
+
+
+def store_chunk(connection, chunk):
+    """
+    Insert a chunk of records, and commit them
+
+    If a row raises an error, the chunk is rolled back and inserted again,
+    with a savepoint around each row.
+    :param connection: an open db connection, outside a transaction
+    :param chunk: (line number, record) pairs
+    :return: (line number, record, reason) for each row rejected
+    Called by: load_records_chunked()
+    """
+    try:
+        with connection.begin():
+            return _store_rows(connection, chunk, savepoints=False)
+    except SQLAlchemyError as e:
+        load_logger.warning('chunk at line {} rolled back: {}; loading it '
+                            'a row at a time'.format(chunk[0][0], e))
+    with connection.begin():
+        return _store_rows(connection, chunk, savepoints=True)
+
+
+def _store_rows(connection, chunk, savepoints):
+    """
+    Insert each record of a chunk, in the current transaction
+
+    :param savepoints: if True, insert each row under a savepoint, and
+                       reject a row that raises an error; else let the
+                       error through
+    Called by: store_chunk()
+    """
+    rejected = []
+    night_line = None  # the line of the last night rejected, if any
+    inserts = load.PreparedInserts(connection)
+    try:
+        for line_num, record in chunk:
+            if record[0] == 'NIGHT':
+                night_line = None
+            elif record[0] != 'NAP':
+                if any(record):
+                    rejected.append((line_num, record, 'not a NIGHT or NAP'))
+                continue
+            elif night_line is not None:
+                rejected.append((line_num, record,
+                                 'night at line {} was rejected'.format(
+                                     night_line)))
+                continue
+            if len(record) != RECORD_LENGTHS[record[0]]:
+                result = 'wrong number of fields'
+            elif savepoints:
+                savepoint = connection.begin_nested()
+                try:
+                    result = insert_record(inserts, record)
+                    savepoint.commit()
+                except SQLAlchemyError as e:
+                    savepoint.rollback()
+                    result = str(getattr(e, 'orig', None) or e).strip()
+                    result = result.splitlines()[0] if result else repr(e)
+            else:
+                result = insert_record(inserts, record)
+            if not result.endswith('succeeded'):
+                rejected.append((line_num, record, result.strip()))
+                if record[0] == 'NIGHT':
+                    night_line = line_num
+    finally:
+        inserts.close()
+    return rejected
+
+
+def insert_record(inserts, record) -> str:
+    """
+    Insert a NIGHT or NAP record with sl_insert_night() or sl_insert_nap()
+
+    :param inserts: the connection's load.PreparedInserts
+    :return: the text the procedure returned, or the reason a nap was not
+             sent
+    Called by: _store_rows()
+    """
+    if record[0] == 'NIGHT':
+        return inserts.insert_night(*record[1:])
+    interval_str = load.decimal_to_interval(record[2])
+    if interval_str.endswith(':None'):
+        return 'bad duration {}'.format(record[2])
+    if isinstance(record, load.NapOfLoadedNight):
+        return inserts.insert_night_nap(record.night_id, record[1],
+                                        interval_str)
+    return inserts.insert_nap(record[1], interval_str)
+
+
+def load_resume_point(path: str) -> Optional[ResumePoint]:
+    """
+    Read a resume file; return None if there is none, or it cannot be used
+
+    Called by: load_records_chunked()
+    """
+    try:
+        with open(path) as infile:
+            state = json.load(infile)
+        if state.pop('version') != RESUME_VERSION:
+            raise ValueError('unknown resume file version')
+        return ResumePoint(**state)
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError) as e:
+        load_logger.warning('Ignoring resume file {}: {}'.format(path, e))
+        return None
+
+
+def save_resume_point(path: str, resume_point: ResumePoint) -> None:
+    """
+    Write a resume file, replacing any earlier one only once the new one
+    is complete
+
+    Called by: load_records_chunked()
+    """
+    save_json_state(path, RESUME_VERSION, resume_point._asdict())
+
+
+def _skip_loaded_lines(numbered, resume_point, line_hasher):
+    """
+    Leave out the lines a resume point says were loaded, if the input
+    begins with them; else leave out none
+
+    Called by: load_records_chunked()
+    """
+    if resume_point is None:
+        return numbered
+    loaded = list(itertools.islice(numbered, resume_point.lines))
+    if len(loaded) == resume_point.lines and \
+            line_hasher.hexdigest_through(resume_point.lines, peek=True) == \
+            resume_point.prefix_sha256:
+        line_hasher.hexdigest_through(resume_point.lines)
+        load_logger.info('resuming after line {}'.format(resume_point.lines))
+        return numbered
+    load_logger.warning('Input changed before line {}: loading it '
+                        'all'.format(resume_point.lines))
+    return itertools.chain(loaded, numbered)
+
+
+def _skip_loaded_nights(numbered, night_ids, loaded_naps):
+    """
+    load.skip_loaded_records(), for (line number, record) pairs
+
+    Called by: load_records_chunked()
+    """
+    line_num = None
+
+    def records():
+        nonlocal line_num
+        for line_num, record in numbered:
+            yield record
+
+    # skip_loaded_records() yields each record it keeps as soon as it
+    # reads it, so line_num is that record's
+    for record in load.skip_loaded_records(records(), night_ids,
+                                           loaded_naps):
+        yield line_num, record
+
+
+class _LineHasher:
+    """
+    Hash the input lines in order, as the lines before each resume point
+    are known
+    """
+    def __init__(self):
+        self.hasher = hashlib.sha256()
+        self.pending = collections.deque()  # (line number, bytes) read
+
+    def read(self, numbered):
+        """ Yield (line number, record) pairs, keeping each to hash """
+        for line_num, record in numbered:
+            self.pending.append((line_num, _record_bytes(record)))
+            yield line_num, record
+
+    def hexdigest_through(self, last_line, peek=False) -> str:
+        """
+        The hex sha256 of the lines read through last_line; unless peek,
+        those lines are hashed for good
+        """
+        hasher = self.hasher.copy() if peek else self.hasher
+        for line_num, line_bytes in self.pending:
+            if line_num > last_line:
+                break
+            hasher.update(line_bytes)
+        if not peek:
+            while self.pending and self.pending[0][0] <= last_line:
+                self.pending.popleft()
+        return hasher.hexdigest()
+
+
+def _record_bytes(record) -> bytes:
+    return (', '.join(record) + '\n').encode('utf-8')
+
+
+def _quarantine(quarantine, rejected):
+    """
+    Log rejected rows, and write them to the quarantine file, if any, as
+    tab-separated line number, record, and reason
+
+    Called by: load_records_chunked()
+    """
+    for line_num, record, reason in rejected:
+        load_logger.warning('line {} rejected: {}'.format(line_num, reason))
+        if quarantine:
+            quarantine.write('{}\t{}\t{}\n'.format(line_num, ', '.join(record),
+                                                   reason))
+    if quarantine:
+        quarantine.flush()
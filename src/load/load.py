@@ -5,102 +5,753 @@
 # 2017-02-20
 
 
+import datetime
+import functools
 import logging
 import logging.handlers
 import fileinput
-# TODO: eliminate need for sqlalchemy
-from sqlalchemy import create_engine, func
+import io
+# sqlalchemy is imported only where the db is used, so a debug run
+# (load.py False) does not pay for importing it
 import os
 import sys
 from time import sleep
 
+from src import copy_format, sleep_time
+
+
+load_logger = logging.getLogger('load.load')
+
+BATCH_SIZE = 1000  # nights per call to sl_insert_nights_bulk()
+POOL_SIZE = 5  # connections an engine keeps open between loads
+COPY_CHUNK_SIZE = 1 << 16  # bytes per write to the db server with COPY
+
+# The night staging table draws night_id from the sl_night sequence as each
+# row is copied in, so naps can be linked to their night with a join on
+# night_seq instead of relying on currval('sl_night_night_id_seq').
+CREATE_STAGING_TABLES = """
+CREATE TEMP TABLE sl_night_stage (
+    night_seq integer NOT NULL,
+    night_id integer NOT NULL DEFAULT nextval('sl_night_night_id_seq'),
+    start_date date NOT NULL,
+    start_time time NOT NULL,
+    start_no_data boolean,
+    end_no_data boolean,
+    loaded boolean NOT NULL DEFAULT false
+) ON COMMIT DROP;
+
+CREATE TEMP TABLE sl_nap_stage (
+    nap_seq integer NOT NULL,
+    night_seq integer NOT NULL,
+    start_time time NOT NULL,
+    duration interval hour to minute NOT NULL
+) ON COMMIT DROP;
+"""
+
+COPY_NIGHT_STAGE = ('COPY sl_night_stage (night_seq, start_date, start_time, '
+                    'start_no_data, end_no_data) FROM STDIN')
+
+COPY_NAP_STAGE = ('COPY sl_nap_stage (nap_seq, night_seq, start_time, '
+                  'duration) FROM STDIN')
+
+INSERT_FROM_STAGING_TABLES = """
+INSERT INTO sl_night (night_id, start_date, start_time, start_no_data,
+                      end_no_data)
+SELECT night_id, start_date, start_time, start_no_data, end_no_data
+FROM sl_night_stage
+WHERE NOT loaded
+ORDER BY night_seq;
+
+INSERT INTO sl_nap (start_time, duration, night_id)
+SELECT p.start_time, p.duration, n.night_id
+FROM sl_nap_stage p JOIN sl_night_stage n USING (night_seq)
+ORDER BY p.nap_seq;
+"""
+
+# The per-row inserts, prepared once per db connection; the server parses
+# and plans each of them once, not once per row. Parameter types are
+# inferred from the functions' signatures.
+PREPARE_INSERTS = """
+PREPARE sl_insert_night_plan AS SELECT sl_insert_night($1, $2, $3, $4);
+PREPARE sl_insert_nap_plan AS SELECT sl_insert_nap($1, $2);
+PREPARE sl_insert_night_nap_plan (integer, time, interval) AS
+    SELECT (sl_insert_naps_bulk(ARRAY[$1], ARRAY[1], ARRAY[$2], ARRAY[$3]))[1];
+"""
+EXECUTE_INSERT_NIGHT = 'EXECUTE sl_insert_night_plan (%s, %s, %s, %s)'
+EXECUTE_INSERT_NAP = 'EXECUTE sl_insert_nap_plan (%s, %s)'
+EXECUTE_INSERT_NIGHT_NAP = 'EXECUTE sl_insert_night_nap_plan (%s, %s, %s)'
+# psycopg 3 prepares a statement itself, when asked to
+INSERT_NIGHT = 'SELECT sl_insert_night(%s, %s, %s, %s)'
+INSERT_NAP = 'SELECT sl_insert_nap(%s, %s)'
+INSERT_NIGHT_NAP = (
+    'SELECT (sl_insert_naps_bulk(ARRAY[CAST(%s AS integer)], ARRAY[1], '
+    'ARRAY[CAST(%s AS time)], ARRAY[CAST(%s AS interval)]))[1]')
+
+# Incremental loads skip the nights already in sl_night, by start_date and
+# start_time, and the naps of those nights already in sl_nap, by start_time;
+# a nap added to a night already loaded is inserted with the night's id.
+SELECT_LOADED_NIGHTS = ('SELECT start_date, start_time, min(night_id) '
+                        'FROM sl_night GROUP BY start_date, start_time')
+
+SELECT_LOADED_NAPS = ('SELECT n.start_date, n.start_time, p.start_time '
+                      'FROM sl_nap p JOIN sl_night n USING (night_id)')
+
+# The same rule, for rows copied into the staging tables: a night already
+# loaded is marked, and takes the id it was loaded with, so the join in
+# INSERT_FROM_STAGING_TABLES links its new naps to it.
+MARK_LOADED_IN_STAGE = """
+UPDATE sl_night_stage s
+SET loaded = true,
+    night_id = (SELECT min(n.night_id) FROM sl_night n
+                WHERE n.start_date = s.start_date
+                  AND n.start_time = s.start_time)
+WHERE EXISTS (SELECT 1 FROM sl_night n
+              WHERE n.start_date = s.start_date
+                AND n.start_time = s.start_time);
+"""
+
+DELETE_LOADED_NAPS_FROM_STAGE = """
+DELETE FROM sl_nap_stage p
+USING sl_night_stage s
+WHERE s.night_seq = p.night_seq
+  AND s.loaded
+  AND EXISTS (SELECT 1 FROM sl_nap q JOIN sl_night n USING (night_id)
+              WHERE n.start_date = s.start_date
+                AND n.start_time = s.start_time
+                AND q.start_time = p.start_time);
+"""
+
+INSERT_NIGHTS_BULK = (
+    'SELECT sl_insert_nights_bulk(CAST(:start_dates AS date[]), '
+    'CAST(:start_times AS time[]), CAST(:start_no_data AS boolean[]), '
+    'CAST(:end_no_data AS boolean[]))')
+
+INSERT_NAPS_BULK = (
+    'SELECT sl_insert_naps_bulk(CAST(:night_ids AS integer[]), '
+    'CAST(:night_positions AS integer[]), CAST(:start_times AS time[]), '
+    'CAST(:durations AS interval[]))')
+
+
+@functools.lru_cache(maxsize=None)
+def sql(statement):
+    """
+    A SQL statement as a sqlalchemy TextClause, made once per statement
+
+    Called by: the functions that execute SQL text
+    """
+    from sqlalchemy import text
+    return text(statement)
+
 
 def decimal_to_interval(dec_str):
     """
     Convert duration from a decimal string to an interval string
     (E.g., '3.25' for 3 1/4 hours becomes '03:15').
-    Called by: read_nights_naps()
+    Called by: store_record(), store_nights_naps_batched()
     """
-    dec_mins_to_mins = {'00': '00', '25': '15', '50': '30', '75': '45'}
-    hrs, dec_mins = dec_str.split('.')
-    mins = None
-    try:
-        mins = dec_mins_to_mins[dec_mins]
-    except KeyError:
+    interval_str = sleep_time.decimal_to_interval(dec_str)
+    if interval_str is None:
+        hrs, _, dec_mins = dec_str.partition('.')
         logging.warning('Value for dec_mins {} not found in '
                         'decimal_to_interval()'.format(dec_mins))
-    interval_str = '{}:{}'.format(hrs, mins)
+        interval_str = '{}:None'.format(hrs)
     return interval_str
 
 
-def read_nights_naps(engine, infile_name=sys.stdin):
+def read_nights_naps(engine, infile_name=sys.stdin, bulk=False,
+                     batch_size=None, incremental=False, commit_every=None,
+                     quarantine_name=None, resume_name=None):
     """
     Read NIGHT and NAP data from infile_name;
     call function to load that data into database.
 
     :param engine: the db engine
     :param infile_name: read data from file or stdin
+    :param bulk: if True, load all the data with COPY instead of
+                 one stored procedure call per line
+    :param batch_size: if given, load the data in batches of this many
+                       nights with the array-based stored procedures
+    :param incremental: if True, skip the nights and naps already in the db
+    :param commit_every: see load_records()
+    :param quarantine_name: see load_records()
+    :param resume_name: see load_records()
     :return: None
     Called by: connect()
     """
     with fileinput.input(infile_name) as data_source:
-        connection = engine.connect()
-        trans = connection.begin()
-        try:
-            keep_going = True
-            while keep_going:
-                my_line = data_source.readline()
-                keep_going = store_nights_naps(connection, my_line)
-            trans.commit()
-        except Exception:
-            trans.rollback()
-            raise
+        load_records(engine, records_from_lines(data_source), bulk,
+                     batch_size, incremental, commit_every, quarantine_name,
+                     resume_name)
+
+
+def load_records(engine, records, bulk=False, batch_size=None,
+                 incremental=False, commit_every=None, quarantine_name=None,
+                 resume_name=None):
+    """
+    Load NIGHT and NAP records into the database in one transaction
+
+    :param engine: the db engine
+    :param records: an iterable of records, each a sequence of strings
+                    such as ('NAP', '04:45', '01.50')
+    :param bulk: if True, load all the records with COPY
+    :param batch_size: if given, load the records in batches of this many
+                       nights
+    :param incremental: if True, skip the nights and naps already in the
+                        db
+    :param commit_every: if given, load the records one row at a time,
+                         committing every commit_every nights, instead of
+                         in one transaction; bulk and batch_size are then
+                         not used. See chunked_load.
+    :param quarantine_name: with commit_every, the file to append rows
+                            the db rejects to
+    :param resume_name: with commit_every, the file that records how far
+                        the load got, and where to start from
+    :return: None
+    Called by: read_nights_naps(), client code
+    """
+    if commit_every:
+        from src.load import chunked_load
+        chunked_load.load_records_chunked(engine, records, commit_every,
+                                          quarantine_name, resume_name,
+                                          incremental)
+        return
+    connection = engine.connect()
+    trans = connection.begin()
+    try:
+        if incremental and not bulk:
+            records = skip_loaded_records(records,
+                                          *select_loaded_nights(connection))
+        if bulk:
+            copy_nights_naps(connection, records, incremental)
+        elif batch_size:
+            store_nights_naps_batched(connection, records, batch_size)
+        else:
+            store_records(connection, records)
+        trans.commit()
+    except Exception:
+        trans.rollback()
+        raise
+    finally:
+        connection.close()  # back to the engine's pool
+
+
+def select_loaded_nights(connection):
+    """
+    Find the nights and naps already in the db
+
+    :param connection: an open db connection
+    :return: a dict of the id of each night in sl_night, keyed by its
+             start_date, as 'yyyy-mm-dd', and its start time, in minutes
+             since midnight; and a frozenset of the naps in sl_nap, each
+             as its night's key and its start time, in minutes
+    Called by: load_records(), chunked_load.load_records_chunked()
+    """
+    night_ids = {(start_date.isoformat(), time_minutes(start_time)): night_id
+                 for start_date, start_time, night_id in
+                 connection.execute(sql(SELECT_LOADED_NIGHTS))}
+    loaded_naps = frozenset(
+        (start_date.isoformat(), time_minutes(start_time),
+         time_minutes(nap_time))
+        for start_date, start_time, nap_time in
+        connection.execute(sql(SELECT_LOADED_NAPS)))
+    return night_ids, loaded_naps
+
+
+def time_minutes(my_time):
+    """
+    :param my_time: a datetime.time
+    :return: my_time as minutes since midnight
+    Called by: select_loaded_nights()
+    """
+    return my_time.hour * sleep_time.MINUTES_PER_HOUR + my_time.minute
+
+
+class NapOfLoadedNight(list):
+    """
+    A NAP record whose night is already in the db, as night_id
+
+    sl_insert_nap() adds a nap to the last night inserted, so such a nap is
+    inserted with its night's id instead.
+    """
+    def __init__(self, record, night_id):
+        super().__init__(record)
+        self.night_id = night_id
+
+
+def skip_loaded_records(records, night_ids, loaded_naps):
+    """
+    Leave out the NIGHT and NAP records already in the db
+
+    A NAP record that follows a night already in the db, but is not in the
+    db itself, is kept, as a NapOfLoadedNight.
+    :param records: records from the transform stage
+    :param night_ids: see select_loaded_nights()
+    :param loaded_naps: see select_loaded_nights()
+    Called by: load_records(), chunked_load._skip_loaded_nights()
+    """
+    night_key = night_id = None  # of the night loaded, if in one
+    n_nights = n_naps = 0
+    for record in records:
+        if record[0] == 'NIGHT':
+            night_key = (record[1], sleep_time.TIME_MINUTES.get(record[2]))
+            night_id = night_ids.get(night_key)
+            if night_id is not None:
+                n_nights += 1
+                continue
+        elif record[0] != 'NAP':
+            night_id = None
+        elif night_id is not None:
+            if (*night_key, sleep_time.TIME_MINUTES.get(record[1])) in \
+                    loaded_naps:
+                n_naps += 1
+                continue
+            record = NapOfLoadedNight(record, night_id)
+        yield record
+    load_logger.info('skipped {} nights and {} naps already loaded'.format(
+        n_nights, n_naps))
+
+
+def records_from_lines(lines):
+    """
+    Split each line of transform stage output into a record
+
+    Called by: read_nights_naps()
+    """
+    for my_line in lines:
+        yield my_line.rstrip().split(', ')
+
+
+def store_records(connection, records):
+    """
+    Insert records into the db one at a time, stopping at the first
+    record that is neither a NIGHT nor a NAP
+
+    Called by: load_records()
+    """
+    inserts = PreparedInserts(connection)
+    try:
+        for record in records:
+            if not store_record(connection, record, inserts):
+                break
+    finally:
+        inserts.close()
 
 
 def store_nights_naps(connection, my_line):
     """
     Insert a line of data into the db
 
-    If the line starts with 'NIGHT':
+    :param connection: an open db connection
+    :param my_line: a line of data from the transform stage
+    :return: True if the line was inserted, else False
+    Called by: client code
+    """
+    inserts = PreparedInserts(connection)
+    try:
+        return store_record(connection, my_line.rstrip().split(', '),
+                            inserts)
+    finally:
+        inserts.close()
+
+
+def store_record(connection, line_list, inserts):
+    """
+    Insert a record into the db
+
+    If the record starts with 'NIGHT':
         insert a night into sl_night
-    If the line starts with 'NAP':
+    If the record starts with 'NAP':
         insert a nap into sl_nap
 
     :param connection: an open db connection
-    :param my_line: a line of data from the transform stage
-    :return: True if the line was inserted, else False
-    Called by read_nights_naps()
+    :param line_list: a record, as a sequence of strings
+    :param inserts: the connection's PreparedInserts
+    :return: True if the record was inserted, else False
+    Called by store_records(), store_nights_naps()
     """
-    success = False
-    line_list = my_line.rstrip().split(', ')
+    if line_list[0] not in ('NIGHT', 'NAP'):
+        return False
     if line_list[0] == 'NIGHT':
-        result = connection.execute(
-            func.sl_insert_night(*line_list[1:])
-        )
-        load_logger.debug(result)
-        success = True
-    elif line_list[0] == 'NAP':
-        result = connection.execute(
-            func.sl_insert_nap(line_list[1],
-                               decimal_to_interval(line_list[2])
-                               )
-        )
-        load_logger.debug(result)
-        success = True
-    return success
-
-
-def connect(url):
+        result = inserts.insert_night(*line_list[1:])
+    elif isinstance(line_list, NapOfLoadedNight):
+        result = inserts.insert_night_nap(line_list.night_id, line_list[1],
+                                          decimal_to_interval(line_list[2]))
+    else:
+        result = inserts.insert_nap(line_list[1],
+                                    decimal_to_interval(line_list[2]))
+    load_logger.debug(result)
+    return True
+
+
+class PreparedInserts:
+    """
+    Insert nights and naps with sl_insert_night() and sl_insert_nap(),
+    through statements the db server prepares once per connection
+
+    The statements are executed on the DBAPI cursor, with the parameters
+    bound, so SQLAlchemy compiles nothing per row. With psycopg2, they are
+    made by PREPARE, the first time a pooled connection is used; psycopg 3
+    prepares them itself.
+    """
+    def __init__(self, connection):
+        """
+        :param connection: an open db connection
+        Called by: store_records(), store_nights_naps(),
+                   chunked_load._store_rows()
+        """
+        dbapi_connection = connection.connection
+        self.cursor = dbapi_connection.cursor()
+        self.dbapi_error = connection.dialect.loaded_dbapi.Error
+        self.psycopg2 = hasattr(self.cursor, 'copy_expert')
+        if self.psycopg2 and not dbapi_connection.info.get('sl_prepared'):
+            self._execute(PREPARE_INSERTS, None)
+            # a prepared statement lasts as long as the db session
+            dbapi_connection.info['sl_prepared'] = True
+
+    def insert_night(self, start_date, start_time, start_no_data,
+                     end_no_data) -> str:
+        """
+        :return: the text sl_insert_night() returned
+        """
+        return self._select(EXECUTE_INSERT_NIGHT, INSERT_NIGHT,
+                            (start_date, start_time, start_no_data,
+                             end_no_data))
+
+    def insert_nap(self, start_time, duration) -> str:
+        """
+        :return: the text sl_insert_nap() returned
+        """
+        return self._select(EXECUTE_INSERT_NAP, INSERT_NAP,
+                            (start_time, duration))
+
+    def insert_night_nap(self, night_id, start_time, duration) -> str:
+        """
+        Insert a nap into the night night_id, with sl_insert_naps_bulk();
+        a start time or duration that is not valid is sent as NULL, which
+        it rejects
+
+        :return: the text sl_insert_nap() would have returned
+        """
+        if duration.endswith(':None'):
+            duration = None
+        nap_id = self._select(EXECUTE_INSERT_NIGHT_NAP, INSERT_NIGHT_NAP,
+                              (night_id, checked_time(start_time), duration))
+        return ('sl_insert_nap() succeeded' if nap_id else
+                'error inserting nap into db')
+
+    def close(self):
+        self.cursor.close()
+
+    def _select(self, execute_sql, select_sql, params) -> str:
+        if self.psycopg2:
+            self._execute(execute_sql, params)
+        else:
+            self._execute(select_sql, params, prepare=True)
+        row = self.cursor.fetchone()
+        return row[0] if row and row[0] else ''
+
+    def _execute(self, statement, params, **kwargs):
+        """
+        Execute statement on the cursor, raising a DBAPI error as SQLAlchemy
+        would
+        """
+        try:
+            self.cursor.execute(statement, params, **kwargs)
+        except self.dbapi_error as e:
+            from sqlalchemy.exc import DBAPIError
+            raise DBAPIError(statement, params, e) from e
+
+
+def store_nights_naps_batched(connection, records, batch_size=BATCH_SIZE):
+    """
+    Insert NIGHT and NAP records into the db a batch at a time
+
+    A batch holds up to batch_size nights, along with the naps that follow
+    each of them; batches are only ever split just before a NIGHT line.
+    A NapOfLoadedNight is sent with the batch it is read in.
+
+    :param connection: an open db connection
+    :param records: an iterable of records from the transform stage
+    :param batch_size: the maximum number of nights in a batch
+    :return: None
+    Called by: load_records()
+    """
+    nights = []
+    naps = []
+    loaded_ids = []  # the ids of the loaded nights of the batch's naps
+    for line_num, line_list in enumerate(records, 1):
+        if line_list[0] == 'NIGHT':
+            if len(nights) == batch_size:
+                store_batch(connection, nights, naps, loaded_ids)
+                nights, naps, loaded_ids = [], [], []
+            nights.append((line_num, *line_list[1:]))
+        elif line_list[0] == 'NAP':
+            interval_str = decimal_to_interval(line_list[2])
+            if interval_str.endswith(':None'):
+                interval_str = None  # the db will reject the nap
+            if isinstance(line_list, NapOfLoadedNight):
+                loaded_ids.append(line_list.night_id)
+                position = -len(loaded_ids)
+            else:
+                # position is 1-based, to index the db's night_ids array
+                position = len(nights)
+            naps.append((line_num, position, line_list[1], interval_str))
+    if nights or naps:
+        store_batch(connection, nights, naps, loaded_ids)
+
+
+def store_batch(connection, nights, naps, loaded_ids=()):
+    """
+    Insert a batch of nights, then the naps that belong to them
+
+    A date or time the db could not cast would fail the whole batch, so
+    each is checked here first, and sent as NULL if it is not valid: the
+    bulk functions reject a row with a NULL, and the rest of the batch is
+    stored.
+
+    :param connection: an open db connection
+    :param nights: (line number, date, time, start_no_data, end_no_data)
+                   tuples
+    :param naps: (line number, night position, time, interval) tuples;
+                 a night position of -k stands for loaded_ids[k - 1]
+    :param loaded_ids: the ids of nights already in the db
+    :return: the number of rows rejected
+    Called by: store_nights_naps_batched()
+    """
+    start_dates = [checked_date(night[1]) for night in nights]
+    start_times = [checked_time(night[2]) for night in nights]
+    nap_times = [checked_time(nap[2]) for nap in naps]
+    night_ids = connection.execute(sql(INSERT_NIGHTS_BULK), {
+        'start_dates': start_dates,
+        'start_times': start_times,
+        'start_no_data': [night[3] == 'true' for night in nights],
+        'end_no_data': [night[4] == 'true' for night in nights],
+    }).scalar() or []
+    nap_ids = []
+    if naps:
+        nap_ids = connection.execute(sql(INSERT_NAPS_BULK), {
+            'night_ids': night_ids + list(loaded_ids),
+            'night_positions': [nap[1] if nap[1] >= 0 else
+                                len(night_ids) - nap[1] for nap in naps],
+            'start_times': nap_times,
+            'durations': [nap[3] for nap in naps],
+        }).scalar() or []
+    rejected = {row[0] for row, start_date, start_time in
+                zip(nights, start_dates, start_times)
+                if start_date is None or start_time is None}
+    rejected.update(row[0] for row, start_time in zip(naps, nap_times)
+                    if start_time is None or row[3] is None)
+    rejected.update(row[0] for row, row_id in zip(nights, night_ids)
+                    if row_id is None)
+    rejected.update(row[0] for row, row_id in zip(naps, nap_ids)
+                    if row_id is None)
+    if rejected:
+        load_logger.warning('db rejected input lines {}'.
+                            format(sorted(rejected)))
+    load_logger.debug('stored batch of {} nights and {} naps'.
+                      format(len(nights), len(naps)))
+    return len(rejected)
+
+
+def checked_date(date_str):
+    """
+    :return: date_str if it is a 'YYYY-MM-DD' date, else None
+    Called by: store_batch()
+    """
+    try:
+        datetime.date.fromisoformat(date_str)
+    except (TypeError, ValueError):
+        return None
+    return date_str
+
+
+def checked_time(time_str):
+    """
+    :return: time_str if it is an 'h:mm' or 'hh:mm' time of day, else None
+    Called by: store_batch(), PreparedInserts.insert_night_nap()
+    """
+    return time_str if time_str in sleep_time.TIME_MINUTES else None
+
+
+def split_nights_naps(records):
+    """
+    Split NIGHT and NAP records into rows for the COPY staging tables
+
+    See copy_format.split_nights_naps().
+    :param records: records from the transform stage
+    :return: a list of night rows and a list of nap rows, as tuples of
+             strings in staging table column order
+    Called by: copy_nights_naps()
+    """
+    night_rows = []
+    nap_rows = []
+    copy_format.split_nights_naps(records, night_rows.append,
+                                  nap_rows.append, load_logger)
+    return night_rows, nap_rows
+
+
+def copy_rows(connection, copy_sql, rows):
+    """
+    Send rows to the db server with a COPY ... FROM STDIN statement
+
+    :param connection: an open db connection
+    :param copy_sql: the COPY statement
+    :param rows: tuples of strings, one per table row
+    :return: None
+    Called by: copy_nights_naps()
+    """
+    data = ''.join(map(copy_format.format_row, rows))
+    copy_file(connection, copy_sql, io.StringIO(data))
+
+
+def copy_file(connection, copy_sql, infile):
+    """
+    Send the COPY text in infile to the db server as it is
+
+    :param connection: an open db connection
+    :param copy_sql: the COPY statement
+    :param infile: a file open for read in text mode
+    :return: None
+    Called by: copy_rows(), copy_files()
+    """
+    cursor = connection.connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):  # psycopg2
+            cursor.copy_expert(copy_sql, infile, size=COPY_CHUNK_SIZE)
+        else:  # psycopg 3
+            with cursor.copy(copy_sql) as copy:
+                for chunk in iter(lambda: infile.read(COPY_CHUNK_SIZE), ''):
+                    copy.write(chunk)
+    finally:
+        cursor.close()
+
+
+def copy_nights_naps(connection, records, incremental=False):
+    """
+    Load all NIGHT and NAP records with COPY
+
+    The records are copied into temporary staging tables, then moved into
+    sl_night and sl_nap with one INSERT ... SELECT each.
+
+    :param connection: an open db connection, inside a transaction
+    :param records: an iterable of records from the transform stage
+    :param incremental: if True, skip the nights and naps already in the
+                        db
+    :return: None
+    Called by: load_records()
+    """
+    night_rows, nap_rows = split_nights_naps(records)
+    connection.execute(sql(CREATE_STAGING_TABLES))
+    copy_rows(connection, COPY_NIGHT_STAGE, night_rows)
+    copy_rows(connection, COPY_NAP_STAGE, nap_rows)
+    if incremental:
+        skip_loaded_in_stage(connection)
+    connection.execute(sql(INSERT_FROM_STAGING_TABLES))
+    load_logger.debug('copied {} nights and {} naps'.format(len(night_rows),
+                                                            len(nap_rows)))
+
+
+def copy_files(connection, nights_file, naps_file, incremental=False):
+    """
+    Load the night and nap rows written by Transform.write_copy_rows()
+    with COPY, through the staging tables
+
+    :param connection: an open db connection, inside a transaction
+    :param nights_file: the night rows, open for read in text mode
+    :param naps_file: the nap rows, open for read in text mode
+    :param incremental: if True, skip the nights and naps already in the
+                        db
+    :return: None
+    Called by: load_copy_files()
+    """
+    connection.execute(sql(CREATE_STAGING_TABLES))
+    copy_file(connection, COPY_NIGHT_STAGE, nights_file)
+    copy_file(connection, COPY_NAP_STAGE, naps_file)
+    if incremental:
+        skip_loaded_in_stage(connection)
+    connection.execute(sql(INSERT_FROM_STAGING_TABLES))
+    load_logger.debug('copied nights from {} and naps from {}'.format(
+        nights_file.name, naps_file.name))
+
+
+def skip_loaded_in_stage(connection):
+    """
+    Leave the nights and naps already in the db out of the rows copied
+    into the staging tables, as skip_loaded_records() does
+
+    :param connection: an open db connection, inside a transaction
+    :return: None
+    Called by: copy_nights_naps(), copy_files()
+    """
+    n_nights = connection.execute(sql(MARK_LOADED_IN_STAGE)).rowcount
+    n_naps = connection.execute(sql(DELETE_LOADED_NAPS_FROM_STAGE)).rowcount
+    load_logger.info('skipped {} nights and {} naps already loaded'.format(
+        n_nights, n_naps))
+
+
+def load_copy_files(engine, nights_name, naps_name, incremental=False):
+    """
+    Load the night and nap rows in two files into the database in one
+    transaction
+
+    :param incremental: if True, skip the nights and naps already in the db
+    Called by: connect(), client code
+    """
+    with open(nights_name) as nights_file, open(naps_name) as naps_file:
+        connection = engine.connect()
+        trans = connection.begin()
+        try:
+            copy_files(connection, nights_file, naps_file, incremental)
+            trans.commit()
+        except Exception:
+            trans.rollback()
+            raise
+        finally:
+            connection.close()  # back to the engine's pool
+
+
+@functools.lru_cache(maxsize=None)
+def get_engine(url, pool_size=POOL_SIZE, max_overflow=0):
+    """
+    The db engine for url, with a pool of pool_size connections
+
+    An engine is made once per url and pool size, and kept, so its pooled
+    connections are reused by every later load in the process rather than
+    set up again. A pooled connection is checked before it is reused, in
+    case the db server has closed it.
+    :param url: the db url
+    :param pool_size: the connections kept open between loads
+    :param max_overflow: the connections opened beyond pool_size when all
+                         of those are in use, and closed when returned
+    :return: the engine
+    Called by: connect(), LoadService, pipeline.run_pipeline()
+    """
+    from sqlalchemy import create_engine
+    return create_engine(url, pool_size=pool_size, max_overflow=max_overflow,
+                         pool_pre_ping=True)
+
+
+def connect(url, bulk=False, batch_size=None, copy_from=None,
+            incremental=False, commit_every=None, quarantine_name=None,
+            resume_name=None):
     """
     Connect to the PostgreSQL db server;
     invoke read_nights_naps() to load data from input to db_s_etl.
 
     :param url: the db url
+    :param bulk: if True, load the data with COPY
+    :param batch_size: if given, load the data in batches of this many
+                       nights
+    :param copy_from: if given, the names of a night file and a nap file
+                      written by Transform.write_copy_rows(), to load
+                      instead of the input
+    :param incremental: if True, skip the nights and naps already in the db
+    :param commit_every: see load_records()
+    :param quarantine_name: see load_records()
+    :param resume_name: see load_records()
     :return: None
     Called by: client code
     """
-    engine = create_engine(url)
-
     try:
         # if 'True' is a c.l. arg:
         #     if a file name is also a c.l. arg:
@@ -108,12 +759,31 @@ def connect(url):
         #     else:
         #         read from stdin
         sys.argv.remove('True')
-        infile_name = sys.argv[1] if len(sys.argv) > 1 else '-'
-        read_nights_naps(engine, infile_name)
+        engine = get_engine(url)
+        if copy_from:
+            load_copy_files(engine, *copy_from, incremental)
+        else:
+            infile_name = sys.argv[1] if len(sys.argv) > 1 else '-'
+            read_nights_naps(engine, infile_name, bulk, batch_size,
+                             incremental, commit_every, quarantine_name,
+                             resume_name)
     except ValueError:
         pass  # don't touch the db
 
 
+def db_url_from_env():
+    """
+    Build the db url from the environment
+
+    :return: the url
+    :raise KeyError: if DB_USERNAME, DB_PASSWORD, or DB_NAME is not set
+    Called by: client code
+    """
+    return 'postgresql://{}:{}@127.0.0.1/{}'.format(
+            os.environ['DB_USERNAME'], os.environ['DB_PASSWORD'],
+            os.environ['DB_NAME'])
+
+
 def main():
     """
     Set up root (network) logger and load logger
@@ -160,14 +830,54 @@ def setup_load_logger():
     return load_logger
 
 
-if __name__ == '__main__':
-    load_logger = main()
+def run():
+    """
+    Run the load stage, with the arguments in sys.argv
+    Called by: __main__, src/__main__.py
+    """
+    main()  # sets up load_logger
     logging.info('load start')
     try:
-        url = 'postgresql://{}:{}@127.0.0.1/{}'.format(
-                os.environ['DB_USERNAME'], os.environ['DB_PASSWORD'], os.environ['DB_NAME'])
+        url = db_url_from_env()
     except KeyError:
         print('Please set the environment variables DB_USERNAME, DB_PASSWORD, and DB_NAME')
         sys.exit(1)
-    connect(url)  # only c.l.a. will be 'True' or 'False'
+    bulk = '--bulk' in sys.argv
+    if bulk:
+        sys.argv.remove('--bulk')
+    incremental = '--incremental' in sys.argv
+    if incremental:
+        sys.argv.remove('--incremental')
+    batch_size = None
+    if '--batch-size' in sys.argv:
+        ix = sys.argv.index('--batch-size')
+        batch_size = int(sys.argv[ix + 1])
+        del sys.argv[ix: ix + 2]
+    commit_every = None
+    if '--commit-every' in sys.argv:
+        ix = sys.argv.index('--commit-every')
+        commit_every = int(sys.argv[ix + 1])
+        del sys.argv[ix: ix + 2]
+    quarantine_name = None
+    if '--quarantine' in sys.argv:  # followed by a file name
+        ix = sys.argv.index('--quarantine')
+        quarantine_name = sys.argv[ix + 1]
+        del sys.argv[ix: ix + 2]
+    resume_name = None
+    if '--resume' in sys.argv:  # followed by a file name
+        ix = sys.argv.index('--resume')
+        resume_name = sys.argv[ix + 1]
+        del sys.argv[ix: ix + 2]
+    copy_from = None
+    if '--copy-from' in sys.argv:  # followed by a night and a nap file name
+        ix = sys.argv.index('--copy-from')
+        copy_from = sys.argv[ix + 1: ix + 3]
+        del sys.argv[ix: ix + 3]
+    # other c.l.a. will be 'True' or 'False'
+    connect(url, bulk, batch_size, copy_from, incremental, commit_every,
+            quarantine_name, resume_name)
     logging.info('load finish')
+
+
+if __name__ == '__main__':
+    run()
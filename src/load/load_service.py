@@ -0,0 +1,250 @@
+#!/usr/bin/python3
+
+# file: src/load/load_service.py
+# andrew jarcho
+# 2024-07-14
+
+
+"""
+Load several input streams into the db at once, over pooled connections.
+
+A LoadService keeps one engine, and its pool of connections, for as long
+as it is used, so a small load pays for a connection only the first time
+one is needed. Each stream is loaded in its own transaction, on its own
+connection from the pool, by a thread of its own; a stream that fails is
+rolled back without touching the others.
+
+A stream is either a file of transform stage output, loaded as
+load.read_nights_naps() loads it, or a (nights, naps) pair of files
+written by Transform.write_copy_rows(), loaded with COPY as
+load.load_copy_files() loads it. The time each stream took, and its
+records per second, are logged and returned.
+
+usage: PYTHONPATH=. python3 src/load/load_service.py [--bulk]
+           [--batch-size N] [-i] [--pool-size N] [-j N]
+           [--copy-from NIGHTS NAPS]... [FILE]...
+"""
+import argparse
+import collections
+import concurrent.futures
+import fileinput
+import sys
+import time
+
+from src.load import load
+
+
+class LoadStats(collections.namedtuple('LoadStats',
+                                       'name records seconds error')):
+    """
+    How the load of one stream went: its name, the records (or COPY rows)
+    it held, the seconds it took, and the exception that stopped it, or
+    None
+    """
+    __slots__ = ()
+
+    @property
+    def records_per_second(self):
+        return self.records / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        outcome = 'failed: {!r}'.format(self.error) if self.error else 'ok'
+        return '{}: {} records in {:.3f} s ({:.0f} records/s) {}'.format(
+            self.name, self.records, self.seconds, self.records_per_second,
+            outcome)
+
+
+class LoadService:
+    """
+    Load streams into the db over a pool of connections
+    """
+    def __init__(self, url, pool_size=load.POOL_SIZE, max_overflow=0,
+                 bulk=False, batch_size=None, incremental=False):
+        """
+        :param url: the db url
+        :param pool_size: the connections kept open, and so the most
+                          streams loaded at once without opening more
+        :param max_overflow: the connections opened beyond pool_size when
+                             all of those are in use
+        :param bulk: if True, load records with COPY
+        :param batch_size: if given, load records in batches of this many
+                           nights
+        :param incremental: if True, skip the nights and naps already in
+                            the db
+        """
+        self.engine = load.get_engine(url, pool_size, max_overflow)
+        self.max_connections = pool_size + max_overflow
+        self.bulk = bulk
+        self.batch_size = batch_size
+        self.incremental = incremental
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Close the pooled connections; the next load opens new ones
+        """
+        self.engine.dispose()
+
+    def load_records(self, name, records):
+        """
+        Load an iterable of records in one transaction
+
+        :param name: the name the stream is reported under
+        :param records: records from the transform stage
+        :return: a LoadStats
+        Called by: load_file(), client code
+        """
+        counter = _Counter(records)
+        return self._timed(name, lambda: load.load_records(
+                self.engine, counter, self.bulk, self.batch_size,
+                self.incremental),
+                lambda: counter.count)
+
+    def load_file(self, file_name):
+        """
+        Load a file of transform stage output in one transaction
+
+        Called by: load_stream()
+        """
+        # a FileInput of its own: fileinput.input() allows one per process
+        with fileinput.FileInput(file_name) as data_source:
+            return self.load_records(file_name,
+                                     load.records_from_lines(data_source))
+
+    def load_copy_files(self, nights_name, naps_name):
+        """
+        Load the rows in a night file and a nap file in one transaction
+
+        Called by: load_stream()
+        """
+        def count_rows():
+            return sum(_count_lines(name) for name in (nights_name,
+                                                       naps_name))
+
+        return self._timed('{}+{}'.format(nights_name, naps_name),
+                           lambda: load.load_copy_files(self.engine,
+                                                        nights_name,
+                                                        naps_name,
+                                                        self.incremental),
+                           count_rows)
+
+    def load_stream(self, stream):
+        """
+        Load a file name of transform output, or a (nights, naps) pair
+        of COPY file names
+
+        Called by: load_streams()
+        """
+        if isinstance(stream, str):
+            return self.load_file(stream)
+        return self.load_copy_files(*stream)
+
+    def load_streams(self, streams, jobs=None):
+        """
+        Load streams at once, each in its own transaction and thread
+
+        :param streams: file names of transform output, and (nights, naps)
+                        pairs of COPY file names
+        :param jobs: the most streams loaded at once; by default, as many
+                     as the pool holds connections
+        :return: a LoadStats for each stream, in the order of streams
+        Called by: main(), client code
+        """
+        jobs = jobs or self.max_connections
+        with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+            return list(executor.map(self.load_stream, streams))
+
+    @staticmethod
+    def _timed(name, load_fn, count_fn):
+        """
+        Run load_fn, and log and return how it went
+
+        An exception it raises is logged and returned in the LoadStats,
+        so it does not stop the other streams.
+        Called by: load_records(), load_copy_files()
+        """
+        error = None
+        start = time.perf_counter()
+        try:
+            load_fn()
+        except Exception as e:
+            error = e
+        stats = LoadStats(name, count_fn(), time.perf_counter() - start,
+                          error)
+        if error:
+            load.load_logger.error(str(stats))
+        else:
+            load.load_logger.info(str(stats))
+        return stats
+
+
+class _Counter:
+    """
+    Iterate over records, counting them
+    """
+    def __init__(self, records):
+        self.records = records
+        self.count = 0
+
+    def __iter__(self):
+        for record in self.records:
+            self.count += 1
+            yield record
+
+
+def _count_lines(file_name):
+    """ The number of lines in a file, or 0 if it cannot be read """
+    try:
+        with open(file_name, 'rb') as infile:
+            return sum(chunk.count(b'\n')
+                       for chunk in iter(lambda: infile.read(1 << 16), b''))
+    except OSError:
+        return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load files of transform output into the db at once')
+    parser.add_argument('file_names', nargs='*', metavar='FILE',
+                        help='A file of transform output')
+    parser.add_argument('--copy-from', nargs=2, action='append', default=[],
+                        metavar=('NIGHTS', 'NAPS'),
+                        help='A night file and a nap file written by '
+                             'do_transform.py --copy')
+    parser.add_argument('--bulk', action='store_true',
+                        help='Load output with COPY')
+    parser.add_argument('--batch-size', type=int,
+                        help='Load output in batches of this many nights')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='Load only the nights and naps not already '
+                             'loaded')
+    parser.add_argument('--pool-size', type=int, default=load.POOL_SIZE,
+                        help='Keep this many db connections open')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='Load this many streams at once')
+    args = parser.parse_args()
+
+    load.main()
+    try:
+        url = load.db_url_from_env()
+    except KeyError:
+        print('Please set the environment variables DB_USERNAME, '
+              'DB_PASSWORD, and DB_NAME')
+        sys.exit(1)
+    streams = args.file_names + [tuple(pair) for pair in args.copy_from]
+    with LoadService(url, args.pool_size, bulk=args.bulk,
+                     batch_size=args.batch_size,
+                     incremental=args.incremental) as service:
+        all_stats = service.load_streams(streams, args.jobs)
+    for stats in all_stats:
+        print(stats)
+    sys.exit(1 if any(stats.error for stats in all_stats) else 0)
+
+
+if __name__ == '__main__':
+    main()
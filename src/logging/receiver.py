@@ -5,6 +5,7 @@
 import pickle
 import logging
 import logging.handlers
+import signal
 import socketserver
 import struct
 
@@ -76,14 +77,21 @@ class LogRecordSocketReceiver(socketserver.ThreadingTCPServer):
                 self.handle_request()
             abort = self.abort
 
+    def stop(self, signum=None, frame=None):
+        """Ask serve_until_stopped() to return; usable as a signal handler"""
+        self.abort = 1
+
 
 def main():
     logging.basicConfig(
             format='%(asctime)s  %(levelname)-8s %(message)s'
     )
     tcpserver = LogRecordSocketReceiver()
-    print('Starting TCP server...')
+    signal.signal(signal.SIGTERM, tcpserver.stop)
+    # mk_processes.py waits for this line before starting the stages
+    print('Starting TCP server...', flush=True)
     tcpserver.serve_until_stopped()
+    tcpserver.server_close()  # waits for any handler threads to finish
 
 
 if __name__ == '__main__':
@@ -9,53 +9,154 @@ and load stages.
 
 logging_process runs the network logging receiver that allows all 3 stages
 to log to the same file.
+
+The stages are started once the receiver is listening, and each stage runs
+until it sees EOF on its input pipe. The wall time and exit code of each
+stage are reported to stderr when the pipeline finishes.
 """
 
 import subprocess
+import sys
 import time
 import argparse
 
-note = 'Runs in debug mode unless -s switch is given.'
-parser = argparse.ArgumentParser(description=note)
-parser.add_argument('infile_name', help='The name of a .csv file to read')
-parser.add_argument('-s', '--store', help='Store output in database',
-                    action='store_true')
-args = parser.parse_args()
 
-# remove the --store argument from the args Namespace, if present
-args_dict = args.__dict__
-# args_dict[store] has been set to True if present
-store_in_db = str(args_dict.pop('store', False))
+def get_args():
+    """
+    Parse command line arguments
+
+    :return: the infile name, and the arguments for the load stage
+    Called by: main()
+    """
+    note = 'Runs in debug mode unless -s switch is given.'
+    parser = argparse.ArgumentParser(description=note)
+    parser.add_argument('infile_name', help='The name of a .csv file to read')
+    parser.add_argument('-s', '--store', help='Store output in database',
+                        action='store_true')
+    parser.add_argument('-b', '--bulk', help='Store output with COPY instead '
+                                             'of one insert per line',
+                        action='store_true')
+    parser.add_argument('--batch-size', type=int,
+                        help='Store output in batches of this many nights')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='Store only the nights and naps not already '
+                             'stored')
+    parser.add_argument('--commit-every', type=int,
+                        help='Store output a row at a time, committing '
+                             'every this many nights')
+    parser.add_argument('--quarantine',
+                        help='With --commit-every, write rows the db '
+                             'rejects to this file')
+    parser.add_argument('--resume',
+                        help='With --commit-every, resume from, and record '
+                             'progress in, this file')
+    args = parser.parse_args()
+
+    # load.py takes 'True' or 'False' as its first argument
+    load_args = [str(args.store)]
+    if args.bulk:
+        load_args.append('--bulk')
+    if args.batch_size:
+        load_args += ['--batch-size', str(args.batch_size)]
+    if args.incremental:
+        load_args.append('--incremental')
+    if args.commit_every:
+        load_args += ['--commit-every', str(args.commit_every)]
+    if args.quarantine:
+        load_args += ['--quarantine', args.quarantine]
+    if args.resume:
+        load_args += ['--resume', args.resume]
+    return args.infile_name, load_args
+
+
+def start_logging_process():
+    """
+    Start the network logging receiver, and wait until it is listening
+
+    The receiver writes one line to stdout once its socket is bound.
+    :return: the receiver process
+    Called by: main()
+    """
+    logging_process = subprocess.Popen(
+        ['./src/logging/receiver.py'],
+        stdout=subprocess.PIPE,
+    )
+    if not logging_process.stdout.readline():  # EOF: receiver failed
+        logging_process.wait()
+        sys.exit('logging receiver failed to start')
+    logging_process.stdout.close()
+    return logging_process
+
+
+def start_stages(infile_name, load_args):
+    """
+    Start the extract, transform, and load stages, connected by pipes
+
+    The parent's copy of each pipe is closed once the next stage holds it,
+    so a stage sees EOF (or a broken pipe) exactly when its neighbor exits.
+    :return: a list of (stage name, process, start time) tuples
+    Called by: main()
+    """
+    extract_process = subprocess.Popen(
+        ['./src/extract/run_it.py', infile_name],
+        stdout=subprocess.PIPE,
+    )
+    extract_start = time.perf_counter()
+
+    transform_process = subprocess.Popen(
+        ['./src/transform/do_transform.py'],
+        stdin=extract_process.stdout,
+        stdout=subprocess.PIPE,
+    )
+    transform_start = time.perf_counter()
+    extract_process.stdout.close()
 
-logging_process = subprocess.Popen(
-    ['./src/logging/receiver.py'],
-)
+    load_process = subprocess.Popen(
+        ['./src/load/load.py'] + load_args,
+        stdin=transform_process.stdout,
+    )
+    load_start = time.perf_counter()
+    transform_process.stdout.close()
 
-time.sleep(1)
+    return [('extract', extract_process, extract_start),
+            ('transform', transform_process, transform_start),
+            ('load', load_process, load_start)]
 
-extract_process = subprocess.Popen(
-    ['./src/extract/run_it.py', args.infile_name],
-    stdout=subprocess.PIPE,
-)
 
-time.sleep(5)
+def wait_for_stages(stages):
+    """
+    Wait for each stage to exit, and report its wall time and exit code
 
-transform_process = subprocess.Popen(
-    ['./src/transform/do_transform.py'],
-    stdin=extract_process.stdout,
-    stdout=subprocess.PIPE,
-)
+    :param stages: (stage name, process, start time) tuples, in pipeline
+                   order
+    :return: True iff every stage exited with status 0
+    Called by: main()
+    """
+    all_ok = True
+    for name, process, start in stages:
+        returncode = process.wait()
+        elapsed = time.perf_counter() - start
+        print('{}: {:.2f} s, exit code {}'.format(name, elapsed, returncode),
+              file=sys.stderr)
+        all_ok = all_ok and returncode == 0
+    return all_ok
 
-time.sleep(6)
 
-load_process = subprocess.Popen(
-    ['./src/load/load.py', store_in_db],
-    stdin=transform_process.stdout,
-)
+def main():
+    infile_name, load_args = get_args()
+    logging_process = start_logging_process()
+    pipeline_start = time.perf_counter()
+    try:
+        all_ok = wait_for_stages(start_stages(infile_name, load_args))
+    finally:
+        # the receiver finishes handling any records it has already been
+        # sent before it exits
+        logging_process.terminate()
+        logging_process.wait()
+    print('pipeline: {:.2f} s'.format(time.perf_counter() - pipeline_start),
+          file=sys.stderr)
+    return 0 if all_ok else 1
 
-time.sleep(15)
 
-extract_process.terminate()
-transform_process.terminate()
-load_process.terminate()
-logging_process.terminate()
+if __name__ == '__main__':
+    sys.exit(main())
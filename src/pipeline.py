@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+
+# file: src/pipeline.py
+# andrew jarcho
+# 2024-06-14
+
+
+"""
+Run the extract, transform, and load stages in a single process.
+
+Each stage is an iterator over the output of the one before it, so a night
+moves from the spreadsheet to the database without passing through a pipe
+or being formatted as text for the loader. Extract hands Transform each
+Night it reads (Extract.iter_nights(), Transform.iter_night_records()),
+so nights are not written as text lines and parsed again either; only
+the sharded extract (-j) and the NumPy transform (-t), which work on
+lines, still pass text between those two stages. mk_processes.py still
+runs the stages as separate processes, which is handy for debugging one
+stage.
+
+Runs in debug mode, printing the transform output, unless -s is given.
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+# read_fns imports container_objs as a top-level module, as it does when
+# run_it.py runs it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'extract'))
+
+from src.extract import read_fns  # noqa: E402
+from src.extract.mmap_reader import MmapReader  # noqa: E402
+from src.load import load  # noqa: E402
+from src.transform.do_transform import Transform  # noqa: E402
+from tests.file_access_wrappers import FileReadAccessWrapper  # noqa: E402
+
+
+def iter_records(infile_name, jobs=1, use_mmap=False, batch_transform=False):
+    """
+    Yield transform records for the spreadsheet in infile_name
+
+    With one job and no batch_transform, the Nights extract reads are
+    transformed as they are; see Transform.iter_night_records() for
+    where its records differ from those made from extract's lines.
+    Called by: run_pipeline()
+    """
+    wrapper = MmapReader if use_mmap else FileReadAccessWrapper
+    infile = read_fns.open_infile(wrapper(infile_name))
+    with infile:
+        extract = read_fns.Extract(infile)
+        if batch_transform:
+            for records in Transform().iter_record_blocks(
+                    extract.iter_lines(jobs)):
+                yield from records
+        elif jobs > 1:
+            yield from Transform().iter_records(extract.iter_lines(jobs))
+        else:
+            yield from Transform().iter_night_records(extract.iter_nights())
+
+
+def run_pipeline(infile_name, url=None, bulk=False, batch_size=None,
+                 jobs=1, use_mmap=False, batch_transform=False,
+                 incremental=False, commit_every=None, quarantine_name=None,
+                 resume_name=None):
+    """
+    Extract, transform, and load the spreadsheet in infile_name
+
+    :param infile_name: the name of a .csv file to read
+    :param url: the db url; if None, print the records instead
+    :param bulk: if True, load the records with COPY
+    :param batch_size: if given, load the records in batches of this many
+                       nights
+    :param jobs: if more than 1, extract with this many processes
+    :param use_mmap: if True, read the spreadsheet through mmap
+    :param batch_transform: if True, transform blocks of lines at a time
+                            with NumPy
+    :param incremental: if True, load only the nights and naps not
+                        already in the db
+    :param commit_every: see load.load_records()
+    :param quarantine_name: see load.load_records()
+    :param resume_name: see load.load_records()
+    :return: None
+    Called by: main()
+    """
+    records = iter_records(infile_name, jobs, use_mmap, batch_transform)
+    if url is None:
+        for record in records:
+            print(', '.join(record))
+    else:
+        load.load_records(load.get_engine(url), records, bulk, batch_size,
+                          incremental, commit_every, quarantine_name,
+                          resume_name)
+
+
+def main():
+    note = 'Runs in debug mode unless -s switch is given.'
+    parser = argparse.ArgumentParser(description=note)
+    parser.add_argument('infile_name', help='The name of a .csv file to read')
+    parser.add_argument('-s', '--store', help='Store output in database',
+                        action='store_true')
+    parser.add_argument('-b', '--bulk', help='Store output with COPY instead '
+                                             'of one insert per line',
+                        action='store_true')
+    parser.add_argument('--batch-size', type=int,
+                        help='Store output in batches of this many nights')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Extract with this many processes')
+    parser.add_argument('-m', '--mmap', action='store_true',
+                        help='Read the spreadsheet through mmap')
+    parser.add_argument('-t', '--batch-transform', action='store_true',
+                        help='Transform blocks of lines at a time with '
+                             'NumPy')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='Store only the nights and naps not already '
+                             'stored')
+    parser.add_argument('--commit-every', type=int,
+                        help='Store output a row at a time, committing '
+                             'every this many nights')
+    parser.add_argument('--quarantine',
+                        help='With --commit-every, write rows the db '
+                             'rejects to this file')
+    parser.add_argument('--resume',
+                        help='With --commit-every, resume from, and record '
+                             'progress in, this file')
+    args = parser.parse_args()
+
+    logging.basicConfig(filename='src/pipeline.log', filemode='w',
+                        level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - '
+                               '%(message)s')
+    url = None
+    if args.store:
+        try:
+            url = load.db_url_from_env()
+        except KeyError:
+            print('Please set the environment variables DB_USERNAME, '
+                  'DB_PASSWORD, and DB_NAME')
+            sys.exit(1)
+    logging.info('pipeline start')
+    run_pipeline(args.infile_name, url, args.bulk, args.batch_size,
+                 args.jobs, args.mmap, args.batch_transform,
+                 args.incremental, args.commit_every, args.quarantine,
+                 args.resume)
+    logging.info('pipeline finish')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+# file: src/sleep_time.py
+# andrew jarcho
+# 2024-06-23
+
+
+"""
+The time model shared by the transform, chart, and load stages.
+
+A time of day is held as an int: the minutes since midnight. A duration is
+held as an int number of minutes, and a chart position as an int number of
+quarter hours. Times are parsed once, where they are read, and formatted as
+strings only where they are written.
+
+Extract checks that each time is a whole 'H:MM' or 'HH:MM' field, so that
+only such times reach the later stages, and parses it to minutes
+(container_objs.time_minutes(), Event.minutes). It still writes each time
+as it was in the spreadsheet.
+
+A duration of less than a day is formatted, or converted to a chart
+length, by one lookup in a table built at import time. Longer durations,
+which only malformed input can give, are computed instead.
+"""
+
+
+MINUTES_PER_HOUR = 60
+MINUTES_PER_QUARTER = 15
+MINUTES_PER_DAY = 24 * MINUTES_PER_HOUR
+QS_IN_DAY = MINUTES_PER_DAY // MINUTES_PER_QUARTER  # 96
+
+# minutes past the hour <-> the decimal fraction of an hour, e.g., 15 <-> '25'
+QUARTER_TO_DECIMAL = {0: '00', 15: '25', 30: '50', 45: '75'}
+DECIMAL_TO_QUARTER = {dec: quarter
+                      for quarter, dec in QUARTER_TO_DECIMAL.items()}
+
+
+def time_to_minutes(time_str: str) -> int:
+    """
+    Convert a time in 'h:mm' or 'hh:mm' format to minutes since midnight
+
+    Called by: Transform.handle_action_line(), Chart.handle_action_line()
+    """
+    hrs, mins = time_str.split(':')
+    return int(hrs) * MINUTES_PER_HOUR + int(mins)
+
+
+def minutes_to_time(minutes: int) -> str:
+    """
+    Convert minutes since midnight to a time in 'hh:mm' format
+
+    Called by: Transform.last_sleep_time, Chart.get_time_part()
+    """
+    return '{:02d}:{:02d}'.format(*divmod(minutes, MINUTES_PER_HOUR))
+
+
+def duration_minutes(wake_minutes: int, sleep_minutes: int) -> int:
+    """
+    The minutes from sleep_minutes to wake_minutes, which may be on the
+    next day
+
+    Called by: Transform.get_duration(), Chart.handle_action_line()
+    """
+    duration = wake_minutes - sleep_minutes
+    return duration + MINUTES_PER_DAY if duration < 0 else duration
+
+
+def closest_quarter(minutes: int) -> int:
+    """
+    Round a number of minutes past the hour to a quarter hour
+
+    Minutes past 45 round down to 45, so the hour never changes.
+    Called by: Transform.quarter_hour_to_decimal(),
+               Chart.quarter_hour_to_decimal(), minutes_to_quarters(),
+               _minutes_to_decimal()
+    """
+    if minutes < 8:
+        return 0
+    elif minutes < 23:
+        return 15
+    elif minutes < 37:
+        return 30
+    return 45
+
+
+def minutes_to_quarters(minutes: int) -> int:
+    """
+    The number of whole quarter hours in a duration, with its minutes
+    past the hour rounded as closest_quarter() rounds them
+
+    Called by: duration_to_quarters()
+    """
+    hrs, mins = divmod(minutes, MINUTES_PER_HOUR)
+    return hrs * 4 + closest_quarter(mins) // MINUTES_PER_QUARTER
+
+
+def time_to_quarter(minutes: int) -> int:
+    """
+    The quarter hour of the day a time falls in: its chart position
+
+    Called by: Chart.handle_action_line(), Chart.get_start_posn()
+    """
+    return minutes // MINUTES_PER_QUARTER % QS_IN_DAY
+
+
+def _minutes_to_decimal(minutes: int) -> str:
+    """ Format a duration as decimal hours, e.g., 255 -> '04.25' """
+    hrs, mins = divmod(minutes, MINUTES_PER_HOUR)
+    return '{:02d}.{}'.format(hrs, QUARTER_TO_DECIMAL[closest_quarter(mins)])
+
+
+# indexed by a time of day, in minutes: 225 -> '03:45'
+TIME_STRINGS = tuple(minutes_to_time(minutes)
+                     for minutes in range(MINUTES_PER_DAY))
+# keyed by a time of day, with or without a leading zero: '3:45' -> 225
+TIME_MINUTES = {time_str: minutes
+                for minutes, time_str in enumerate(TIME_STRINGS)}
+TIME_MINUTES.update((time_str[1:], minutes)
+                    for time_str, minutes in list(TIME_MINUTES.items())
+                    if time_str.startswith('0'))
+# indexed by a duration of less than a day, in minutes
+DURATION_DECIMALS = tuple(_minutes_to_decimal(minutes)
+                          for minutes in range(MINUTES_PER_DAY))
+DURATION_QUARTERS = tuple(minutes_to_quarters(minutes) % QS_IN_DAY
+                          for minutes in range(MINUTES_PER_DAY))
+# keyed by decimal hours, with or without a leading zero: '4.25' -> '4:15'
+DECIMAL_TO_INTERVAL = {'{}.{}'.format(hrs, dec): '{}:{:02d}'.format(hrs,
+                                                                    quarter)
+                       for hrs in [str(h) for h in range(100)] +
+                       ['{:02d}'.format(h) for h in range(10)]
+                       for quarter, dec in QUARTER_TO_DECIMAL.items()}
+
+
+def decimal_to_interval(dec_str: str):
+    """
+    Convert decimal hours to an interval, e.g., '3.25' -> '3:15', keeping
+    the hours as written; None if the fraction is not a quarter hour, or
+    there is none
+
+    Called by: load.decimal_to_interval(), copy_format.split_nights_naps()
+    """
+    interval_str = DECIMAL_TO_INTERVAL.get(dec_str)
+    if interval_str is None:  # 100 hours or more, or a bad fraction
+        hrs, _, dec_mins = dec_str.partition('.')
+        quarter = DECIMAL_TO_QUARTER.get(dec_mins)
+        if quarter is not None:
+            interval_str = '{}:{:02d}'.format(hrs, quarter)
+    return interval_str
+
+
+def duration_to_decimal(minutes: int) -> str:
+    """
+    Format a duration as decimal hours, e.g., 255 -> '04.25', with its
+    minutes past the hour rounded as closest_quarter() rounds them
+
+    Called by: Transform.get_duration(), Chart.get_duration()
+    """
+    if 0 <= minutes < MINUTES_PER_DAY:
+        return DURATION_DECIMALS[minutes]
+    return _minutes_to_decimal(minutes)
+
+
+def duration_to_quarters(minutes: int) -> int:
+    """
+    The chart length of a duration: minutes_to_quarters(), modulo a day
+
+    Called by: Chart.handle_action_line()
+    """
+    if 0 <= minutes < MINUTES_PER_DAY:
+        return DURATION_QUARTERS[minutes]
+    return minutes_to_quarters(minutes) % QS_IN_DAY
@@ -0,0 +1,276 @@
+# file: src/transform/batch_transform.py
+# andrew jarcho
+# 2024-06-30
+
+
+"""
+Transform the extract output a block of lines at a time, with NumPy.
+
+Each block is read into arrays of line kinds and times in minutes. Action
+and date lines in the form extract writes them are classified, and their
+times read, all at once from the block's bytes; any other line is
+classified as Transform.handle_line() would classify it. The sleep time
+and date each record needs are then filled forward across the block, and
+every NAP duration is computed at once.
+
+The records are the ones Transform.handle_line() would make, line by line,
+and the same warnings are logged, in the same order. The last date and
+sleep time of a block are kept in the Transform, for the next block.
+"""
+import itertools
+import logging
+
+import numpy as np
+
+from src.sleep_time import TIME_MINUTES, TIME_STRINGS, DURATION_DECIMALS, \
+    MINUTES_PER_DAY, MINUTES_PER_HOUR, MINUTES_PER_QUARTER, \
+    duration_to_decimal, minutes_to_time, time_to_minutes
+
+
+# line kinds
+OTHER, DATE, BED, SLEEP, WAKE, NO_DATA_NIGHT, YES_DATA_NIGHT = range(7)
+ACTION_KINDS = {'b': BED, 's': SLEEP, 'w': WAKE, 'N': NO_DATA_NIGHT,
+                'Y': YES_DATA_NIGHT}
+SLEEP_KINDS = (BED, SLEEP, NO_DATA_NIGHT, YES_DATA_NIGHT)
+NIGHT_KINDS = (BED, NO_DATA_NIGHT, YES_DATA_NIGHT)
+# the no data and no night flags of a NIGHT record, indexed by kind
+NO_DATA_FLAGS = np.array(['false'] * 7, dtype=object)
+NO_DATA_FLAGS[NO_DATA_NIGHT] = 'true'
+NO_NIGHT_FLAGS = np.array(['false'] * 7, dtype=object)
+NO_NIGHT_FLAGS[YES_DATA_NIGHT] = 'true'
+
+TIME_POS = len('action: b, time: ')
+HOURS_SEP = b', hours: '
+# an action line is 'action: b, time: h:mm' or 'action: b, time: hh:mm',
+# then nothing, or HOURS_SEP and 'h.hh' or 'hh.hh'
+ACTION_HEAD = np.frombuffer(b'action: b, time: ', dtype=np.uint8)
+ACTION_HEAD_COLS = np.arange(len(ACTION_HEAD)) != len('action: ')
+HOURS_TAIL_LENS = (len(HOURS_SEP) + 4, len(HOURS_SEP) + 5)
+# a date line starts with '    yyyy-mm-dd'
+DATE_HEAD = np.frombuffer(b'    0000-00-00', dtype=np.uint8)
+DATE_DIGIT_COLS = DATE_HEAD == ord('0')
+# bytes looked at from the start of each line, and padding for the last
+HEAD_LEN = TIME_POS + 5
+PAD = bytes(HEAD_LEN + len(HOURS_SEP))
+
+KIND_OF_BYTE = np.zeros(256, dtype=np.int8)
+for _ch, _kind in ACTION_KINDS.items():
+    KIND_OF_BYTE[ord(_ch)] = _kind
+
+_duration_decimals = np.array(DURATION_DECIMALS, dtype=object)
+_time_strs = np.array(TIME_STRINGS, dtype=object)
+
+transform_logger = logging.getLogger('transform.do_transform')
+
+
+def transform_block(transform, lines):
+    """
+    Return the records for a block of lines of extract output
+
+    If a line cannot be transformed, the records of the lines before it
+    are returned by raising BlockError, which holds them and the error.
+    :param transform: the Transform whose last_date and
+                      last_sleep_minutes the block starts from, and
+                      which are updated to where the block ends
+    :param lines: lines of extract output, with or without '\\n'
+    Called by: Transform.iter_record_blocks()
+    """
+    lines = [line.rstrip('\n') for line in lines]
+    kinds, times, warnings, error = _classify(lines,
+                                              transform.date_checker.match)
+    rows = np.arange(len(lines))
+
+    # the row of the last sleep time, and of the last date, at each row
+    last_sleep_row = np.maximum.accumulate(
+            np.where(np.isin(kinds, SLEEP_KINDS), rows, -1))
+    last_date_row = np.maximum.accumulate(np.where(kinds == DATE, rows, -1))
+
+    wake_rows = np.flatnonzero(kinds == WAKE)
+    wake_sleep_rows = last_sleep_row[wake_rows]
+    carried_sleep = transform.last_sleep_minutes
+    if carried_sleep is None:
+        # a wake time before any sleep time ends no nap: Transform warns
+        orphans = wake_sleep_rows < 0
+        warnings.extend((row, 'Wake before any sleep {} in input'.format(
+                             lines[row]))
+                        for row in wake_rows[orphans].tolist())
+        wake_rows = wake_rows[~orphans]
+        wake_sleep_rows = wake_sleep_rows[~orphans]
+    sleep_times = np.where(wake_sleep_rows >= 0,
+                           times[np.maximum(wake_sleep_rows, 0)],
+                           carried_sleep if carried_sleep is not None else 0)
+    durations = times[wake_rows] - sleep_times
+    durations[durations < 0] += MINUTES_PER_DAY
+    decimals = _duration_decimals.take(
+            np.clip(durations, 0, MINUTES_PER_DAY - 1))
+    for ix in np.flatnonzero((durations < 0) |
+                             (durations >= MINUTES_PER_DAY)):
+        decimals[ix] = duration_to_decimal(int(durations[ix]))
+    for ix in np.flatnonzero(durations % MINUTES_PER_QUARTER):
+        warnings.append((int(wake_rows[ix]),
+                         'Invalid quarter {} in do_transform.py '
+                         'quarter_hour_to_decimal()'.format(
+                             durations[ix] % MINUTES_PER_HOUR)))
+
+    stop = error[0] if error else len(lines)
+    for _, message in sorted(w for w in warnings if w[0] < stop):
+        transform_logger.warning(message)
+
+    naps = wake_rows < stop
+    records = _make_records(lines, kinds[:stop], times[:stop],
+                            last_date_row[:stop], transform.last_date,
+                            wake_rows[naps], sleep_times[naps],
+                            decimals[naps])
+    if stop:
+        if last_date_row[stop - 1] >= 0:
+            transform.last_date = lines[last_date_row[stop - 1]][4:]
+        if last_sleep_row[stop - 1] >= 0:
+            transform.last_sleep_minutes = int(times[last_sleep_row[stop - 1]])
+    if error:
+        raise BlockError(records, error[1])
+    return records
+
+
+class BlockError(Exception):
+    """
+    A line of a block could not be transformed: records holds the records
+    of the lines before it, and error the exception it raised
+    """
+    def __init__(self, records, error):
+        super().__init__(error)
+        self.records = records
+        self.error = error
+
+
+def _classify(lines, date_match):
+    """
+    Sort lines into kinds, as Transform.handle_line() does, and read the
+    time each action line holds
+
+    Lines after one whose time cannot be read are left as OTHER.
+    :param lines: lines without '\\n'
+    :return: arrays of kinds and of times in minutes; (row, message)
+             warnings; and (row, exception) or None
+    Called by: transform_block()
+    """
+    kinds, times, done = _classify_bytes(lines)
+    warnings, error = [], None
+    for row in np.flatnonzero(~done).tolist():
+        line = lines[row]
+        if line.startswith('action: '):
+            kind = ACTION_KINDS.get(line[8:9])
+            if kind is None:
+                continue
+            end_pos = line.rfind(', hours: ')
+            time_str = line[TIME_POS:] if end_pos == -1 \
+                else line[TIME_POS: end_pos]
+            minutes = TIME_MINUTES.get(time_str)
+            if minutes is None:
+                try:
+                    minutes = time_to_minutes(time_str)
+                except ValueError as e:
+                    error = (row, e)
+                    break
+            kinds[row] = kind
+            times[row] = minutes
+        elif not line or line.startswith('Week of ') or \
+                line.startswith('======='):
+            continue
+        elif date_match(line):
+            kinds[row] = DATE
+        else:
+            warnings.append((row, 'Bad value {} in input'.format(line)))
+    if error:
+        kinds[error[0]:] = OTHER
+    return kinds, times, warnings, error
+
+
+def _classify_bytes(lines):
+    """
+    Classify, all at once, the blank lines, and the action and date lines
+    in the form extract writes them; read the action lines' times
+
+    :param lines: lines without '\\n'
+    :return: arrays of kinds, of times in minutes, and of whether each
+             line was classified
+    Called by: _classify()
+    """
+    n_lines = len(lines)
+    kinds = np.zeros(n_lines, dtype=np.int8)
+    times = np.zeros(n_lines, dtype=np.int64)
+    data = ('\n'.join(lines) + '\n').encode('utf-8', 'surrogatepass')
+    buf = np.frombuffer(data + PAD, dtype=np.uint8)
+    ends = np.flatnonzero(buf == ord('\n'))
+    if len(ends) != n_lines:  # a line held a '\n' of its own
+        return kinds, times, np.zeros(n_lines, dtype=bool)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - starts
+    head = buf[starts[:, None] + np.arange(HEAD_LEN)]
+    digits = head.astype(np.int64) - ord('0')
+    is_digit = (digits >= 0) & (digits <= 9)
+
+    action_kinds = KIND_OF_BYTE[head[:, len('action: ')]]
+    is_action = (action_kinds != OTHER) & \
+        (head[:, :TIME_POS] == ACTION_HEAD)[:, ACTION_HEAD_COLS].all(1)
+    # the time is 'h:mm' or 'hh:mm'
+    t, colon = TIME_POS, ord(':') - ord('0')
+    short = (digits[:, t + 1] == colon) & is_digit[:, t] & \
+        is_digit[:, t + 2] & is_digit[:, t + 3]
+    long = (digits[:, t + 2] == colon) & is_digit[:, t] & \
+        is_digit[:, t + 1] & is_digit[:, t + 3] & is_digit[:, t + 4]
+    time_len = np.where(short, 4, 5)
+    hrs = np.where(short, digits[:, t], digits[:, t] * 10 + digits[:, t + 1])
+    mins = np.where(short, digits[:, t + 2] * 10 + digits[:, t + 3],
+                    digits[:, t + 3] * 10 + digits[:, t + 4])
+    tail_len = lengths - t - time_len
+    has_hours_sep = (buf[(starts + t + time_len)[:, None] +
+                         np.arange(len(HOURS_SEP))] ==
+                     np.frombuffer(HOURS_SEP, dtype=np.uint8)).all(1)
+    is_action &= (short | long) & \
+        ((tail_len == 0) | (has_hours_sep & np.isin(tail_len,
+                                                     HOURS_TAIL_LENS)))
+    kinds[is_action] = action_kinds[is_action]
+    times[is_action] = (hrs * MINUTES_PER_HOUR + mins)[is_action]
+
+    is_date = (lengths >= len(DATE_HEAD)) & \
+        (head[:, :len(DATE_HEAD)] == DATE_HEAD)[:, ~DATE_DIGIT_COLS].all(1) & \
+        is_digit[:, :len(DATE_HEAD)][:, DATE_DIGIT_COLS].all(1)
+    kinds[is_date] = DATE
+    return kinds, times, is_action | is_date | (lengths == 0)
+
+
+def _make_records(lines, kinds, times, last_date_row, carried_date,
+                  wake_rows, sleep_times, decimals):
+    """
+    Make the NIGHT and NAP record tuples, in line order
+
+    :param wake_rows: the rows of the NAP records, with their sleep times
+                      and durations
+    Called by: transform_block()
+    """
+    nap_records = list(zip(itertools.repeat('NAP'),
+                           _time_strings(sleep_times), decimals.tolist()))
+    night_rows = np.flatnonzero(np.isin(kinds, NIGHT_KINDS))
+    night_kinds = kinds[night_rows]
+    dates = [lines[row][4:] if row >= 0 else carried_date
+             for row in last_date_row[night_rows].tolist()]
+    night_records = list(zip(itertools.repeat('NIGHT'), dates,
+                             _time_strings(times[night_rows]),
+                             NO_DATA_FLAGS[night_kinds].tolist(),
+                             NO_NIGHT_FLAGS[night_kinds].tolist()))
+    records = nap_records + night_records
+    order = np.argsort(np.concatenate((wake_rows, night_rows)),
+                       kind='stable')
+    return [records[ix] for ix in order.tolist()]
+
+
+def _time_strings(minutes):
+    """
+    Format an array of times of day as 'hh:mm' strings
+
+    Called by: _make_records()
+    """
+    time_strs = _time_strs.take(np.clip(minutes, 0, MINUTES_PER_DAY - 1))
+    for ix in np.flatnonzero((minutes < 0) | (minutes >= MINUTES_PER_DAY)):
+        time_strs[ix] = minutes_to_time(int(minutes[ix]))
+    return time_strs.tolist()
@@ -14,11 +14,27 @@ processing, and will hold all relevant data from the input.
 """
 
 import sys
+import argparse
 import fileinput
+import itertools
 import logging
 import logging.handlers
 import re
 
+from src.copy_format import split_nights_naps, format_row
+from src.sleep_time import time_to_minutes, minutes_to_time, \
+    duration_minutes, duration_to_decimal, closest_quarter, \
+    QUARTER_TO_DECIMAL, MINUTES_PER_HOUR, MINUTES_PER_QUARTER
+
+
+# offset of the time in an action line, e.g., 'action: b, time: 23:45'
+TIME_POS = len('action: b, time: ')
+# the start_no_data and end_no_data fields of the NIGHT record for each
+# action that starts a night
+NIGHT_FLAGS = {'b': ('false', 'false'), 'N': ('true', 'false'),
+               'Y': ('false', 'true')}
+BLOCK_LINES = 1 << 16  # lines per block in batch mode
+
 
 class Transform:
     transform_logger = logging.getLogger('transform.do_transform')
@@ -34,8 +50,8 @@ class Transform:
         self.data_source = data_source
         self.out_val = None
         self.last_date = ''
-        self.last_sleep_time = ''
-        self.date_checker = None
+        self.last_sleep_minutes = None
+        self.date_checker = re.compile(r' {4}\d{4}-\d{2}-\d{2}')
 
     def read_each_line(self):
         """
@@ -47,11 +63,119 @@ class Transform:
 
         Called by: __main__()
         """
-        self.date_checker = re.compile(r' {4}\d{4}-\d{2}-\d{2}')
         with self.data_source.input() as infile:
             for curr_line in infile:
                 self.process_curr(curr_line.rstrip('\n'))
 
+    def iter_records(self, lines):
+        """
+        Transform lines from the extract phase; yield records, not text.
+
+        Each record is a tuple holding the fields that process_curr()
+        would print, e.g.:
+           ('NIGHT', date, time, 'false', 'false')  or
+           ('NAP', time, duration)
+
+        Called by: client code
+        """
+        for curr_line in lines:
+            self.handle_line(curr_line.rstrip('\n'))
+            if self.out_val is not None:
+                yield self.out_val
+                self.out_val = None
+
+    def iter_night_records(self, nights):
+        """
+        Transform the Nights extract reads; yield records, as
+        iter_records() does, with no text passed between the stages.
+
+        nights are as Extract.iter_nights() yields them: each holds its
+        date, its action ('b', 'N', or 'Y'), its start time, and the 's'
+        and 'w' Events after it. A Night gives the NIGHT record the line
+        for its action would give, and each 'w' Event gives a NAP record,
+        with its time read as minutes by Event.minutes. The records are
+        those iter_records() makes from extract's lines for the same
+        spreadsheet, except at the ends of the input: iter_nights() drops
+        Events before the first night, and yields a night only once the
+        next one begins.
+
+        Called by: pipeline.iter_records(), client code
+        """
+        for night in nights:
+            self.last_date = night.dt_date.isoformat()
+            self.last_sleep_minutes = time_to_minutes(night.mil_time)
+            yield ('NIGHT', self.last_date, self.last_sleep_time,
+                   *NIGHT_FLAGS[night.action])
+            for event in night.events:
+                if event.action.startswith('s'):
+                    self.last_sleep_minutes = event.minutes
+                elif event.action.startswith('w'):
+                    yield ('NAP', self.last_sleep_time,
+                           self.get_duration(event.minutes,
+                                             self.last_sleep_minutes))
+
+    def read_in_blocks(self, block_lines=BLOCK_LINES):
+        """
+        Read from data_source a block of lines at a time; write each
+        block's output to stdout at once.
+
+        Needs NumPy. The output is the same as read_each_line()'s.
+        Called by: __main__()
+        """
+        with self.data_source.input() as infile:
+            for records in self.iter_record_blocks(infile, block_lines):
+                sys.stdout.write(''.join(', '.join(record) + '\n'
+                                         for record in records))
+
+    def iter_record_blocks(self, lines, block_lines=BLOCK_LINES):
+        """
+        Transform lines from the extract phase a block at a time, with
+        NumPy; yield a list of records for each block.
+
+        The records are the ones iter_records() would yield. If a line
+        cannot be transformed, the records of the lines before it are
+        yielded before its error is raised.
+
+        Called by: read_in_blocks(), client code
+        """
+        from src.transform.batch_transform import transform_block, \
+            BlockError
+        lines = iter(lines)
+        while True:
+            block = list(itertools.islice(lines, block_lines))
+            if not block:
+                return
+            try:
+                records = transform_block(self, block)
+            except BlockError as e:
+                yield e.records
+                raise e.error
+            yield records
+
+    def write_copy_rows(self, lines, nights_out, naps_out, batch=False):
+        """
+        Transform lines from the extract phase; write the night and nap
+        rows in the text format of COPY ... FROM STDIN.
+
+        load.copy_files() copies the rows to the db as they are. See
+        copy_format.py.
+        :param nights_out: a text file for the night rows
+        :param naps_out: a text file for the nap rows
+        :param batch: if True, transform blocks of lines at a time, as
+                      iter_record_blocks() does
+        :return: the number of night rows and of nap rows
+        Called by: __main__(), client code
+        """
+        if batch:
+            records = itertools.chain.from_iterable(
+                    self.iter_record_blocks(lines))
+        else:
+            records = self.iter_records(lines)
+        return split_nights_naps(
+                records, lambda row: nights_out.write(format_row(row)),
+                lambda row: naps_out.write(format_row(row)),
+                Transform.transform_logger)
+
     def process_curr(self, cur_l):
         """
         Process a single line of input.
@@ -65,6 +189,17 @@ class Transform:
            'NAP, time, duration'
         Returns: None
         """
+        self.handle_line(cur_l)
+        if self.out_val is not None:
+            self.output_val()
+
+    def handle_line(self, cur_l):
+        """
+        Update state from a single line of input; set self.out_val
+        to a record if the line completes one.
+
+        Called by: process_curr(), iter_records()
+        """
         if not cur_l or cur_l.startswith('Week of ') or cur_l.startswith('======='):
             self.handle_header_line()
         elif self.date_checker.match(cur_l):
@@ -74,8 +209,13 @@ class Transform:
         else:
             Transform.transform_logger.warning('Bad value {} in input'.
                                                format(cur_l))
-        if self.out_val is not None:
-            self.output_val()
+
+    @property
+    def last_sleep_time(self):
+        """ The last sleep time, in 'hh:mm' format, or '' if none """
+        if self.last_sleep_minutes is None:
+            return ''
+        return minutes_to_time(self.last_sleep_minutes)
 
     def handle_header_line(self):
         self.out_val = None
@@ -85,73 +225,77 @@ class Transform:
 
     def handle_action_line(self, line):
         if line.startswith('action: b'):
-            self.last_sleep_time = self.get_time_part_from(line)
-            self.out_val = 'NIGHT, {}, {}, {}, {}'.format(self.last_date,
-                                                          self.last_sleep_time,
-                                                          'false', 'false')
+            self.last_sleep_minutes = self.get_minutes_from(line)
+            self.out_val = ('NIGHT', self.last_date, self.last_sleep_time,
+                            'false', 'false')
         elif line.startswith('action: s'):
-            self.last_sleep_time = self.get_time_part_from(line)
+            self.last_sleep_minutes = self.get_minutes_from(line)
         elif line.startswith('action: w'):
-            wake_time = self.get_time_part_from(line)
-            duration = self.get_duration(wake_time, self.last_sleep_time)
-            self.out_val = 'NAP, {}, {}'.format(self.last_sleep_time, duration)
+            wake_minutes = self.get_minutes_from(line)
+            if self.last_sleep_minutes is None:  # no nap to end
+                Transform.transform_logger.warning('Wake before any sleep '
+                                                   '{} in input'.format(line))
+                return
+            duration = self.get_duration(wake_minutes,
+                                         self.last_sleep_minutes)
+            self.out_val = ('NAP', self.last_sleep_time, duration)
         elif line.startswith('action: N'):
-            self.last_sleep_time = self.get_time_part_from(line)
-            self.out_val = 'NIGHT, {}, {}, {}, {}'.format(self.last_date,
-                                                          self.last_sleep_time,
-                                                          'true', 'false')
+            self.last_sleep_minutes = self.get_minutes_from(line)
+            self.out_val = ('NIGHT', self.last_date, self.last_sleep_time,
+                            'true', 'false')
         elif line.startswith('action: Y'):
-            self.last_sleep_time = self.get_time_part_from(line)
-            self.out_val = 'NIGHT, {}, {}, {}, {}'.format(self.last_date,
-                                                          self.last_sleep_time,
-                                                          'false', 'true')
+            self.last_sleep_minutes = self.get_minutes_from(line)
+            self.out_val = ('NIGHT', self.last_date, self.last_sleep_time,
+                            'false', 'true')
 
     def output_val(self):
-        print(self.out_val)
+        print(', '.join(self.out_val))
         self.out_val = None
 
+    @staticmethod
+    def get_minutes_from(cur_l):
+        """
+        Extract the time part of its string argument, as minutes since
+        midnight.
+
+        Input time may be in 'h:mm' or 'hh:mm' format.
+        Called by: handle_action_line(), get_time_part_from()
+        Returns: Extracted time as an int.
+        """
+        end_pos = cur_l.rfind(', hours: ')
+        return time_to_minutes(cur_l[TIME_POS:] if end_pos == -1
+                               else cur_l[TIME_POS: end_pos])
+
     @staticmethod
     def get_time_part_from(cur_l):
         """
         Extract and return the time part of its string argument.
 
         Input time may be in 'h:mm' or 'hh:mm' format.
-        Called by: process_curr().
+        Called by: client code
         Returns: Extracted time as a string in 'hh:mm' format.
         """
-        end_pos = cur_l.rfind(', hours: ')
-        out_time = cur_l[17:] if end_pos == -1 else cur_l[17: end_pos]
-        if len(out_time) == 4:
-            out_time = '0' + out_time
-        return out_time
+        return minutes_to_time(Transform.get_minutes_from(cur_l))
 
     @staticmethod
-    def get_duration(w_time, s_time):
+    def get_duration(wake_minutes, sleep_minutes):
         """
-        Calculate the interval between w_time and s_time.
+        Calculate the interval between wake_minutes and sleep_minutes.
 
-        Arguments are strings representing times in 'hh:mm' format.
-        get_duration() calculates the interval between them as a
+        Arguments are times as minutes since midnight.
+        get_duration() formats the interval between them as a
         string in decimal format e.g.,
             04.25 for 4 1/4 hours
-        Called by: process_curr()
+        Called by: handle_action_line()
         Returns: the calculated interval, whose value will be
                 non-negative.
         """
-        w_time_list = list(map(int, w_time.split(':')))
-        s_time_list = list(map(int, s_time.split(':')))
-        if w_time_list[1] < s_time_list[1]:  # wake minute < sleep minute
-            w_time_list[1] += 60
-            w_time_list[0] -= 1
-        if w_time_list[0] < s_time_list[0]:  # wake hour < sleep hour
-            w_time_list[0] += 24
-        dur_list = [(w_time_list[x] - s_time_list[x])
-                    for x in range(len(w_time_list))]
-        duration = str(dur_list[0])
-        if len(duration) == 1:  # change hour from '1' to '01', e.g.
-            duration = '0' + duration
-        duration += Transform.quarter_hour_to_decimal(dur_list[1])
-        return duration
+        duration = duration_minutes(wake_minutes, sleep_minutes)
+        if duration % MINUTES_PER_QUARTER:  # rare: warns, then rounds
+            hrs, mins = divmod(duration, MINUTES_PER_HOUR)
+            return '{:02d}{}'.format(hrs,
+                                     Transform.quarter_hour_to_decimal(mins))
+        return duration_to_decimal(duration)
 
     @staticmethod
     def quarter_hour_to_decimal(quarter):
@@ -173,28 +317,12 @@ class Transform:
                                      format(quarter))
             quarter = Transform.get_closest_quarter(quarter)
 
-        decimal_quarter = None
-        if quarter == 15:
-            decimal_quarter = '.25'
-        elif quarter == 30:
-            decimal_quarter = '.50'
-        elif quarter == 45:
-            decimal_quarter = '.75'
-        elif quarter == 0:
-            decimal_quarter = '.00'
-        return decimal_quarter
+        return '.' + QUARTER_TO_DECIMAL[quarter]
 
     @staticmethod
     def get_closest_quarter(q):
-        if q < 8:
-            closest_quarter = 0
-        elif 8 <= q < 23:
-            closest_quarter = 15
-        elif 23 <= q < 37:
-            closest_quarter = 30
-        else:
-            closest_quarter = 45
-        return closest_quarter
+        return closest_quarter(q)
+
 
 def main():
     # from: https://docs.python.org/3/howto/
@@ -220,9 +348,34 @@ def main():
     transform_logger.propagate = False
 
 
-if __name__ == '__main__':
+def run():
+    """
+    Run the transform stage, with the arguments in sys.argv
+    Called by: __main__, src/__main__.py
+    """
     main()
     logging.info('transform start')
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-b', '--batch', action='store_true',
+                        help='Transform blocks of lines at a time with '
+                             'NumPy')
+    parser.add_argument('--copy', nargs=2, metavar=('NIGHTS', 'NAPS'),
+                        help='Write night and nap rows for COPY to these '
+                             'files, for load.py --copy-from')
+    args = parser.parse_args()
+    del sys.argv[1:]  # fileinput would read them as file names
     t = Transform()
-    t.read_each_line()
+    if args.copy:
+        with open(args.copy[0], 'w') as nights_out, \
+                open(args.copy[1], 'w') as naps_out, \
+                t.data_source.input() as infile:
+            t.write_copy_rows(infile, nights_out, naps_out, args.batch)
+    elif args.batch:
+        t.read_in_blocks()
+    else:
+        t.read_each_line()
     logging.info('transform finish')
+
+
+if __name__ == '__main__':
+    run()
@@ -11,7 +11,7 @@ from sqlalchemy import create_engine, text
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, scoped_session
 
-from src.load.load import connect, read_nights_naps, store_nights_naps, setup_load_logger
+from src.load.load import connect, get_engine, read_nights_naps, store_nights_naps, setup_load_logger
 
 
 # ========== FIXTURES ==========
@@ -51,7 +51,7 @@ def db_connection_url():
 def db_session():
    url = 'postgresql://{}:{}@localhost/sleep_test'.format(
            os.environ['DB_USERNAME'], os.environ['DB_PASSWORD'])
-   engine = create_engine(url)
+   engine = get_engine(url)  # the engine, and pool, the loads use
    Session = scoped_session(sessionmaker(bind=engine))
    yield Session()
    Session.remove()
@@ -0,0 +1,94 @@
+# file: test_chart_db_source.py
+# andrew jarcho
+# 2024-08-18
+
+
+import contextlib
+import datetime
+import io
+
+from src.chart.chart_new import Chart
+from src.chart.db_source import chart_events, nights_from_rows, read_db
+from src.transform.do_transform import Transform
+
+
+D = datetime.date
+T = datetime.time
+H = datetime.timedelta
+
+INPUT = '''Week of Sunday, 2016-12-04:
+==========================
+    2016-12-04
+action: b, time: 23:00
+    2016-12-05
+action: w, time: 7:15, hours: 8.25
+action: s, time: 14:00
+action: w, time: 14:45, hours: 0.75
+action: N, time: 22:30
+    2016-12-06
+    2016-12-07
+action: Y, time: 1:00
+action: w, time: 6:30, hours: 5.50
+action: b, time: 23:45
+    2016-12-08
+action: w, time: 7:00, hours: 7.25
+    2016-12-09
+'''
+
+# the rows the db holds for INPUT once it is loaded
+ROWS = [(1, D(2016, 12, 4), T(23, 0), False, T(23, 0), H(hours=8.25)),
+        (1, D(2016, 12, 4), T(23, 0), False, T(14, 0), H(hours=0.75)),
+        (2, D(2016, 12, 5), T(22, 30), True, None, None),
+        (3, D(2016, 12, 7), T(1, 0), False, T(1, 0), H(hours=5.5)),
+        (4, D(2016, 12, 7), T(23, 45), False, T(23, 45), H(hours=7.25))]
+
+
+def test_nights_from_rows_groups_naps_by_night():
+    assert list(nights_from_rows(ROWS[:3])) == [
+        (D(2016, 12, 4), 1380, False, [(1380, 495), (840, 45)]),
+        (D(2016, 12, 5), 1350, True, [])]
+
+
+def test_chart_events_stand_for_the_input_lines():
+    events = list(chart_events(nights_from_rows(ROWS[:3]),
+                               end_date=D(2016, 12, 6)))
+    assert events == [('date', '2016-12-04'), ('sleep', 1380),
+                      ('date', '2016-12-05'), ('wake', 495),
+                      ('sleep', 840), ('wake', 45), ('no_data', 1350),
+                      ('date', '2016-12-06')]
+
+
+def test_read_db_charts_rows_as_read_file_charts_their_input(mocker,
+                                                             tmp_path):
+    infile = tmp_path / 'chart_input.txt'
+    infile.write_text(INPUT)
+    text_chart = Chart(str(infile))
+    from_text = io.StringIO()
+    with contextlib.redirect_stdout(from_text):
+        text_chart.make_output(text_chart.read_file())
+
+    connection = mocker.Mock()
+    result = connection.execution_options.return_value.execute.return_value
+    result.__iter__ = mocker.Mock(return_value=iter(ROWS))
+    db_chart = Chart(None)
+    from_db = io.StringIO()
+    with contextlib.redirect_stdout(from_db):
+        db_chart.make_output(read_db(db_chart, connection, D(2016, 12, 4),
+                                     D(2016, 12, 9)))
+    assert from_db.getvalue() == from_text.getvalue()
+    assert len(from_db.getvalue().splitlines()) == 4
+    connection.execution_options.assert_called_once_with(
+        stream_results=True, yield_per=1000)
+    result.close.assert_called_once()
+
+
+def test_rows_match_what_transform_writes_for_the_input():
+    records = list(Transform().iter_records(INPUT.splitlines(True)))
+    assert [record for record in records if record[0] == 'NIGHT'] == [
+        ('NIGHT', '2016-12-04', '23:00', 'false', 'false'),
+        ('NIGHT', '2016-12-05', '22:30', 'true', 'false'),
+        ('NIGHT', '2016-12-07', '01:00', 'false', 'true'),
+        ('NIGHT', '2016-12-07', '23:45', 'false', 'false')]
+    assert [record[1:] for record in records if record[0] == 'NAP'] == [
+        ('23:00', '08.25'), ('14:00', '00.75'), ('01:00', '05.50'),
+        ('23:45', '07.25')]
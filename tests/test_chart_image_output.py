@@ -0,0 +1,123 @@
+# file: test_chart_image_output.py
+# andrew jarcho
+# 2024-08-25
+
+
+import re
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from src.chart.chart_new import Chart, ASLEEP_STATE, AWAKE_STATE, \
+    NO_DATA_STATE, QS_IN_DAY
+from src.chart.image_output import pack_pixels, png_bytes, row_runs, \
+    svg_text, write_image
+
+
+@pytest.fixture()
+def grid():
+    grid = np.full((3, QS_IN_DAY), AWAKE_STATE, np.uint8)
+    grid[0, :10] = ASLEEP_STATE
+    grid[1, 90:] = ASLEEP_STATE
+    grid[2, :4] = ASLEEP_STATE  # continues the run that ended row 1
+    grid[2, 50:60] = NO_DATA_STATE
+    return grid
+
+
+def read_png(png):
+    """ The header fields, palette, and rows of pixels of a PNG """
+    assert png[:8] == b'\x89PNG\r\n\x1a\n'
+    chunks, pos = {}, 8
+    while pos < len(png):
+        length, = struct.unpack('>I', png[pos: pos + 4])
+        kind, data = png[pos + 4: pos + 8], png[pos + 8: pos + 8 + length]
+        crc, = struct.unpack('>I', png[pos + 8 + length: pos + 12 + length])
+        assert crc == zlib.crc32(kind + data)
+        chunks[kind] = chunks.get(kind, b'') + data
+        pos += 12 + length
+    width, height, bit_depth, color_type = struct.unpack(
+        '>IIBB', chunks[b'IHDR'][:10])
+    raw = np.frombuffer(zlib.decompress(chunks[b'IDAT']), np.uint8)
+    scanlines = raw.reshape(height, -1)
+    assert not scanlines[:, 0].any()  # filter type 0
+    bits = np.unpackbits(scanlines[:, 1:], axis=1)
+    pixels = bits.reshape(height, -1, bit_depth) @ \
+        (1 << np.arange(bit_depth - 1, -1, -1))
+    return (width, height, bit_depth, color_type), chunks[b'PLTE'], \
+        pixels[:, :width]
+
+
+def test_png_holds_a_pixel_per_cell_scaled_to_cell_size(grid):
+    header, palette, pixels = read_png(png_bytes(grid, (2, 3)))
+    assert header == (QS_IN_DAY * 2, 9, 2, 3)
+    colors = np.frombuffer(palette, np.uint8).reshape(-1, 3)[pixels]
+    assert (colors[:3, :20] == 0).all()  # asleep is black
+    assert (colors[:3, 20:] == 255).all()
+    assert (colors[6:, 100:120] == 192).all()  # no data is gray
+
+
+def test_png_has_one_bit_a_pixel_without_no_data(grid):
+    grid[2, 50:60] = AWAKE_STATE
+    header, palette, pixels = read_png(png_bytes(grid, (1, 1)))
+    assert header[2] == 1
+    assert palette == b'\x00\x00\x00\xff\xff\xff'
+    assert (pixels == (grid == AWAKE_STATE)).all()
+
+
+def test_pack_pixels_puts_the_first_pixel_in_the_high_bits():
+    pixels = np.array([[1, 2, 3, 0, 1]], np.uint8)
+    assert pack_pixels(pixels, 2).tolist() == [[0b01101100, 0b01000000]]
+
+
+def test_row_runs_end_at_the_end_of_a_row(grid):
+    starts, lengths, states = row_runs(grid)
+    asleep = states == ASLEEP_STATE
+    assert starts[asleep].tolist() == [0, 186, 192]
+    assert lengths[asleep].tolist() == [10, 6, 4]
+
+
+def test_svg_draws_a_rect_per_run(grid):
+    svg = svg_text(grid, (4, 2), 'a chart')
+    assert 'width="384" height="6" viewBox="0 0 96 3"' in svg
+    assert '<title>a chart</title>' in svg
+    assert re.findall(r'<rect x="(\d+)" y="(\d+)" width="(\d+)"', svg) == [
+        ('0', '0', '10'), ('90', '1', '6'), ('0', '2', '4'),
+        ('50', '2', '10')]
+
+
+def test_write_image_needs_a_png_or_svg_name(grid, tmp_path):
+    with pytest.raises(ValueError):
+        write_image(str(tmp_path / 'chart.gif'), grid, '2016-12-04')
+    with pytest.raises(ValueError):
+        write_image(str(tmp_path / 'chart.png'), grid[:0], '2016-12-04')
+
+
+def test_make_image_writes_the_rows_make_output_prints(tmp_path, capsys):
+    infile = tmp_path / 'chart_input.txt'
+    infile.write_text('''Week of Sunday, 2016-12-04:
+==========================
+    2016-12-04
+action: b, time: 23:00
+    2016-12-05
+action: w, time: 7:15, hours: 8.25
+action: b, time: 22:30
+    2016-12-06
+action: w, time: 6:30, hours: 8.00
+action: N, time: 12:00
+    2016-12-07
+''')
+    chart = Chart(str(infile))
+    chart.make_output(chart.read_file())
+    printed = capsys.readouterr().out.splitlines()
+    assert len(printed) == 3
+    chart = Chart(str(infile))
+    chart.make_image(chart.read_file(), str(tmp_path / 'chart.png'), (1, 1))
+    _, palette, pixels = read_png((tmp_path / 'chart.png').read_bytes())
+    symbols = {b'\xc0\xc0\xc0': '░', b'\x00\x00\x00': '█',
+               b'\xff\xff\xff': ' '}
+    palette_symbols = [symbols[palette[i: i + 3]]
+                       for i in range(0, len(palette), 3)]
+    assert [line[12: -1] for line in printed] == [
+        ''.join(palette_symbols[p] for p in row) for row in pixels]
@@ -0,0 +1,93 @@
+# file: test_chart_new.py
+# andrew jarcho
+# 2024-08-11
+
+
+from datetime import date
+
+import pytest
+
+from src.chart.chart_new import Chart, ASLEEP, AWAKE, NO_DATA, QS_IN_DAY, \
+    Triple, ASLEEP_STATE, AWAKE_STATE, NO_DATA_STATE, RULER, SATURDAY, \
+    date_label, weekday
+
+
+INPUT = '''Week of Sunday, 2016-12-04:
+==========================
+    2016-12-04
+action: b, time: 23:00
+    2016-12-05
+action: w, time: 7:15, hours: 8.25
+action: s, time: 14:00
+action: w, time: 14:45, hours: 0.75
+action: s, time: 22:30
+    2016-12-06
+action: w, time: 6:30, hours: 8.00
+action: N, time: 12:00
+    2016-12-07
+'''
+
+
+def test_insert_to_row_out_fills_a_slice_and_carries_the_rest():
+    chart = Chart('unused')
+    row = bytearray(chart.output_row)
+    row = chart.insert_to_row_out(Triple(92, 6, ASLEEP), row)
+    assert row[92:] == bytes([ASLEEP_STATE]) * 4
+    assert row[:92] == bytes([NO_DATA_STATE]) * 92
+    assert chart.spaces_left == QS_IN_DAY - 4
+    assert chart.quarters_carried == (2, ASLEEP)
+
+
+def test_wake_before_any_sleep_gives_no_triple():
+    chart = Chart('unused')
+    assert chart.handle_action_line('action: w, time: 7:15, hours: 8.25') \
+        == Triple(-1, -1, -1)
+    chart.handle_action_line('action: s, time: 14:00')
+    assert chart.handle_action_line('action: w, time: 14:45, hours: 0.75') \
+        == Triple(56, 3, ASLEEP)
+
+
+def test_row_text_translates_states_to_symbols():
+    row = bytearray([AWAKE_STATE]) * QS_IN_DAY
+    row[:2] = bytes([ASLEEP_STATE]) * 2
+    row[-1] = NO_DATA_STATE
+    assert Chart('unused').row_text(row) == \
+        ASLEEP * 2 + AWAKE * (QS_IN_DAY - 3) + NO_DATA
+
+
+def test_make_output_prints_a_labeled_row_per_day(tmp_path, capsys):
+    infile = tmp_path / 'chart_input.txt'
+    infile.write_text(INPUT)
+    chart = Chart(str(infile))
+    chart.make_output(chart.read_file())
+    lines = capsys.readouterr().out.splitlines()
+    assert lines == [
+        '2016-12-04 |' + AWAKE * 92 + ASLEEP * 4 + '|',
+        '2016-12-05 |' + ASLEEP * 29 + AWAKE * 27 + ASLEEP * 3 + AWAKE * 31 +
+        ASLEEP * 6 + '|',
+        '2016-12-06 |' + ASLEEP * 26 + NO_DATA * 70 + '|']
+    assert chart.output_date == '2016-12-07'
+
+
+@pytest.mark.parametrize('my_date', ['2016-12-04', '2016-12-10', '2000-02-29',
+                                     '1999-12-31'])
+def test_ordinal_dates_match_date(my_date):
+    ordinal = date.fromisoformat(my_date).toordinal()
+    assert date_label(ordinal) == my_date
+    assert weekday(ordinal) == date.fromisoformat(my_date).weekday()
+
+
+def test_print_rows_prints_the_ruler_after_saturday(capsys):
+    chart = Chart('unused')
+    chart.output_date = '2016-12-09'  # a Friday
+    for _ in range(3):
+        chart.write_output(chart.output_row)
+    chart.print_rows()
+    lines = capsys.readouterr().out.splitlines()
+    assert [line[:10] for line in lines] == ['2016-12-09', '2016-12-10',
+                                             RULER[:10], '2016-12-11']
+    assert lines[2] == RULER
+    assert weekday(date(2016, 12, 10).toordinal()) == SATURDAY
+    assert chart.output_date == '2016-12-12'
+    assert chart.advance_output_date('2016-12-10') == '2016-12-11'
+    assert capsys.readouterr().out == RULER + '\n'
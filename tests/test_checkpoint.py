@@ -0,0 +1,116 @@
+# file: tests/test_checkpoint.py
+# andrew jarcho
+# 2024-06-16
+
+import datetime
+import io
+
+import pytest
+
+from src.extract.read_fns import Extract, open_infile
+from checkpoint import Checkpoint, load_checkpoint, save_checkpoint, \
+    commit_checkpoint, pending_path
+from container_objs import Day, Event, Week
+from mmap_reader import MmapReader
+
+
+WEEK_1 = '''w,Sun,,,Mon,,,Tue,,,Wed,,,Thu,,,Fri,,,Sat,,,,
+12/4/2016,,,,,,,,,,b,23:45,,w,3:45,4.00,w,2:00,2.75,b,0:00,9.00,,
+,,,,,,,,,,,,,s,4:45,,s,3:30,,w,5:15,5.25,,
+,,,,,,,,,,,,,w,17:30,0.75,,,,b,22:30,7.25,,
+,,,,,,,,,,,,,,,,,,,,,,,
+'''
+WEEK_2 = '''12/11/2016,w,6:00,7.50,b,23:15,7.25,,,,,,,,,,,,,,,,,
+,,,,w,7:00,7.75,b,22:00,9.00,,,,,,,,,,,,,
+,,,,,,,,,,,,,,,,,,,,,,,
+'''
+WEEK_3 = '''12/18/2016,,,,,,,w,8:00,10.00,b,23:00,8.50,,,,,,,,,,,
+,,,,,,,,,,,,,,,,,,,,,,,
+'''
+
+
+@pytest.fixture
+def run(tmp_path):
+    csv_path = str(tmp_path / 'sheet.csv')
+
+    def _run(text, checkpoint_name='checkpoint.json', pending=False):
+        checkpoint_path = str(tmp_path / checkpoint_name)
+        with open(csv_path, 'w') as outfile:
+            outfile.write(text)
+        with open_infile(MmapReader(csv_path)) as reader:
+            extract = Extract(reader)
+            extract.outfile = io.StringIO()
+            extract.lines_in_weeks_out_since(checkpoint_path, pending)
+            return extract.outfile.getvalue()
+    return _run
+
+
+def full_output(text):
+    extract = Extract(io.StringIO(text))
+    extract.outfile = io.StringIO()
+    extract.lines_in_weeks_out()
+    return extract.outfile.getvalue()
+
+
+def test_resumed_run_outputs_only_new_weeks(run):
+    first = run(WEEK_1 + WEEK_2)
+    second = run(WEEK_1 + WEEK_2 + WEEK_3)
+    context, _, new_lines = second.partition('\n')
+    assert context == '    2016-12-13'  # the last day header in first
+    assert first + new_lines == run(WEEK_1 + WEEK_2 + WEEK_3, 'other.json')
+    assert full_output(WEEK_1 + WEEK_2 + WEEK_3).startswith(first + new_lines)
+    assert 'Week of Sunday, 2016-12-18' in new_lines
+    assert 'Week of Sunday, 2016-12-11' not in new_lines
+
+
+def test_unfinished_week_is_output_by_a_later_run(run):
+    unfinished = WEEK_1 + WEEK_2 + WEEK_3.split('\n')[0] + '\n'
+    first = run(unfinished)
+    assert 'Week of Sunday, 2016-12-18' not in first
+    assert 'Week of Sunday, 2016-12-18' in run(WEEK_1 + WEEK_2 + WEEK_3)
+
+
+def test_run_with_no_new_weeks_outputs_only_context(run):
+    run(WEEK_1 + WEEK_2)
+    assert run(WEEK_1 + WEEK_2) == '    2016-12-13\n'
+
+
+def test_changed_prefix_falls_back_to_full_rescan(run):
+    first = run(WEEK_1 + WEEK_2)
+    changed = WEEK_1.replace('23:45', '23:30') + WEEK_2
+    assert run(changed) == full_output(changed)[:len(first)]
+
+
+def test_pending_checkpoint_takes_effect_once_committed(run, tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    run(WEEK_1 + WEEK_2)
+    new_weeks = run(WEEK_1 + WEEK_2 + WEEK_3, pending=True)
+    assert 'Week of Sunday, 2016-12-18' in new_weeks
+    # not committed, as if the load failed: the weeks are written again
+    assert run(WEEK_1 + WEEK_2 + WEEK_3, pending=True) == new_weeks
+    assert load_checkpoint(path).offset == len(WEEK_1 + WEEK_2)
+    assert load_checkpoint(pending_path(path)).offset == \
+        len(WEEK_1 + WEEK_2 + WEEK_3)
+    assert commit_checkpoint(path)
+    assert not commit_checkpoint(path)
+    assert 'Week of Sunday, 2016-12-18' not in run(WEEK_1 + WEEK_2 + WEEK_3)
+
+
+def test_save_and_load_checkpoint_round_trip(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    week = Week(*[Day(datetime.date(2016, 12, 4) + datetime.timedelta(x),
+                      [Event('b', '23:45', '')] if x == 3 else [])
+                  for x in range(7)])
+    saved = Checkpoint(1234, 'abc', week, True, ['    2016-12-10'],
+                       [(1, 'action: b, time: 22:30, hours: 7.25', True)],
+                       '    2016-12-10')
+    save_checkpoint(path, saved)
+    loaded = load_checkpoint(path)
+    assert loaded._replace(events=[tuple(e) for e in loaded.events]) == saved
+
+
+def test_load_checkpoint_ignores_bad_file(tmp_path):
+    path = tmp_path / 'checkpoint.json'
+    assert load_checkpoint(str(path)) is None
+    path.write_text('{"version": 1}')
+    assert load_checkpoint(str(path)) is None
@@ -6,7 +6,8 @@
 from datetime import date, timedelta
 import pytest
 
-from src.extract.container_objs import validate_segment, Event, Day, Week
+from src.extract.container_objs import validate_segment, Event, Day, Week, \
+    PackedWeek
 
 
 # test validate_segment()
@@ -42,8 +43,22 @@ def test_item_2_is_not_blank_and_does_not_match_regex_returns_false(
     assert not validate_segment(seg)
 
 
+def test_time_with_trailing_text_returns_false(seg=['s', '1:30pm', '']):
+    assert not validate_segment(seg)
+
+
+def test_hours_with_trailing_text_returns_false(seg=['w', '1:30', '1.50x']):
+    assert not validate_segment(seg)
+
+
 # test Event class
 
+def test_Event_minutes_is_time_as_minutes_since_midnight():
+    assert Event('b', '0:05', '').minutes == 5
+    assert Event('w', '23:45', '7.25').minutes == 1425
+    assert Event('s', '1:30pm', '').minutes is None
+
+
 def test_Event_ctor_raises_TypeError_if_segment_len_gt_3():
     segment = ['w', '12:45', '3.75', 'bongo']
     with pytest.raises(TypeError):
@@ -123,3 +138,43 @@ def test_days_two_thru_seven_of_Week_have_no_Sunday(make_week):
         return make_week[x].dt_date.weekday == 6
     # f = lambda x: make_week[x].dt_date.weekday() == 6
     assert not any(f(x) for x in range(1, 7))
+
+
+def test_containers_have_no_instance_dict(make_week):
+    assert not hasattr(make_week, '__dict__')
+    assert not hasattr(make_week[0], '__dict__')
+    assert not hasattr(Event('b', '23:45', ''), '__dict__')
+
+
+@pytest.fixture
+def week_with_events(make_week):
+    make_week.Sunday.events.extend([Event('b', '23:45', ''),
+                                    Event('w', '7:15', '7.50')])
+    make_week.Wednesday.events.append(Event('s', '0:00', ''))
+    make_week.Saturday.events.append(Event('b', '22:30', '10.25'))
+    return make_week
+
+
+def test_packed_week_gives_back_week(week_with_events):
+    packed = PackedWeek.from_week(week_with_events)
+    assert packed == week_with_events
+    assert packed.to_week() == week_with_events
+    assert packed.odd_events is None
+
+
+def test_packed_week_accessors_match_week(week_with_events):
+    packed = PackedWeek.from_week(week_with_events)
+    assert len(packed) == 7
+    assert packed[-1] == week_with_events[-1]
+    assert packed.Wednesday == week_with_events.Wednesday
+    with pytest.raises(IndexError):
+        packed[7]
+
+
+def test_packed_week_keeps_events_it_cannot_pack(make_week):
+    odd = [Event('bx', '23:45', ''), Event('b', '03:45', ''),
+           Event('w', '7:15', '7.30')]
+    make_week.Monday.events.extend(odd + [Event('s', '9:00', '')])
+    packed = PackedWeek.from_week(make_week)
+    assert packed.Monday.events == odd + [Event('s', '9:00', '')]
+    assert sorted(packed.odd_events) == [0, 1, 2]
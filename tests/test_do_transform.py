@@ -2,8 +2,14 @@
 # andrew jarcho
 # 2017-03-15
 
+import io
+from datetime import date
+
+import pytest
+
 from tests.file_access_wrappers import FakeFileReadWrapper
 from src.transform.do_transform import Transform
+from src.extract.container_objs import Event, Night
 
 
 def test_read_blank_line_does_not_change_state():
@@ -64,3 +70,106 @@ def test_read_date_b_date_w_sets_last_date_to_2nd_date():
     my_transform = Transform(file_wrapper)
     my_transform.read_each_line()
     assert my_transform.last_date == '2016-12-08'
+
+
+def test_iter_records_yields_records_instead_of_printing(capsys):
+    my_transform = Transform()
+    records = list(my_transform.iter_records(['    2016-12-07\n',
+                                              'action: b, time: 23:45\n',
+                                              '    2016-12-08\n',
+                                              'action: w, time: 3:45, '
+                                              'hours: 4.00\n']))
+    assert records == [('NIGHT', '2016-12-07', '23:45', 'false', 'false'),
+                       ('NAP', '23:45', '04.00')]
+    assert capsys.readouterr().out == ''
+
+
+def test_iter_night_records_matches_iter_records():
+    nights = [Night(date(2016, 12, 7), 'Y', '23:45',
+                    [Event('w', '3:45', '4.00'), Event('s', '9:00', ''),
+                     Event('w', '10:10', '1.25')]),
+              Night(date(2016, 12, 8), 'N', '22:00', []),
+              Night(date(2016, 12, 9), 'b', '23:00', [])]
+    lines = ['    2016-12-07\n', 'action: Y, time: 23:45\n',
+             '    2016-12-08\n', 'action: w, time: 3:45, hours: 4.00\n',
+             'action: s, time: 9:00\n', 'action: w, time: 10:10\n',
+             'action: N, time: 22:00\n', '    2016-12-09\n',
+             'action: b, time: 23:00, hours: 7.00\n']
+    assert list(Transform().iter_night_records(nights)) == \
+        list(Transform().iter_records(lines))
+
+
+BATCH_LINES = ['Week of Sunday, 2016-12-04:\n',
+               '==========================\n',
+               '    2016-12-07\n',
+               'action: Y, time: 23:45\n',
+               '    2016-12-08\n',
+               'action: w, time: 3:45, hours: 4.00\n',
+               'action: s, time: 9:00\n',
+               'action: w, time: 10:10\n',
+               'a bad line\n',
+               'action: N, time: 22:00\n',
+               '    2016-12-09\n',
+               'action: w, time: 05:30, hours: 7.50\n',
+               'action: b, time: 23:00, hours: 7.00\n']
+
+
+def test_iter_record_blocks_matches_iter_records(caplog):
+    pytest.importorskip('numpy')
+    expected = list(Transform().iter_records(BATCH_LINES))
+    expected_log = caplog.messages[:]
+    caplog.clear()
+    for block_lines in (1, 5, 100):
+        my_transform = Transform()
+        records = [record for block in
+                   my_transform.iter_record_blocks(BATCH_LINES, block_lines)
+                   for record in block]
+        assert records == expected
+        assert my_transform.last_date == '2016-12-09'
+        assert my_transform.last_sleep_time == '23:00'
+        assert caplog.messages == expected_log
+        caplog.clear()
+    assert 'Invalid quarter 10 in do_transform.py ' \
+           'quarter_hour_to_decimal()' in expected_log
+
+
+def test_wake_before_any_sleep_is_warned_of_and_skipped(caplog):
+    lines = ['    2016-12-07\n', 'action: w, time: 3:45, hours: 4.00\n',
+             'action: b, time: 23:45\n']
+    expected = [('NIGHT', '2016-12-07', '23:45', 'false', 'false')]
+    assert list(Transform().iter_records(lines)) == expected
+    assert caplog.messages == ['Wake before any sleep action: w, time: 3:45, '
+                               'hours: 4.00 in input']
+    caplog.clear()
+    pytest.importorskip('numpy')
+    blocks = Transform().iter_record_blocks(lines)
+    assert [record for block in blocks for record in block] == expected
+    assert len(caplog.messages) == 1
+
+
+def test_iter_record_blocks_yields_records_before_a_bad_time():
+    pytest.importorskip('numpy')
+    blocks = Transform().iter_record_blocks(
+            ['    2016-12-07\n', 'action: b, time: 23:45\n',
+             'action: w, time: 3:4x\n', 'action: b, time: 23:45\n'])
+    assert next(blocks) == [('NIGHT', '2016-12-07', '23:45', 'false',
+                             'false')]
+    with pytest.raises(ValueError):
+        next(blocks)
+
+
+def test_write_copy_rows_writes_staging_table_rows():
+    for batch in (False, True):
+        if batch:
+            pytest.importorskip('numpy')
+        nights_out, naps_out = io.StringIO(), io.StringIO()
+        counts = Transform().write_copy_rows(BATCH_LINES, nights_out,
+                                             naps_out, batch)
+        assert counts == (3, 3)
+        assert nights_out.getvalue() == (
+            '1\t2016-12-07\t23:45\tfalse\ttrue\n'
+            '2\t2016-12-08\t22:00\ttrue\tfalse\n'
+            '3\t2016-12-09\t23:00\tfalse\tfalse\n')
+        assert naps_out.getvalue() == ('1\t1\t23:45\t04:00\n'
+                                       '2\t1\t09:00\t01:15\n'
+                                       '3\t2\t22:00\t07:30\n')
@@ -0,0 +1,65 @@
+# file: tests/test_line_tokenizer.py
+# andrew jarcho
+# 2024-06-02
+
+import datetime
+
+from container_objs import Event, validate_segment
+from line_tokenizer import tokenize_line, tokenize_segments, BLANK_ROW, \
+    WEEK_START_ROW, EVENT_ROW, SEGMENTS_PER_LINE
+
+
+def test_tokenize_line_classifies_blank_row():
+    tokens = tokenize_line(',' * 23 + '\n')
+    assert tokens.kind == BLANK_ROW
+    assert tokens.segments == []
+
+
+def test_tokenize_line_classifies_whitespace_only_row_as_blank():
+    assert tokenize_line(' , ,\t,' + ',' * 20).kind == BLANK_ROW
+
+
+def test_tokenize_line_classifies_week_start_row():
+    tokens = tokenize_line('12/4/2016,,,,,,,,,,b,23:45,,w,3:45,4.00,'
+                           'w,2:00,2.75,b,0:00,9.00,,\n')
+    assert tokens.kind == WEEK_START_ROW
+    assert tokens.date_match.groups() == ('12', '4', '2016')
+    assert tokens.segments == [None, None, None, Event('b', '23:45', ''),
+                               Event('w', '3:45', '4.00'),
+                               Event('w', '2:00', '2.75'),
+                               Event('b', '0:00', '9.00')]
+
+
+def test_tokenize_line_classifies_event_row_and_strips_fields():
+    tokens = tokenize_line(',,,, s , 4:45 ,' + ',' * 17)
+    assert tokens.kind == EVENT_ROW
+    assert tokens.date_match is None
+    assert tokens.segments[1] == Event('s', '4:45', '')
+
+
+def test_tokenize_line_returns_invalid_segments_as_lists():
+    tokens = tokenize_line(',s,4:45,1.00,w,8:00,,x,9:00,1.00' + ',' * 14)
+    assert tokens.segments[:3] == [['s', '4:45', '1.00'], ['w', '8:00', ''],
+                                   ['x', '9:00', '1.00']]
+
+
+def test_tokenize_line_ignores_fields_after_the_22nd():
+    tokens = tokenize_line(',' * 22 + 'b,1:00,')
+    assert tokens.kind == BLANK_ROW
+
+
+def test_tokenize_segments_returns_short_line_segments_as_lists():
+    segments = tokenize_segments(['', 'b', '3:00', '', 'w', '4:00'])
+    assert len(segments) == SEGMENTS_PER_LINE
+    assert segments[:3] == [['b', '3:00', ''], ['w', '4:00'], []]
+    assert validate_segment(segments[0])
+
+
+def test_tokenize_segments_agrees_with_validate_segment():
+    fields = ['b', '3:00', '', 'b', '3:00', '7.25', 's', '9:30', '',
+              'w', '9:30', '1.50', 's', '9:30', '1.50', 'w', '9:30', '',
+              'b', '3:00pm', '']
+    segments = tokenize_segments([str(datetime.date.today())] + fields)
+    for ix, token in enumerate(segments):
+        segment = fields[3 * ix: 3 * ix + 3]
+        assert isinstance(token, Event) == bool(validate_segment(segment))
@@ -0,0 +1,47 @@
+# file: tests/test_main.py
+# andrew jarcho
+# 2024-08-04
+
+import subprocess
+import sys
+
+import pytest
+
+from src.__main__ import main, parse_importtime
+
+
+REPORT = '''import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       310 |        430 | io
+import time:      2051 |       2051 |     sqlalchemy.util
+import time:      1500 |       3551 | sqlalchemy
+'''
+
+
+def test_parse_importtime_reads_top_level_imports():
+    assert parse_importtime(REPORT) == [(310, 430, 'io'),
+                                        (1500, 3551, 'sqlalchemy')]
+
+
+@pytest.mark.parametrize('command, heavy', [('load', 'sqlalchemy'),
+                                            ('transform', 'numpy'),
+                                            ('run', 'sqlalchemy')])
+def test_commands_do_not_import_heavy_dependencies(command, heavy):
+    code = ('import sys, src.__main__ as m; m.import_command({!r}); '
+            'print({!r} in sys.modules)'.format(command, heavy))
+    result = subprocess.run([sys.executable, '-c', code], check=True,
+                            stdout=subprocess.PIPE, text=True)
+    assert result.stdout.strip() == 'False'
+
+
+def test_main_runs_a_command_with_its_arguments(mocker):
+    run = mocker.patch('src.load.load.run', return_value=None)
+    mocker.patch.object(sys, 'argv', ['src'])
+    assert main(['load', 'False']) is None
+    run.assert_called_once_with()
+    assert sys.argv == ['src load', 'False']
+
+
+def test_main_shows_usage_for_an_unknown_command(capsys):
+    assert main(['unload']) == 2
+    assert 'usage: python -m src' in capsys.readouterr().err
@@ -0,0 +1,87 @@
+# file: tests/test_mmap_reader.py
+# andrew jarcho
+# 2024-06-09
+
+import pytest
+
+from src.extract.read_fns import Extract, open_infile
+from tests.file_access_wrappers import FileReadAccessWrapper
+from line_tokenizer import BLANK_ROW, SKIPPED_ROW, WEEK_START_ROW, EVENT_ROW
+import mmap_reader
+from mmap_reader import MmapReader
+
+
+SPREADSHEET = '''w,Sun,,,Mon,,,Tue,,,Wed,,,Thu,,,Fri,,,Sat,,,,
+12/4/2016,,,,,,,,,,b,23:45,,w,3:45,4.00,w,2:00,2.75,b,0:00,9.00,,
+,,,,,,,,,,,,,s,4:45,,s,3:30,,w,5:15,5.25,,
+,,,,,,,,,,,,,w,17:30,0.75,,,,b,22:30,7.25,,
+,,,,,,,,,,,,,,,,,,,,,,,
+,,,,,,,,,,,,,s,21:00,,,,,,,,,
+12/11/2016,b,23:15,7.50,,,,,,,,,,,,,,,,,,,,
+,w,8:15,1.00,,,,,,,,,,,,,,,,,,,
+,,,,,,,,,,,,,,,,,,,,,,,
+'''
+
+
+@pytest.fixture
+def write_csv(tmp_path):
+    def _write_csv(text, newline=None):
+        path = tmp_path / 'sheet.csv'
+        with open(path, 'w', newline=newline) as outfile:
+            outfile.write(text)
+        return str(path)
+    return _write_csv
+
+
+def extract_output(wrapper, capsys):
+    Extract(open_infile(wrapper)).lines_in_weeks_out()
+    return capsys.readouterr().out
+
+
+@pytest.mark.parametrize('text', [SPREADSHEET,
+                                  SPREADSHEET.replace('\n', '\r\n'),
+                                  SPREADSHEET.rstrip('\n'),
+                                  SPREADSHEET.replace(',,,,', ' ,\t,,,'),
+                                  ''])
+def test_mmap_reader_output_matches_text_mode(write_csv, capsys, text):
+    filename = write_csv(text, newline='')
+    assert extract_output(MmapReader(filename), capsys) == \
+        extract_output(FileReadAccessWrapper(filename), capsys)
+
+
+def test_mmap_reader_iterates_lines_as_text_mode_does(write_csv):
+    filename = write_csv(SPREADSHEET.replace('\n', '\r\n'), newline='')
+    with open(filename) as infile:
+        assert list(MmapReader(filename).open()) == list(infile)
+
+
+def test_iter_tokens_skips_lines_outside_a_week(write_csv):
+    reader = MmapReader(write_csv(SPREADSHEET)).open()
+    kinds = [tokens.kind for tokens in reader.iter_tokens(lambda: False)]
+    assert kinds == [SKIPPED_ROW, WEEK_START_ROW, SKIPPED_ROW, SKIPPED_ROW,
+                     BLANK_ROW, SKIPPED_ROW, WEEK_START_ROW, SKIPPED_ROW,
+                     BLANK_ROW]
+
+
+def test_iter_tokens_tokenizes_lines_inside_a_week(write_csv):
+    reader = MmapReader(write_csv(SPREADSHEET)).open()
+    kinds = [tokens.kind for tokens in reader.iter_tokens(lambda: True)]
+    assert kinds[:5] == [EVENT_ROW, WEEK_START_ROW, EVENT_ROW, EVENT_ROW,
+                         BLANK_ROW]
+
+
+def test_mmap_reader_reads_file_with_lone_cr_in_text_mode(write_csv):
+    filename = write_csv(SPREADSHEET.replace('\n', '\r'), newline='')
+    with MmapReader(filename).open() as reader:
+        with open(filename) as infile:
+            assert list(reader) == list(infile)
+
+
+@pytest.mark.parametrize('newline, text_mode', [('\r\n', False),
+                                                ('\r', True)])
+def test_lone_cr_search_across_chunks(write_csv, monkeypatch, newline,
+                                      text_mode):
+    monkeypatch.setattr(mmap_reader, 'RELEASE_BYTES', 7)
+    filename = write_csv(SPREADSHEET.replace('\n', newline), newline='')
+    with MmapReader(filename).open() as reader:
+        assert reader._text_mode == text_mode
@@ -0,0 +1,57 @@
+# file: tests/test_pipeline.py
+# andrew jarcho
+# 2024-06-14
+
+import subprocess
+
+import pytest
+
+from src.pipeline import run_pipeline
+
+
+SHEET = '''w,Sun,,,Mon,,,Tue,,,Wed,,,Thu,,,Fri,,,Sat,,,,
+12/4/2016,,,,,,,,,,b,23:45,,w,3:45,4.00,w,2:00,2.75,b,0:00,9.00,,
+,,,,,,,,,,,,,s,4:45,,s,3:30,,w,5:15,5.25,,
+,,,,,,,,,,,,,w,6:15,1.50,w,8:45,5.25,s,10:30,,,
+,,,,,,,,,,,,,s,11:30,,s,19:30,,w,11:30,1.00,,
+,,,,,,,,,,,,,w,12:15,0.75,w,20:30,1.00,s,16:00,,,
+,,,,,,,,,,,,,s,16:45,,,,,w,17:00,1.00,,
+,,,,,,,,,,,,,w,17:30,0.75,,,,b,22:30,7.25,,
+,,,,,,,,,,,,,s,21:00,,,,,,,,,
+,,,,,,,,,,,,,w,21:30,0.50,,,,,,,,
+,,,,,,,,,,,,,b,23:15,7.50,,,,,,,,
+,,,,,,,,,,,,,,,,,,,,,,,
+,,,,,,,,,,,,,,,,,,,,,,,
+'''
+
+
+def test_run_pipeline_matches_piped_stages(tmp_path, capsys):
+    infile = tmp_path / 'sheet.csv'
+    infile.write_text(SHEET)
+    extract_out = subprocess.run(['python', 'src/extract/run_it.py',
+                                  str(infile)], capture_output=True,
+                                 check=True).stdout
+    transform_out = subprocess.run(['python',
+                                    'src/transform/do_transform.py'],
+                                   input=extract_out, capture_output=True,
+                                   check=True).stdout.decode()
+    run_pipeline(str(infile))
+    assert capsys.readouterr().out == transform_out
+    assert transform_out.startswith('NIGHT, 2016-12-07, 23:45, false, true\n')
+
+
+def test_batch_transform_matches_piped_stages(tmp_path, capsys):
+    pytest.importorskip('numpy')
+    infile = tmp_path / 'sheet.csv'
+    infile.write_text(SHEET)
+    extract_out = subprocess.run(['python', 'src/extract/run_it.py',
+                                  str(infile)], capture_output=True,
+                                 check=True).stdout
+    transform_out, batch_out = (
+        subprocess.run(['python', 'src/transform/do_transform.py'] + args,
+                       input=extract_out, capture_output=True,
+                       check=True).stdout.decode()
+        for args in ([], ['--batch']))
+    assert batch_out == transform_out
+    run_pipeline(str(infile), batch_transform=True)
+    assert capsys.readouterr().out == transform_out
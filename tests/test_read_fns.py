@@ -13,7 +13,8 @@ from datetime import date
 from tests.file_access_wrappers import FakeFileReadWrapper
 from src.extract.read_fns import open_infile
 from src.extract.read_fns import Extract
-from container_objs import Event, Day, Week
+from src.extract import read_fns
+from container_objs import Event, Day, Week, Night, OutputBuffer, PackedWeek
 
 # TODO: change assertions on fns which return None
 
@@ -134,27 +135,102 @@ def test_make_day_list(extract):
                                         for x in range(Extract.DAYS_IN_A_WEEK)]
 
 
-def test_handle_week_works_for_full_week(infile_wrapper):
-    extr = Extract(infile_wrapper)
-    extr.line_as_list = ['12/4/2016', '', '', '', '', '', '', '', '', '',
-                         'b', '23:45', '', 'w', '3:45', '4.00', 'w', '2:00',
-                         '2.75', 'b', '0:00', '9.00']
-    assert not extr._handle_week([])
-
-
-def test_handle_week_works_for_empty_week(infile_wrapper):
-    extr = Extract(infile_wrapper)
-    extr.line_as_list = [''] * 22
-    assert not extr._handle_week([])
+def test_scan_weeks_yields_nothing_for_unfinished_week():
+    extr = Extract(StringIO('12/4/2016,,,,,,,,,,b,23:45,,w,3:45,4.00,w,2:00,'
+                            '2.75,b,0:00,9.00,,\n'))
+    assert list(extr._scan_weeks()) == []
+    assert extr.new_week[3].events == [Event('b', '23:45', '')]
+
+
+def test_scan_weeks_yields_week_ended_by_blank_line(infile_wrapper):
+    extr = Extract(open_infile(infile_wrapper))
+    weeks = list(extr._scan_weeks())
+    assert len(weeks) == 1
+    assert weeks[0][0].dt_date == datetime.date(2016, 12, 4)
+    assert weeks[0][6].events[-1] == Event('b', '22:30', '7.25')
+
+
+def test_iter_weeks_yields_week_unfinished_at_end_of_input(capsys):
+    extr = Extract(StringIO('12/4/2016,,,,,,,,,,b,23:45,,w,3:45,4.00,,,,,,,\n'
+                            ',,,,,,,,,,,,,s,4:45,,,,,,,,\n'))
+    weeks = list(extr.iter_weeks())
+    assert len(weeks) == 1
+    assert weeks[0][4].events == [Event('w', '3:45', '4.00'),
+                                  Event('s', '4:45', '')]
+    assert capsys.readouterr().out == ''
+
+
+def test_iter_nights_yields_complete_nights(infile_wrapper):
+    nights = list(Extract(open_infile(infile_wrapper)).iter_nights())
+    assert [night[:3] for night in nights] == [
+        (datetime.date(2016, 12, 7), 'Y', '23:45'),
+        (datetime.date(2016, 12, 8), 'b', '23:15'),
+        (datetime.date(2016, 12, 10), 'b', '0:00')]
+    assert nights[1].events == [Event('w', '2:00', '2.75'),
+                                Event('s', '3:30', ''),
+                                Event('w', '8:45', '5.25'),
+                                Event('s', '19:30', ''),
+                                Event('w', '20:30', '1.00')]
+
+
+def test_iter_nights_marks_night_with_missing_end():
+    extr = Extract(StringIO('12/4/2016,b,22:00,8.00,w,6:00,8.00,b,23:00,,'
+                            'w,7:00,8.00,b,22:30,8.00,,,,,,,\n'))
+    nights = list(extr.iter_nights())
+    assert nights == [Night(datetime.date(2016, 12, 4), 'N', '22:00', []),
+                      Night(datetime.date(2016, 12, 6), 'Y', '23:00',
+                            [Event('w', '7:00', '8.00')])]
+
+
+def test_iter_lines_yields_what_lines_in_weeks_out_writes(infile_wrapper_2,
+                                                          capsys):
+    Extract(infile_wrapper_2).lines_in_weeks_out()
+    out, err = capsys.readouterr()
+    infile_wrapper_2.seek(0)
+    assert list(Extract(infile_wrapper_2).iter_lines()) == \
+        out.split('\n')[:-1]
+
+
+def test_iter_shards_splits_after_blank_lines(monkeypatch):
+    monkeypatch.setattr(read_fns, 'SHARD_LINES', 2)
+    lines = ['12/4/2016,b,1:00,\n', ',w,2:00,1.00\n', ',,,\n', ',s,3:00,\n',
+             '\n', ',b,4:00,\n']
+    assert list(read_fns._iter_shards(lines)) == [lines[:3], lines[3:5],
+                                                  lines[5:]]
+
+
+def test_lines_in_weeks_out_with_jobs_writes_what_serial_path_writes(
+        monkeypatch, capsys):
+    monkeypatch.setattr(read_fns, 'SHARD_LINES', 5)
+    with open('src/sleep_test_after_5_16.csv') as infile:
+        lines = infile.readlines()
+    Extract(iter(lines)).lines_in_weeks_out()
+    serial_out = capsys.readouterr().out
+    Extract(iter(lines)).lines_in_weeks_out(jobs=2)
+    assert capsys.readouterr().out == serial_out
+
+
+def test_iter_lines_with_jobs_raises_after_yielding_earlier_lines(
+        monkeypatch, infile_wrapper_2):
+    monkeypatch.setattr(read_fns, 'SHARD_LINES', 1)
+    lines = infile_wrapper_2.readlines() + ['2/30/2017,,,\n']
+    serial_lines, parallel_lines = [], []
+    with pytest.raises(ValueError):
+        serial_lines.extend(Extract(iter(lines)).iter_lines())
+    with pytest.raises(ValueError):
+        parallel_lines.extend(Extract(iter(lines)).iter_lines(jobs=2))
+    assert parallel_lines == serial_lines != []
 
 
 # TODO: check behavior of this function
 def test_handle_leftovers(extract):
-    out_buffer = ['action: b, time: 6:30, hours: 8.00',
-                  'action: w, time: 8:45, hours: 2.25', 'action: s, time: 13:00',
-                  'action: w, time: 14:00, hours: 1.00', 'action: s, time: 17:15',
-                  'action: w, time: 18:00, hours: 0.75', 'action: s, time: 21:00',
-                  'action: w, time: 22:00, hours: 1.00', 'action: s, time: 23:30']
+    out_buffer = OutputBuffer()
+    for line in ['action: b, time: 6:30, hours: 8.00',
+                 'action: w, time: 8:45, hours: 2.25', 'action: s, time: 13:00',
+                 'action: w, time: 14:00, hours: 1.00', 'action: s, time: 17:15',
+                 'action: w, time: 18:00, hours: 0.75', 'action: s, time: 21:00',
+                 'action: w, time: 22:00, hours: 1.00', 'action: s, time: 23:30']:
+        out_buffer.append_event(line)
     extract.new_week = (
         Day(datetime.date(2016, 12, 4), []), Day(datetime.date(2016, 12, 5), []),
         Day(datetime.date(2016, 12, 6), []), Day(datetime.date(2016, 12, 7), []),
@@ -192,6 +268,22 @@ def test_get_events_creates_events_from_non_empty_line_segments(extract):
     assert have_events
 
 
+def test_get_events_rejects_time_with_trailing_text(extract, caplog):
+    # '1:30pm' begins with a valid time, but is not one
+    extract.line_as_list = ['11/12/2017', '', '', '', '', '', '', '', '', '',
+                            '', '', '', 's', '1:30pm', '', 's', '3:30', '',
+                            'w', '5:15', '5.25']
+    extract.sunday_date = datetime.date(2017, 11, 12)
+    day_list = [Day(extract.sunday_date +
+                    datetime.timedelta(days=x), [])
+                for x in range(7)]
+    extract.new_week = Week(*day_list)
+    assert extract._get_events()
+    assert extract.new_week[4].events == []
+    assert extract.new_week[5].events == [Event('s', '3:30', '')]
+    assert "segment ['s', '1:30pm', ''] not valid" in caplog.text
+
+
 def test_get_events_creates_no_events_on_empty_line_input(extract):
     extract.line_as_list = ['', '', '', '', '', '', '', '', '', '', '', '',
                             '', '', '', '', '', '', '', '', '', '']
@@ -205,7 +297,7 @@ def test_get_events_creates_no_events_on_empty_line_input(extract):
 
 
 def test_manage_output_buffer_leaves_last_event_in_buffer(extract):
-    out_buffer = []
+    out_buffer = OutputBuffer()
     extract.sunday_date = datetime.date(2017, 11, 12)
     day_list = [Day(extract.sunday_date +
                     datetime.timedelta(days=x), [])
@@ -213,18 +305,19 @@ def test_manage_output_buffer_leaves_last_event_in_buffer(extract):
     extract.new_week = Week(*day_list)
     extract.new_week[6].events.append(Event('w', '13:15', '6.5'))
     extract._manage_output_buffer(out_buffer)
-    assert out_buffer[-1] == 'action: w, time: 13:15, hours: 6.50'
+    assert list(out_buffer.lines())[-1] == \
+        'action: w, time: 13:15, hours: 6.50'
 
 
 def test_manage_output_buffer_leaves_date_in_buffer_if_no_events(extract):
-    out_buffer = []
+    out_buffer = OutputBuffer()
     extract.sunday_date = datetime.date(2016, 4, 10)
     day_list = [Day(extract.sunday_date +
                     datetime.timedelta(days=x), [])
                 for x in range(7)]
     extract.new_week = Week(*day_list)
     extract._manage_output_buffer(out_buffer)
-    assert out_buffer[-1] == '    2016-04-16'
+    assert list(out_buffer.lines())[-1] == '    2016-04-16'
 
 
 def test_get_week_header(extract):
@@ -243,109 +336,119 @@ def test_get_day_header(day=Day(datetime.date(2018, 10, 14), [])):
 
 def test_write_or_discard_night_3_element_b_event_flushes_buffer(extract):
     output = io.StringIO()
-    out_buffer = ['bongo', 'Hello World']
+    out_buffer = OutputBuffer()
+    out_buffer.append_kept('bongo')
+    out_buffer.append_kept('Hello World')
     extract._write_or_discard_night(Event(action='b', mil_time='8:15',
                                           hours='4.25'),
                                     datetime.date(2017, 10, 12), out_buffer,
                                     output)
     assert output.getvalue() == 'bongo\nHello World\n'
-    assert out_buffer == []
+    assert not len(out_buffer)
 
 
 def test_write_or_discard_night_2_elem_b_event_no_output_pop_actions(extract):
     output = io.StringIO()
-    out_buffer = ['bongobongo', 'action: s, time: 19:00']
+    out_buffer = OutputBuffer()
+    out_buffer.append_kept('bongobongo')
+    out_buffer.append_event('action: s, time: 19:00')
     extract._write_or_discard_night(Event(action='b', mil_time='10:00',
                                           hours=''),
                                     datetime.date(2017, 5, 17), out_buffer,
                                     output)
     assert output.getvalue() == ''
-    assert out_buffer == ['bongobongo']
+    assert list(out_buffer.lines()) == ['bongobongo']
 
 
 def test_write_or_discard_night_2_elem_b_event_long_b_str_in_buffer(extract):
     output = io.StringIO()
-    out_buffer = ['bbbbbbbbbbbbbbbbbbbbbbbbbbbbbb', 'action: s, time: 17:00']
+    out_buffer = OutputBuffer()
+    out_buffer.append_kept('bbbbbbbbbbbbbbbbbbbbbbbbbbbbbb')
+    out_buffer.append_event('action: s, time: 17:00')
     extract._write_or_discard_night(Event(action='b', mil_time='23:15',
                                           hours=''),
                                     datetime.date(2017, 3, 19), out_buffer,
                                     output)
     assert output.getvalue() == ''
-    assert out_buffer == ['bbbbbbbbbbbbbbbbbbbbbbbbbbbbbb']
+    assert list(out_buffer.lines()) == ['bbbbbbbbbbbbbbbbbbbbbbbbbbbbbb']
 
 
 def test_write_complete_night(extract, capfd):
-    extract.out_buffer = ['hello', 'there']
+    extract.out_buffer = OutputBuffer()
+    extract.out_buffer.append_kept('hello')
+    extract.out_buffer.append_event('there')
     extract.outfile = sys.stdout
     extract._write_complete_night(extract.out_buffer, extract.outfile)
     fd1, fd2 = capfd.readouterr()
     assert fd1 == 'hello\nthere\n'
     assert fd2 == ''
-    assert extract.out_buffer == []
+    assert not len(extract.out_buffer)
 
 
 def test_discard_incomplete_night(extract, capfd):
     datetime_date = datetime.date(2017, 1, 3)
-    out_buffer = ['action: b, time: 23:00, hours: 7.00',
-                  '\nWeek of Sunday, 2017-01-01:\n==========================',
-                  '    2017-01-01', '    2017-01-02', '    2017-01-03']
+    out_buffer = OutputBuffer()
+    out_buffer.append_event('action: b, time: 23:00, hours: 7.00', True)
+    for line in ['\nWeek of Sunday, 2017-01-01:\n==========================',
+                 '    2017-01-01', '    2017-01-02', '    2017-01-03']:
+        out_buffer.append_kept(line)
     outfile = sys.stdout
     extract._discard_incomplete_night(out_buffer, outfile)
     fd1, fd2 = capfd.readouterr()
     assert fd1 == 'action: N, time: 23:00\n'
     assert fd2 == ''
+    assert list(out_buffer.lines())[0].startswith('\nWeek of Sunday')
+
+
+def test_is_complete_b_event_returns_true_on_complete_b_event():
+    assert Extract._is_complete_b_event(Event('b', '21:45', '3.75'), '3.75')
 
 
-def test_match_complete_b_event_line_returns_true_on_complete_b_event_line():
-    line = 'action: b, time: 21:45, hours: 3.75'
-    assert bool(Extract._match_complete_b_event_line(line))
+def test_is_complete_b_event_returns_false_on_incomplete_b_event():
+    assert not Extract._is_complete_b_event(Event('b', '17:25', ''), '')
 
 
-def test_match_complete_b_event_line_returns_false_on_incomplete_b_event_line():
-    line = 'action: b, time: 17:25'
-    assert not bool(Extract._match_complete_b_event_line(line))
+def test_is_complete_b_event_returns_false_on_non_b_event():
+    assert not Extract._is_complete_b_event(Event('w', '17:25', '2.00'),
+                                            '2.00')
 
 
-def test_match_complete_b_event_line_returns_false_on_non_b_event_line_input():
-    line = 'action: s, time: 17:25'
-    assert not bool(Extract._match_complete_b_event_line(line))
+def test_is_complete_b_event_returns_false_on_malformed_time():
+    assert not Extract._is_complete_b_event(Event('b', '1:30pm', '3.75'),
+                                            '3.75')
 
 
-def test_match_complete_b_event_line_returns_false_on_non_event_line_input():
-    line = 'cowabunga!!!'
-    assert not bool(Extract._match_complete_b_event_line(line))
+def test_is_event_returns_true_on_2_element_b_event():
+    assert Extract._is_event(Event('b', '4:25', ''), '')
 
 
-def test_match_event_line_returns_true_on_2_element_b_line_input():
-    line = 'action: b, time: 4:25'
-    assert bool(Extract._match_event_line(line))
+def test_is_event_returns_true_on_3_element_b_event():
+    assert Extract._is_event(Event('b', '4:25', '6.00'), '6.00')
 
 
-def test_match_event_line_returns_true_on_3_element_b_line_input():
-    line = 'action: b, time: 4:25, hours: 6.00'
-    assert bool(Extract._match_event_line(line))
+def test_is_event_returns_true_on_2_element_s_event():
+    assert Extract._is_event(Event('s', '4:25', ''), '')
 
 
-def test_match_event_line_returns_true_on_2_element_s_line_input():
-    line = 'action: s, time: 4:25'
-    assert bool(Extract._match_event_line(line))
+def test_is_event_returns_true_on_3_element_w_event():
+    assert Extract._is_event(Event('w', '11:00', '10.50'), '10.50')
 
 
-def test_match_event_line_returns_true_on_3_element_w_line_input():
-    line = 'action: w, time: 11:00, hours: 10.50'
-    assert bool(Extract._match_event_line(line))
+def test_is_event_returns_false_on_3_element_s_event():
+    assert not Extract._is_event(Event('s', '12:00', '6.00'), '6.00')
 
 
-def test_match_event_line_returns_false_on_3_element_s_line_input():
-    line = 'action: s, time: 12:00, hours: 6.00'
-    assert not bool(Extract._match_event_line(line))
+def test_is_event_returns_false_on_2_element_w_event():
+    assert not Extract._is_event(Event('w', '11:45', ''), '')
 
 
-def test_match_event_line_returns_false_on_2_element_w_line_input():
-    line = 'action: w, time: 11:45'
-    assert not bool(Extract._match_event_line(line))
+def test_is_event_returns_false_on_hours_with_3_digit_whole_part():
+    assert not Extract._is_event(Event('w', '11:45', '100.00'), '100.00')
 
 
-def test_match_event_line_returns_false_on_non_action_input():
-    line = '=' * 18
-    assert not bool(Extract._match_event_line(line))
+def test_iter_weeks_packed_yields_packed_weeks(infile_wrapper_2):
+    weeks = list(Extract(infile_wrapper_2).iter_weeks())
+    infile_wrapper_2.seek(0)
+    packed_weeks = list(Extract(infile_wrapper_2).iter_weeks(packed=True))
+    assert all(isinstance(week, PackedWeek) for week in packed_weeks)
+    assert packed_weeks == weeks
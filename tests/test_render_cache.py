@@ -0,0 +1,121 @@
+# file: test_render_cache.py
+# andrew jarcho
+# 2024-09-01
+
+
+import json
+
+import pytest
+
+from src.chart.chart_new import Chart
+from src.chart.render_cache import RenderCache, split_weeks
+
+
+WEEKS = ['''Week of Sunday, 2016-12-04:
+==========================
+    2016-12-04
+action: b, time: 23:00
+    2016-12-05
+action: w, time: 7:15, hours: 8.25
+action: s, time: 14:00
+action: w, time: 14:45, hours: 0.75
+action: b, time: 22:30
+
+''', '''Week of Sunday, 2016-12-11:
+==========================
+    2016-12-11
+action: w, time: 6:30, hours: 8.00
+action: N, time: 12:00
+    2016-12-12
+    2016-12-13
+action: Y, time: 1:00
+action: w, time: 6:30, hours: 5.50
+action: b, time: 23:45
+
+''', '''Week of Sunday, 2016-12-18:
+==========================
+    2016-12-18
+action: w, time: 7:00, hours: 7.25
+action: b, time: 23:15
+
+''']
+
+
+def chart_rows(infile, render_cache=None):
+    """
+    The first row's date, and the rows, charted for infile, with or
+    without render_cache
+    """
+    chart = Chart(str(infile))
+    if render_cache is None:
+        chart.make_rows(chart.read_file())
+    else:
+        render_cache.make_rows(chart)
+    return chart.output_date, [chart.row_text(row) for row in chart.rows()]
+
+
+@pytest.fixture()
+def infile(tmp_path):
+    infile = tmp_path / 'chart_input.txt'
+    infile.write_text(''.join(WEEKS))
+    return infile
+
+
+def test_split_weeks_starts_a_week_at_each_header(infile):
+    with open(infile) as lines:
+        weeks = split_weeks(lines)
+    assert [''.join(week) for week in weeks] == WEEKS
+
+
+def test_a_second_chart_is_made_from_the_cache(infile, tmp_path):
+    cache_name = str(tmp_path / 'cache.json')
+    render_cache = RenderCache(cache_name)
+    assert chart_rows(infile, render_cache) == chart_rows(infile)
+    assert (render_cache.hits, render_cache.misses) == (0, 3)
+    render_cache.save()
+
+    render_cache = RenderCache(cache_name)
+    assert chart_rows(infile, render_cache) == chart_rows(infile)
+    assert (render_cache.hits, render_cache.misses) == (3, 0)
+
+
+def test_only_changed_and_new_weeks_are_parsed(infile, tmp_path):
+    cache_name = str(tmp_path / 'cache.json')
+    render_cache = RenderCache(cache_name)
+    chart_rows(infile, render_cache)
+    render_cache.save()
+
+    # the Y changes the state carried into the last week, so it is parsed
+    infile.write_text(WEEKS[0] + WEEKS[1].replace('1:00', '2:00') +
+                      WEEKS[2] + WEEKS[2].replace('12-18', '12-25'))
+    render_cache = RenderCache(cache_name)
+    assert chart_rows(infile, render_cache) == chart_rows(infile)
+    assert (render_cache.hits, render_cache.misses) == (1, 3)
+    render_cache.save()
+    with open(cache_name) as cache_file:
+        assert len(json.load(cache_file)['entries']) == 4
+
+
+def test_the_first_row_is_named_by_the_first_date_read(infile, tmp_path):
+    infile.write_text(''.join(WEEKS).replace('2016-12', '2018-03'))
+    cache_name = str(tmp_path / 'cache.json')
+    for _ in range(2):
+        render_cache = RenderCache(cache_name)
+        first_date, _ = chart_rows(infile, render_cache)
+        render_cache.save()
+        assert first_date == '2018-03-04'
+
+
+def test_a_double_blank_line_ends_the_input(infile, tmp_path):
+    infile.write_text(WEEKS[0] + '\n' + WEEKS[1] + WEEKS[2])
+    render_cache = RenderCache(str(tmp_path / 'cache.json'))
+    assert chart_rows(infile, render_cache) == chart_rows(infile)
+    assert (render_cache.hits, render_cache.misses) == (0, 1)
+
+
+def test_an_unreadable_cache_is_ignored(infile, tmp_path, caplog):
+    cache_file = tmp_path / 'cache.json'
+    cache_file.write_text('{"version": 0}')
+    render_cache = RenderCache(str(cache_file))
+    assert chart_rows(infile, render_cache) == chart_rows(infile)
+    assert 'Ignoring render cache' in caplog.text
@@ -0,0 +1,75 @@
+# file: tests/test_sleep_time.py
+# andrew jarcho
+# 2024-06-23
+
+
+import pytest
+
+from src.load.load import decimal_to_interval
+from src.sleep_time import time_to_minutes, minutes_to_time, \
+    duration_minutes, closest_quarter, minutes_to_quarters, time_to_quarter, \
+    duration_to_decimal, duration_to_quarters, DURATION_DECIMALS, \
+    DURATION_QUARTERS, MINUTES_PER_DAY, QS_IN_DAY
+from src.transform.do_transform import Transform
+
+
+def test_time_to_minutes_reads_h_mm_and_hh_mm():
+    assert time_to_minutes('3:45') == 225
+    assert time_to_minutes('03:45') == 225
+    assert time_to_minutes('23:59') == 1439
+
+
+def test_minutes_to_time_pads_hour():
+    assert minutes_to_time(225) == '03:45'
+    assert minutes_to_time(0) == '00:00'
+
+
+@pytest.mark.parametrize('wake, sleep, expected', [
+    ('7:15', '23:45', 450),
+    ('23:45', '7:15', 990),
+    ('0:10', '0:20', 1430),
+    ('5:00', '5:00', 0),
+])
+def test_duration_minutes_wraps_past_midnight(wake, sleep, expected):
+    assert duration_minutes(time_to_minutes(wake),
+                            time_to_minutes(sleep)) == expected
+
+
+def test_closest_quarter_never_rounds_up_to_next_hour():
+    assert [closest_quarter(m) for m in (0, 7, 8, 22, 23, 36, 37, 59)] == \
+        [0, 0, 15, 15, 30, 30, 45, 45]
+
+
+def test_minutes_to_quarters_and_time_to_quarter():
+    assert minutes_to_quarters(4 * 60 + 15) == 17
+    assert minutes_to_quarters(4 * 60 + 50) == 19
+    assert time_to_quarter(time_to_minutes('23:45')) == 95
+    assert time_to_quarter(time_to_minutes('24:00')) == 0
+
+
+def test_transform_get_duration_formats_decimal_hours():
+    assert Transform.get_duration(time_to_minutes('3:45'),
+                                  time_to_minutes('23:30')) == '04.25'
+    assert Transform.get_duration(time_to_minutes('13:00'),
+                                  time_to_minutes('1:00')) == '12.00'
+
+
+def test_duration_tables_cover_a_day():
+    assert len(DURATION_DECIMALS) == len(DURATION_QUARTERS) == MINUTES_PER_DAY
+    assert DURATION_DECIMALS[255] == '04.25'
+    assert DURATION_DECIMALS[290] == '04.75'  # 50 minutes rounds down
+    assert DURATION_QUARTERS[290] == 19
+
+
+def test_durations_of_a_day_or_more_are_computed():
+    assert duration_to_decimal(25 * 60 + 30) == '25.50'
+    assert duration_to_quarters(25 * 60) == 4
+    assert duration_to_quarters(MINUTES_PER_DAY - 1) == QS_IN_DAY - 1
+
+
+@pytest.mark.parametrize('dec_str, expected', [
+    ('3.25', '3:15'), ('03.25', '03:15'), ('12.00', '12:00'),
+    ('100.50', '100:30'),
+])
+def test_decimal_to_interval_keeps_hours_as_written(dec_str, expected):
+    assert decimal_to_interval(dec_str) == expected
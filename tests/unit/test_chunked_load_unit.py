@@ -0,0 +1,149 @@
+import json
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+from src.load import chunked_load
+from src.load.chunked_load import iter_chunks, load_records_chunked, \
+    store_chunk
+from src.load.load import records_from_lines
+
+
+LINES = ['NIGHT, 2016-12-07, 23:45, false, true\n',
+         'NAP, 23:45, 04.00\n',
+         'NIGHT, 2016-12-08, 23:15, false, false\n',
+         'NAP, 23:15, 02.75\n',
+         'NAP, 04:45, 01.50\n',
+         'NIGHT, 2016-12-09, 23:00, false, false\n',
+         'NAP, 23:00, 07.00\n']
+
+
+@pytest.fixture
+def db(mocker):
+    """
+    Stand in for the db: insert_record() stores each record it is given,
+    fails the ones in db.fail, and raises for the ones in db.raise_on
+    """
+    class FakeDb:
+        stored = []
+        fail = set()
+        raise_on = set()
+
+    def insert_record(inserts, record):
+        if record[1] in FakeDb.raise_on:
+            raise DBAPIError('SELECT sl_insert_night()', None,
+                             Exception('invalid input syntax'))
+        if record[1] in FakeDb.fail:
+            return 'error inserting {} into db'.format(record[0].lower())
+        FakeDb.stored.append(record)
+        return 'sl_insert() succeeded'
+
+    mocker.patch('src.load.chunked_load.insert_record', insert_record)
+    return FakeDb
+
+
+def test_iter_chunks_splits_chunks_before_a_night():
+    chunks = list(iter_chunks(enumerate(records_from_lines(LINES), 1), 2))
+    assert [[line_num for line_num, _ in chunk] for chunk in chunks] == \
+        [[1, 2, 3, 4, 5], [6, 7]]
+
+
+def test_store_chunk_rejects_a_failed_night_and_its_naps(mocker, db):
+    db.fail = {'2016-12-08'}
+    chunk = list(enumerate(records_from_lines(LINES), 1))
+    rejected = store_chunk(mocker.MagicMock(), chunk)
+    assert [(line_num, reason) for line_num, _, reason in rejected] == [
+        (3, 'error inserting night into db'),
+        (4, 'night at line 3 was rejected'),
+        (5, 'night at line 3 was rejected')]
+    assert len(db.stored) == 4
+
+
+def test_store_chunk_retries_with_savepoints_when_a_row_raises(mocker, db):
+    db.raise_on = {'23:15'}
+    connection = mocker.MagicMock()
+    chunk = list(enumerate(records_from_lines(LINES), 1))
+    rejected = store_chunk(connection, chunk)
+    assert [(line_num, reason) for line_num, _, reason in rejected] == [
+        (4, 'invalid input syntax')]
+    connection.begin_nested.return_value.rollback.assert_called_once()
+    assert db.stored[-6:] == [record for line_num, record in chunk
+                              if line_num != 4]
+
+
+def test_store_chunk_rejects_a_nap_with_a_bad_duration(mocker):
+    inserts = mocker.patch('src.load.load.PreparedInserts').return_value
+    inserts.insert_night.return_value = 'sl_insert_night() succeeded'
+    inserts.insert_nap.return_value = 'sl_insert_nap() succeeded'
+    chunk = list(enumerate(records_from_lines(
+        ['NIGHT, 2016-12-08, 23:15, false, false\n', 'NAP, 23:15, 2\n',
+         'NAP, 04:45, 01.50\n']), 1))
+    rejected = store_chunk(mocker.MagicMock(), chunk)
+    assert [(line_num, reason) for line_num, _, reason in rejected] == [
+        (2, 'bad duration 2')]
+    inserts.insert_nap.assert_called_once_with('04:45', '01:30')
+
+
+def test_load_resumes_after_the_last_chunk_committed(mocker, db, tmp_path):
+    engine = mocker.MagicMock()
+    quarantine_name = str(tmp_path / 'quarantine.txt')
+    resume_name = str(tmp_path / 'resume.json')
+    db.fail = {'2016-12-07'}
+    store = chunked_load.store_chunk
+    calls = []
+
+    def store_until_second_chunk(connection, chunk):
+        calls.append(chunk)
+        if len(calls) == 2:
+            raise RuntimeError('db went away')
+        return store(connection, chunk)
+
+    mocker.patch('src.load.chunked_load.store_chunk', store_until_second_chunk)
+    with pytest.raises(RuntimeError):
+        load_records_chunked(engine, records_from_lines(LINES), 1,
+                             quarantine_name, resume_name)
+    with open(resume_name) as infile:
+        assert json.load(infile)['lines'] == 2
+
+    mocker.patch('src.load.chunked_load.store_chunk', store)
+    db.stored = []
+    assert load_records_chunked(engine, records_from_lines(LINES), 1,
+                                quarantine_name, resume_name) == 0
+    assert [record[1] for record in db.stored] == [
+        '2016-12-08', '23:15', '04:45', '2016-12-09', '23:00']
+    with open(quarantine_name) as infile:
+        assert infile.read() == ('1\tNIGHT, 2016-12-07, 23:45, false, '
+                                 'true\terror inserting night into db\n'
+                                 '2\tNAP, 23:45, 04.00\tnight at line 1 '
+                                 'was rejected\n')
+
+
+def test_load_starts_over_if_the_input_changed_before_the_resume_point(
+        mocker, db, tmp_path):
+    resume_name = str(tmp_path / 'resume.json')
+    load_records_chunked(mocker.MagicMock(), records_from_lines(LINES[:2]),
+                         1, resume_name=resume_name)
+    db.stored = []
+    changed = ['NIGHT, 2016-12-07, 22:45, false, true\n'] + LINES[1:]
+    load_records_chunked(mocker.MagicMock(), records_from_lines(changed), 1,
+                         resume_name=resume_name)
+    assert len(db.stored) == len(LINES)
+
+
+def test_load_incremental_adds_naps_to_a_loaded_night(mocker):
+    # the db holds the night of 2019-05-20, id 7, and its 03:30 nap
+    mocker.patch('src.load.load.select_loaded_nights',
+                 return_value=({('2019-05-20', 210): 7},
+                               frozenset([('2019-05-20', 210, 210)])))
+    inserts = mocker.patch('src.load.load.PreparedInserts').return_value
+    inserts.insert_night_nap.return_value = 'sl_insert_nap() succeeded'
+    lines = ['NIGHT, 2019-05-20, 03:30, false, false\n',
+             'NAP, 03:30, 04.00\n',
+             'NAP, 09:00, 01.25\n',
+             'NAP, 14:00, 00.50\n']
+    assert load_records_chunked(mocker.MagicMock(), records_from_lines(lines),
+                                incremental=True) == 0
+    assert inserts.insert_night_nap.call_args_list == [
+        mocker.call(7, '09:00', '01:15'), mocker.call(7, '14:00', '00:30')]
+    inserts.insert_night.assert_not_called()
+    inserts.insert_nap.assert_not_called()
@@ -1,6 +1,17 @@
+import datetime
+import io
 import logging
 
-from src.load.load import main, decimal_to_interval, setup_network_logger, setup_load_logger
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+from src.load.load import main, decimal_to_interval, setup_network_logger, setup_load_logger, \
+    split_nights_naps, store_batch, store_nights_naps_batched, records_from_lines, store_records, \
+    store_nights_naps, \
+    copy_files, COPY_NIGHT_STAGE, COPY_NAP_STAGE, load_records, select_loaded_nights, \
+    skip_loaded_records, MARK_LOADED_IN_STAGE, DELETE_LOADED_NAPS_FROM_STAGE, PreparedInserts, \
+    PREPARE_INSERTS, EXECUTE_INSERT_NAP, EXECUTE_INSERT_NIGHT_NAP, INSERT_FROM_STAGING_TABLES, \
+    NapOfLoadedNight
 
 
 def test_decimal_to_interval_valid_input():
@@ -13,6 +24,7 @@ def test_decimal_to_interval_invalid_input(caplog):
     caplog.set_level(logging.WARNING)
     assert decimal_to_interval('2.80') == '2:None'
     assert "Value for dec_mins 80 not found in decimal_to_interval()" in caplog.text
+    assert decimal_to_interval('2') == '2:None'
 
 
 def test_setup_network_logger(caplog):
@@ -56,3 +68,297 @@ def test_main(mocker):
     # Check that setup_load_logger was called and returned the correct logger
     mock_setup_load_logger.assert_called_once()
     assert load_logger == 'mocked_load_logger'
+
+
+def test_split_nights_naps_links_naps_to_preceding_night():
+    lines = ['NIGHT, 2016-12-07, 23:45, false, true\n',
+             'NAP, 23:45, 04.00\n',
+             'NAP, 04:45, 01.50\n',
+             'NIGHT, 2016-12-08, 23:15, false, false\n',
+             'NAP, 23:15, 02.75\n']
+    night_rows, nap_rows = split_nights_naps(records_from_lines(lines))
+    assert night_rows == [('1', '2016-12-07', '23:45', 'false', 'true'),
+                          ('2', '2016-12-08', '23:15', 'false', 'false')]
+    assert nap_rows == [('1', '1', '23:45', '04:00'),
+                        ('2', '1', '04:45', '01:30'),
+                        ('3', '2', '23:15', '02:45')]
+
+
+def test_split_nights_naps_drops_nap_before_first_night(caplog):
+    caplog.set_level(logging.WARNING)
+    night_rows, nap_rows = split_nights_naps(records_from_lines(
+        ['NAP, 04:45, 01.50\n', 'NIGHT, 2016-12-08, 23:15, false, false\n']))
+    assert len(night_rows) == 1
+    assert nap_rows == []
+    assert 'NAP before any NIGHT at line 1 dropped' in caplog.text
+
+
+def test_split_nights_naps_drops_nap_with_bad_duration(caplog):
+    caplog.set_level(logging.WARNING)
+    night_rows, nap_rows = split_nights_naps(records_from_lines(
+        ['NIGHT, 2016-12-08, 23:15, false, false\n', 'NAP, 23:15, 02.80\n']))
+    assert nap_rows == []
+    assert 'NAP with bad duration at line 2 dropped' in caplog.text
+
+
+def test_store_nights_naps_batched_splits_batches_before_a_night(mocker):
+    connection = mocker.Mock()
+    connection.execute.return_value.scalar.side_effect = [[1, 2], [1, 2, 3],
+                                                          [3], [4]]
+    lines = ['NIGHT, 2016-12-07, 23:45, false, true\n',
+             'NAP, 23:45, 04.00\n',
+             'NIGHT, 2016-12-08, 23:15, false, false\n',
+             'NAP, 23:15, 02.75\n',
+             'NAP, 04:45, 01.50\n',
+             'NIGHT, 2016-12-09, 23:00, false, false\n',
+             'NAP, 23:00, 07.00\n']
+    store_nights_naps_batched(connection, records_from_lines(lines),
+                              batch_size=2)
+    params = [call.args[1] for call in connection.execute.call_args_list]
+    assert params[0]['start_dates'] == ['2016-12-07', '2016-12-08']
+    assert params[0]['end_no_data'] == [True, False]
+    assert params[1]['night_ids'] == [1, 2]
+    assert params[1]['night_positions'] == [1, 2, 2]
+    assert params[1]['durations'] == ['04:00', '02:45', '01:30']
+    assert params[2]['start_dates'] == ['2016-12-09']
+    assert params[3]['night_positions'] == [1]
+
+
+def test_store_batch_reports_rejected_lines(mocker, caplog):
+    caplog.set_level(logging.WARNING)
+    connection = mocker.Mock()
+    connection.execute.return_value.scalar.side_effect = [[None], [None]]
+    nights = [(1, '2016-12-07', '23:45', 'true', 'true')]
+    naps = [(2, 1, '23:45', '04:00')]
+    assert store_batch(connection, nights, naps) == 2
+    assert 'db rejected input lines [1, 2]' in caplog.text
+
+
+def test_store_batch_sends_a_bad_time_as_null_and_stores_the_rest(
+        mocker, caplog):
+    caplog.set_level(logging.WARNING)
+    connection = mocker.Mock()
+    # the db rejects the rows sent with a NULL, as sl_insert_*_bulk() do
+    connection.execute.return_value.scalar.side_effect = [[1, None, 3],
+                                                          [4, None, None]]
+    nights = [(1, '2016-12-07', '23:45', 'false', 'false'),
+              (3, '2016-12-08', '23:6x', 'false', 'false'),
+              (5, '2016-12-09', '23:00', 'false', 'false')]
+    naps = [(2, 1, '23:45', '04:00'), (4, 2, '23:15', '02:45'),
+            (6, 3, '1:30pm', '07:00')]
+    assert store_batch(connection, nights, naps) == 3
+    params = [call.args[1] for call in connection.execute.call_args_list]
+    assert params[0]['start_times'] == ['23:45', None, '23:00']
+    assert params[1]['start_times'] == ['23:45', '23:15', None]
+    assert 'db rejected input lines [3, 4, 6]' in caplog.text
+
+
+def test_store_records_stops_at_first_record_that_is_not_night_or_nap(mocker):
+    connection = mocker.Mock()
+    cursor = connection.connection.cursor.return_value
+    cursor.fetchone.return_value = ('succeeded',)
+    store_records(connection, [('NIGHT', '2016-12-07', '23:45', 'false',
+                                'false'),
+                               ('NAP', '23:45', '04.00'),
+                               ('',),
+                               ('NAP', '04:45', '01.50')])
+    assert cursor.execute.call_count == 2
+
+
+def test_store_nights_naps_closes_the_cursor_it_inserts_with(mocker):
+    connection = mocker.Mock()
+    cursor = connection.connection.cursor.return_value
+    cursor.fetchone.return_value = ('sl_insert_nap() succeeded',)
+    assert store_nights_naps(connection, 'NAP, 23:45, 04.00\n')
+    assert not store_nights_naps(connection, '\n')
+    assert connection.connection.cursor.call_count == 2
+    assert cursor.close.call_count == 2
+
+
+def test_prepared_inserts_prepare_once_per_dbapi_connection(mocker):
+    connection = mocker.Mock()
+    connection.connection.info = {}
+    cursor = connection.connection.cursor.return_value
+    cursor.fetchone.return_value = ('sl_insert_nap() succeeded',)
+    for _ in range(2):
+        inserts = PreparedInserts(connection)
+        assert inserts.insert_nap('23:45', '04:00') == \
+            'sl_insert_nap() succeeded'
+    executed = [call.args for call in cursor.execute.call_args_list]
+    assert executed == [(PREPARE_INSERTS, None),
+                        (EXECUTE_INSERT_NAP, ('23:45', '04:00')),
+                        (EXECUTE_INSERT_NAP, ('23:45', '04:00'))]
+
+
+def test_prepared_inserts_raise_dbapi_errors_as_sqlalchemy_does(mocker):
+    connection = mocker.Mock()
+    connection.dialect.loaded_dbapi.Error = ValueError
+    cursor = connection.connection.cursor.return_value
+    cursor.execute.side_effect = ValueError('invalid input syntax')
+    with pytest.raises(DBAPIError):
+        PreparedInserts(connection).insert_night('2016-12-07', '23:45',
+                                                 'false', 'false')
+
+
+def test_copy_files_copies_each_file_as_it_is(mocker):
+    connection = mocker.Mock()
+    cursor = connection.connection.cursor.return_value
+    nights_file = io.StringIO('1\t2016-12-07\t23:45\tfalse\tfalse\n')
+    naps_file = io.StringIO('1\t1\t23:45\t04:00\n')
+    nights_file.name, naps_file.name = 'nights.tsv', 'naps.tsv'
+    copy_files(connection, nights_file, naps_file)
+    copied = [call.args[:2] for call in cursor.copy_expert.call_args_list]
+    assert copied == [(COPY_NIGHT_STAGE, nights_file),
+                      (COPY_NAP_STAGE, naps_file)]
+    assert connection.execute.call_count == 2  # create, insert ... select
+
+
+def test_skip_loaded_records_skips_loaded_nights_and_naps():
+    lines = ['NIGHT, 2016-12-07, 23:45, false, true\n',
+             'NAP, 23:45, 04.00\n',
+             'NIGHT, 2016-12-08, 1:15, false, false\n',
+             'NAP, 01:15, 02.75\n',
+             'NIGHT, 2016-12-08, 23:15, false, false\n',
+             'NAP, 23:15, 01.50\n',
+             'NIGHT, 2016-12-09, 23:00, false, false\n']
+    records = skip_loaded_records(records_from_lines(lines),
+                                  {('2016-12-07', 1425): 1,
+                                   ('2016-12-08', 75): 2},
+                                  frozenset([('2016-12-07', 1425, 1425),
+                                             ('2016-12-08', 75, 75)]))
+    assert list(records) == [['NIGHT', '2016-12-08', '23:15', 'false',
+                              'false'],
+                             ['NAP', '23:15', '01.50'],
+                             ['NIGHT', '2016-12-09', '23:00', 'false',
+                              'false']]
+
+
+def test_skip_loaded_records_keeps_naps_added_to_loaded_nights():
+    lines = ['NIGHT, 2019-05-19, 23:00, false, false\n',
+             'NAP, 23:00, 07.00\n',
+             'NAP, 15:00, 01.00\n',
+             'NIGHT, 2019-05-20, 03:30, false, false\n',
+             'NAP, 03:30, 04.00\n',
+             'NAP, 09:00, 01.25\n',
+             'NAP, 14:00, 00.50\n']
+    records = list(skip_loaded_records(
+        records_from_lines(lines),
+        {('2019-05-19', 1380): 6, ('2019-05-20', 210): 7},
+        frozenset([('2019-05-19', 1380, 1380), ('2019-05-20', 210, 210)])))
+    assert records == [['NAP', '15:00', '01.00'], ['NAP', '09:00', '01.25'],
+                       ['NAP', '14:00', '00.50']]
+    assert all(isinstance(record, NapOfLoadedNight) for record in records)
+    assert [record.night_id for record in records] == [6, 7, 7]
+
+
+def test_skip_loaded_records_skips_nothing_when_the_db_is_empty():
+    records = [['NAP', '23:45', '04.00'],
+               ['NIGHT', '2016-12-07', '23:45', 'false', 'true']]
+    assert list(skip_loaded_records(records, {}, frozenset())) == records
+
+
+def test_select_loaded_nights_reads_loaded_nights_and_naps(mocker):
+    connection = mocker.Mock()
+    connection.execute.side_effect = [
+        [(datetime.date(2016, 12, 8), datetime.time(1, 15), 2),
+         (datetime.date(2016, 12, 8), datetime.time(23, 15), 3)],
+        [(datetime.date(2016, 12, 8), datetime.time(1, 15),
+          datetime.time(1, 15))]]
+    assert select_loaded_nights(connection) == (
+        {('2016-12-08', 75): 2, ('2016-12-08', 1395): 3},
+        frozenset([('2016-12-08', 75, 75)]))
+
+
+def test_load_records_incremental_sends_only_new_nights(mocker):
+    engine = mocker.Mock()
+    sent = []
+    mocker.patch('src.load.load.select_loaded_nights',
+                 return_value=({('2016-12-07', 1425): 1}, frozenset()))
+    store_records_mock = mocker.patch('src.load.load.store_records',
+                                      side_effect=lambda conn, recs:
+                                      sent.extend(recs))
+    load_records(engine, [('NIGHT', '2016-12-07', '23:45', 'false', 'true'),
+                          ('NIGHT', '2016-12-08', '23:15', 'false', 'false')],
+                 incremental=True)
+    store_records_mock.assert_called_once()
+    assert sent == [('NIGHT', '2016-12-08', '23:15', 'false', 'false')]
+
+
+# a daily append: naps added to the last night loaded, and a new night
+APPENDED = [('NIGHT', '2019-05-20', '03:30', 'false', 'false'),
+            ('NAP', '03:30', '04.00'),
+            ('NAP', '09:00', '01.25'),
+            ('NAP', '14:00', '00.50'),
+            ('NIGHT', '2019-05-21', '02:45', 'false', 'false'),
+            ('NAP', '02:45', '05.00')]
+
+
+@pytest.fixture
+def loaded_night(mocker):
+    """ The db holds the night of 2019-05-20, id 7, and its 03:30 nap """
+    return mocker.patch('src.load.load.select_loaded_nights',
+                        return_value=({('2019-05-20', 210): 7},
+                                      frozenset([('2019-05-20', 210, 210)])))
+
+
+def test_load_records_incremental_adds_naps_to_a_loaded_night(
+        mocker, loaded_night):
+    connection = mocker.Mock()
+    cursor = connection.connection.cursor.return_value
+    cursor.fetchone.return_value = ('sl_insert_night() succeeded',)
+    load_records(mocker.Mock(**{'connect.return_value': connection}),
+                 APPENDED, incremental=True)
+    executed = [call.args for call in cursor.execute.call_args_list]
+    assert executed[:2] == [(EXECUTE_INSERT_NIGHT_NAP, (7, '09:00', '01:15')),
+                            (EXECUTE_INSERT_NIGHT_NAP, (7, '14:00', '00:30'))]
+    assert [params[0] for _, params in executed[2:]] == ['2019-05-21',
+                                                         '02:45']
+
+
+def test_load_records_batched_incremental_adds_naps_to_a_loaded_night(
+        mocker, loaded_night):
+    connection = mocker.Mock()
+    connection.execute.return_value.scalar.side_effect = [[8], [11, 12, 13]]
+    load_records(mocker.Mock(**{'connect.return_value': connection}),
+                 APPENDED, batch_size=2, incremental=True)
+    params = [call.args[1] for call in connection.execute.call_args_list]
+    assert params[0]['start_dates'] == ['2019-05-21']
+    assert params[1]['night_ids'] == [8, 7, 7]
+    assert params[1]['night_positions'] == [2, 3, 1]
+    assert params[1]['start_times'] == ['09:00', '14:00', '02:45']
+
+
+def test_load_records_copy_incremental_adds_naps_to_a_loaded_night(
+        mocker, loaded_night):
+    connection = mocker.Mock()
+    copy_rows = mocker.patch('src.load.load.copy_rows')
+    load_records(mocker.Mock(**{'connect.return_value': connection}),
+                 APPENDED, bulk=True, incremental=True)
+    # the db server finds the loaded rows, so all the naps are copied
+    assert [row[2] for row in copy_rows.call_args_list[1].args[2]] == \
+        ['03:30', '09:00', '14:00', '02:45']
+    sql = [str(call.args[0]) for call in connection.execute.call_args_list]
+    assert sql[1:] == [MARK_LOADED_IN_STAGE, DELETE_LOADED_NAPS_FROM_STAGE,
+                       INSERT_FROM_STAGING_TABLES]
+    loaded_night.assert_not_called()
+
+
+def test_prepared_inserts_send_a_bad_nap_of_a_loaded_night_as_null(mocker):
+    connection = mocker.Mock()
+    cursor = connection.connection.cursor.return_value
+    cursor.fetchone.return_value = (None,)
+    assert PreparedInserts(connection).insert_night_nap(7, '1:30pm',
+                                                        '1:None') == \
+        'error inserting nap into db'
+    assert cursor.execute.call_args.args == (EXECUTE_INSERT_NIGHT_NAP,
+                                             (7, None, None))
+
+
+def test_copy_files_incremental_skips_loaded_rows_in_stage(mocker):
+    connection = mocker.Mock()
+    nights_file, naps_file = io.StringIO(), io.StringIO()
+    nights_file.name, naps_file.name = 'nights.tsv', 'naps.tsv'
+    copy_files(connection, nights_file, naps_file, incremental=True)
+    sql = [str(call.args[0]) for call in connection.execute.call_args_list]
+    assert sql[1:] == [MARK_LOADED_IN_STAGE, DELETE_LOADED_NAPS_FROM_STAGE,
+                       INSERT_FROM_STAGING_TABLES]